@@ -1,113 +1,296 @@
-import random, hashlib
-import uuid
+import random
+import time
+from datetime import timedelta
 from decimal import Decimal
-from django.core.management.base import BaseCommand
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from django.utils import timezone
 from faker import Faker
 
 from accounts.models import User
-from inventory.models import Category, Product
+from dashboard import rollups
+from dashboard.models import DailySalesRollup, ProductSalesRollup
+from inventory.models import (
+    Category,
+    LowStockAlert,
+    Product,
+    StockMovement,
+    StockSnapshot,
+)
+from inventory.services import reconcile_category_counters
 from sales.models import Sale, SaleItem
 
 
 class Command(BaseCommand):
-    help = "Populate demo DB: 1000 users, 10 categories, 100k products, 50k sales"
+    help = (
+        "Populate the demo DB with bulk inserts "
+        "(e.g. --users 1000 --products 100000 --sales 10000000)"
+    )
+
+    HISTORY_DAYS = 60
 
-    USERS = 28
-    CATEGORIES = 5
-    PRODUCTS = 923
-    SALES = 121
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=28)
+        parser.add_argument("--categories", type=int, default=5)
+        parser.add_argument("--products", type=int, default=923)
+        parser.add_argument("--sales", type=int, default=121)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--seed", type=int, default=2025, help="Seed for reproducible data"
+        )
+        parser.add_argument(
+            "--password",
+            default="demo12345",
+            help="Password shared by every generated user",
+        )
 
-    def handle(self, *args, **kwargs):
+    def handle(self, *args, **opts):
+        if opts["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+        self.batch_size = opts["batch_size"]
+        self.rng = random.Random(opts["seed"])
         fake = Faker("en_US")
-        Faker.seed(2025)
-        fake.unique.clear()
+        fake.seed_instance(opts["seed"])
+        self.now = timezone.now()
+        self.history_start = self.now - timedelta(days=self.HISTORY_DAYS)
 
-        self._create_users(fake)
-        categories = self._create_categories(fake)
+        self._wipe()
+        cashiers = self._create_users(fake, opts["users"], opts["password"])
+        categories = self._create_categories(fake, opts["categories"])
+        products = self._create_products(fake, categories, opts["products"])
+        opening = {p.pk: p.quantity for p in products}
+        sold = {}
+        if opts["sales"]:
+            if not cashiers:
+                raise CommandError("Sales need at least one staff/manager user.")
+            if not products:
+                raise CommandError("Sales need at least one product.")
+            sold = self._create_sales(cashiers, products, opts["sales"])
+        self._finish_stock(products, opening, sold)
 
-        # generate random weights for categories (they sum to 1)
-        weights = [random.random() for _ in categories]
-        total = sum(weights)
-        self.category_weights = [w / total for w in weights]
+        self.stdout.write("rebuilding dashboard rollups…")
+        rollups.rebuild()
+        reconcile_category_counters()
+        self.stdout.write(self.style.SUCCESS("🎉  Demo data ready!"))
 
-        products = self._create_products(fake, categories)
-        # build a product popularity list (initially uniform, will drift over sales)
-        self.product_popularity = [1] * len(products)
+    # --- helpers -------------------------------------------------------
 
-        self._create_sales(fake, products)
-        self.stdout.write(self.style.SUCCESS("🎉  Demo data ready!"))
+    def _progress(self, label, done, total, started, rows=None):
+        """Print ``done/total`` and the insert rate (``rows`` defaults to ``done``)."""
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        rate = (done if rows is None else rows) / elapsed
+        self.stdout.write(f"{label}: {done:,}/{total:,} ({rate:,.0f} rows/s)")
+
+    def _batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield start, min(self.batch_size, total - start)
 
-    def _create_users(self, fake: Faker):
+    # --- steps ---------------------------------------------------------
+
+    def _wipe(self):
+        # Raw deletes skip the collector, which would otherwise load every
+        # row of the big tables into memory just to cascade.
+        for model in (
+            SaleItem,
+            Sale,
+            DailySalesRollup,
+            ProductSalesRollup,
+            StockSnapshot,
+            StockMovement,
+            LowStockAlert,
+            Product,
+            Category,
+        ):
+            qs = model.objects.all()
+            qs._raw_delete(qs.db)
         User.objects.exclude(is_superuser=True).delete()
-        for _ in range(self.USERS):
-            username = fake.unique.user_name()
-            password = hashlib.sha256(username.encode()).hexdigest()[:10]
-            role = random.choice(["admin", "staff", "manager"])
-            User.objects.create_user(username=username, password=password, role=role)
-        return User.objects.all()
-
-    def _create_categories(self, fake: Faker):
-        Category.objects.all().delete()
-        cats = []
-        for _ in range(self.CATEGORIES):
-            name = fake.unique.word().title()
-            cats.append(Category.objects.create(name=name))
-        return cats
-
-    def _create_products(self, fake: Faker, categories):
-        Product.objects.all().delete()
-        products = []
-        for _ in range(self.PRODUCTS):
-            idx = random.choices(
-                range(len(categories)), weights=self.category_weights, k=1
-            )[0]
-            cat = categories[idx]
-
-            name = f"{fake.color_name()} {fake.word().title()} {fake.unique.random_int(1, 99999):05}"
-            sku = fake.unique.bothify(text="??#####").upper()
-            cost = Decimal(fake.pydecimal(left_digits=2, right_digits=2, positive=True))
-            sell = (cost * Decimal(random.uniform(1.2, 2.5))).quantize(Decimal("0.01"))
-            qty = random.randint(0, 300)
-            min_stock = random.randint(5, 50)
-
-            prod = Product.objects.create(
-                category=cat,
-                name=name,
-                sku=sku,
-                cost_price=cost,
-                sell_price=sell,
-                quantity=qty,
-                min_stock=min_stock,
+
+    def _create_users(self, fake, count, password):
+        started = time.perf_counter()
+        hashed = make_password(password)  # one hash for everyone: PBKDF2 is slow
+        for start, size in self._batches(count):
+            User.objects.bulk_create(
+                User(
+                    username=f"{fake.user_name()}_{i}",
+                    password=hashed,
+                    role=self.rng.choice(["admin", "staff", "manager"]),
+                )
+                for i in range(start, start + size)
+            )
+            self._progress("users", start + size, count, started)
+        if count:
+            self.stdout.write(f"All generated users share the password {password!r}.")
+        return list(
+            User.objects.filter(role__in=["staff", "manager"]).values_list(
+                "pk", flat=True
             )
-            products.append(prod)
+        )
+
+    def _create_categories(self, fake, count):
+        return Category.objects.bulk_create(
+            Category(name=f"{fake.unique.word().title()}") for _ in range(count)
+        )
+
+    def _create_products(self, fake, categories, count):
+        if count and not categories:
+            raise CommandError("Products need at least one category.")
+        started = time.perf_counter()
+        weights = [self.rng.random() for _ in categories]
+        products = []
+        for start, size in self._batches(count):
+            picks = self.rng.choices(categories, weights=weights, k=size)
+            batch = []
+            for i, cat in zip(range(start, start + size), picks):
+                cost = Decimal(self.rng.randint(100, 9999)) / 100
+                sell = (cost * Decimal(self.rng.uniform(1.2, 2.5))).quantize(
+                    Decimal("0.01")
+                )
+                quantity = self.rng.randint(0, 300)
+                min_stock = self.rng.randint(5, 50)
+                batch.append(
+                    Product(
+                        category=cat,
+                        name=f"{fake.color_name()} {fake.word().title()} {i:06}",
+                        sku=f"{fake.lexify('??').upper()}{i:07}",
+                        cost_price=cost,
+                        sell_price=sell,
+                        quantity=quantity,
+                        min_stock=min_stock,
+                        is_low_stock=quantity <= min_stock,
+                    )
+                )
+            with transaction.atomic():
+                products.extend(Product.objects.bulk_create(batch))
+            self._progress("products", start + size, count, started)
         return products
 
-    def _create_sales(self, fake: Faker, products):
-        Sale.objects.all().delete()
-        cashiers = list(User.objects.filter(role__in=["staff", "manager"]))
-
-        for _ in range(self.SALES):
-            sale = Sale.objects.create(
-                cashier=random.choice(cashiers),
-                datetime=fake.date_time_between(
-                    start_date="-60d",
-                    end_date="now",
-                    tzinfo=timezone.get_current_timezone(),
-                ),
+    def _create_sales(self, cashiers, products, count):
+        """
+        Generate sales batch by batch.
+
+        Each batch draws all of its line picks in one weighted
+        ``choices`` call and only then folds the sold quantities back into
+        product popularity, so the cumulative weights are built once per
+        batch instead of once per sale.  Stock is tracked in memory and
+        never oversold.
+
+        Returns the units sold per product and day of history as
+        ``{(product_id, day): [units, last_sale_datetime]}``.
+        """
+        started = time.perf_counter()
+        span = (self.now - self.history_start).total_seconds()
+        popularity = [1] * len(products)
+        sold = {}
+        rows = 0
+        for start, size in self._batches(count):
+            cum_weights = list(accumulate(popularity))
+            line_counts = [self.rng.randint(1, 5) for _ in range(size)]
+            picks = iter(
+                self.rng.choices(
+                    range(len(products)), cum_weights=cum_weights, k=sum(line_counts)
+                )
             )
 
-            # choose 1–5 line items, favoring popular products
-            picks = random.choices(
-                range(len(products)),
-                weights=self.product_popularity,
-                k=random.randint(1, 5),
+            sales, sale_lines = [], []
+            for n_lines in line_counts:
+                lines = []
+                for _ in range(n_lines):
+                    idx = next(picks)
+                    product = products[idx]
+                    qty = min(self.rng.randint(1, 10), product.quantity)
+                    if not qty:
+                        continue
+                    product.quantity -= qty
+                    popularity[idx] += qty
+                    price = product.sell_price
+                    lines.append(
+                        SaleItem(
+                            product_id=product.pk,
+                            quantity=qty,
+                            price=price,
+                            line_total=(price * qty).quantize(Decimal("0.01")),
+                        )
+                    )
+                if not lines:
+                    continue
+                cashier_id = self.rng.choice(cashiers)
+                offset = self.rng.uniform(0, span)
+                when = self.history_start + timedelta(seconds=offset)
+                sales.append(
+                    Sale(
+                        cashier_id=cashier_id,
+                        datetime=when,
+                        total=sum(item.line_total for item in lines),
+                    )
+                )
+                sale_lines.append(lines)
+                day = int(offset // 86400)
+                for item in lines:
+                    bucket = sold.setdefault((item.product_id, day), [0, when])
+                    bucket[0] += item.quantity
+                    bucket[1] = max(bucket[1], when)
+
+            with transaction.atomic():
+                Sale.objects.bulk_create(sales)
+                items = []
+                for sale, lines in zip(sales, sale_lines):
+                    for item in lines:
+                        item.sale_id = sale.pk
+                        items.append(item)
+                SaleItem.objects.bulk_create(items)
+            rows += len(sales) + len(items)
+            self._progress("sales", start + size, count, started, rows=rows)
+        return sold
+
+    def _finish_stock(self, products, opening, sold):
+        """
+        Persist final stock, journal it as opening balance + one movement
+        per product and day of sales (dated at that day's last sale, so
+        ``stock_at`` walks through the history) and open an alert for every
+        product that ends up low.
+        """
+        started = time.perf_counter()
+        for p in products:
+            p.is_low_stock = p.quantity <= p.min_stock
+        with transaction.atomic():
+            Product.objects.bulk_update(
+                [p for p in products if p.quantity != opening[p.pk]],
+                ["quantity", "is_low_stock"],
+                batch_size=self.batch_size,
+            )
+            movements = [
+                StockMovement(
+                    product_id=pk,
+                    delta=qty,
+                    reason=StockMovement.OPENING,
+                    reference="feed_db",
+                    created_at=self.history_start,
+                )
+                for pk, qty in opening.items()
+                if qty
+            ] + [
+                StockMovement(
+                    product_id=pk,
+                    delta=-units,
+                    reason=StockMovement.SALE,
+                    reference="feed_db",
+                    created_at=when,
+                )
+                # ids follow time, as snapshots expect
+                for (pk, _), (units, when) in sorted(
+                    sold.items(), key=lambda row: row[1][1]
+                )
+            ]
+            StockMovement.objects.bulk_create(movements, batch_size=self.batch_size)
+            LowStockAlert.log(
+                [
+                    (p.pk, p.quantity, p.min_stock, False)
+                    for p in products
+                    if p.is_low_stock
+                ],
+                self.now,
             )
-            for idx in picks:
-                prod = products[idx]
-                qty = random.randint(1, 10)
-                item = SaleItem.objects.create(sale=sale, product=prod, quantity=qty)
-                # bump that product’s popularity a bit
-                self.product_popularity[idx] += qty
-
-            sale.recalc_total()
+        self._progress("stock ledger", len(movements), len(movements), started)
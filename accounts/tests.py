@@ -1,9 +1,18 @@
+from io import StringIO
+
 from django.db.utils import IntegrityError
 
 from django.test import TestCase
+from django.core.management import call_command
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.db.models import Count, Sum
+
+from dashboard.models import DailySalesRollup
+from inventory.models import LowStockAlert, Product, StockMovement
+from inventory.services import ledger_drift, stock_at
+from sales.models import Sale, SaleItem
 
 User = get_user_model()
 
@@ -170,3 +179,71 @@ class UserModelTests(TestCase):
             username="repruser", password="pass", role="manager"
         )
         self.assertEqual(str(user), "repruser (manager)")
+
+
+class FeedDbCommandTests(TestCase):
+    def feed(self, **options):
+        call_command(
+            "feed_db",
+            users=6,
+            categories=3,
+            products=40,
+            sales=120,
+            batch_size=25,
+            stdout=StringIO(),
+            **options,
+        )
+
+    def test_loads_consistent_dataset(self):
+        self.feed()
+        self.assertEqual(User.objects.count(), 6)
+        self.assertEqual(Product.objects.count(), 40)
+        self.assertFalse(Product.objects.filter(quantity__lt=0).exists())
+        self.assertFalse(ledger_drift().exists())
+        for sale in Sale.objects.prefetch_related("items")[:20]:
+            self.assertEqual(sale.total, sum(i.line_total for i in sale.items.all()))
+        self.assertEqual(
+            DailySalesRollup.objects.aggregate(n=Sum("sales_count"))["n"],
+            Sale.objects.count(),
+        )
+        self.assertEqual(
+            set(
+                LowStockAlert.objects.filter(handled_at__isnull=True).values_list(
+                    "product", flat=True
+                )
+            ),
+            set(Product.objects.filter(is_low_stock=True).values_list("pk", flat=True)),
+        )
+        user = User.objects.first()
+        self.assertTrue(user.check_password("demo12345"))
+
+    def test_seed_makes_data_reproducible(self):
+        self.feed(seed=11)
+        first = list(SaleItem.objects.values_list("product__sku", "quantity"))
+        self.feed(seed=11)
+        self.assertEqual(
+            first, list(SaleItem.objects.values_list("product__sku", "quantity"))
+        )
+
+    def test_reloads_over_open_alerts(self):
+        self.feed()
+        product = Product.objects.filter(is_low_stock=False).first()
+        product.quantity = 0
+        product.save()
+        self.assertTrue(LowStockAlert.objects.filter(product=product).exists())
+        self.feed()
+        self.assertFalse(LowStockAlert.objects.filter(product=product).exists())
+
+    def test_ledger_follows_the_sales_history(self):
+        self.feed()
+        product = (
+            Product.objects.annotate(lines=Count("saleitem")).order_by("-lines").first()
+        )
+        opening = product.movements.get(reason=StockMovement.OPENING).delta
+        movements = product.movements.filter(reason=StockMovement.SALE)
+        self.assertGreater(movements.count(), 1)
+        for movement in movements:
+            units = SaleItem.objects.filter(
+                product=product, sale__datetime__lte=movement.created_at
+            ).aggregate(n=Sum("quantity"))["n"]
+            self.assertEqual(stock_at(product, movement.created_at), opening - units)
@@ -0,0 +1,47 @@
+"""The datasets the suite runs against, built with ``feed_db`` + ``seed_sales``."""
+
+from django.core.management import call_command
+
+from inventory.models import Product
+from sales.models import Sale
+
+DATASETS = {
+    "10k": {"users": 20, "categories": 20, "products": 2_000, "sales": 10_000},
+    "1m": {"users": 100, "categories": 50, "products": 20_000, "sales": 1_000_000},
+    "10m": {
+        "users": 500,
+        "categories": 100,
+        "products": 100_000,
+        "sales": 10_000_000,
+    },
+}
+
+
+def build(name, workers=1, seed=2025, stdout=None):
+    """Wipe the database and load dataset ``name``; superusers are kept."""
+    size = DATASETS[name]
+    call_command(
+        "feed_db",
+        users=size["users"],
+        categories=size["categories"],
+        products=size["products"],
+        sales=0,
+        seed=seed,
+        stdout=stdout,
+    )
+    # seed_sales spreads the bulk of the work across processes
+    call_command(
+        "seed_sales",
+        sales=size["sales"],
+        workers=workers,
+        seed=seed,
+        stdout=stdout,
+    )
+
+
+def describe():
+    """What the database holds, recorded next to the results."""
+    return {
+        "sales": Sale.objects.count(),
+        "products": Product.objects.count(),
+    }
@@ -0,0 +1,247 @@
+"""
+A load generator: simulated cashiers driving a running server over HTTP.
+
+Each ``Cashier`` logs in as one staff account with its own
+``requests.Session`` and, until the deadline, picks an action by weight:
+``checkout`` (GET the sale form, POST a sale of a few lines), ``browse``
+(the product list and a few of its next pages) or ``dashboard``, with an
+exponentially distributed think time between actions.
+
+``consistency`` then checks the database the server writes to: every sale
+the cashiers made has matching stock movements and total, stock went
+nowhere the journal does not say, and no product went negative.
+"""
+
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+from urllib.parse import unquote
+
+import requests
+from django.db.models import Max, Sum
+from django.urls import reverse
+from django.utils import timezone
+
+from erp_project.perf import percentile
+from inventory.models import Product, StockMovement
+from inventory.services import ledger_drift
+from sales.models import Sale, SaleItem
+
+ACTIONS = ("checkout", "browse", "dashboard")
+
+_NEXT_PAGE = re.compile(r'href="\?cursor=([^"]+)">›')
+
+
+class LoginFailed(Exception):
+    pass
+
+
+class Recorder:
+    """Outcomes and latencies of every request, by step."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.steps = defaultdict(lambda: {"latencies": [], "ok": 0, "errors": 0})
+        self.rejected = 0  # checkouts the form refused, e.g. for stock
+        self.sales = 0
+        self.error_samples = []
+
+    def add(self, step, latency, ok, detail=""):
+        with self.lock:
+            stats = self.steps[step]
+            stats["latencies"].append(latency)
+            if ok:
+                stats["ok"] += 1
+            else:
+                stats["errors"] += 1
+                if len(self.error_samples) < 10:
+                    self.error_samples.append(f"{step}: {detail}")
+
+    def summary(self, elapsed):
+        rows = {}
+        for step, stats in sorted(self.steps.items()):
+            ordered = sorted(stats["latencies"])
+            total = len(ordered)
+            rows[step] = {
+                "requests": total,
+                "errors": stats["errors"],
+                "error_rate": stats["errors"] / total if total else 0,
+                "per_s": total / elapsed,
+                "p50_ms": percentile(ordered, 0.5) * 1000,
+                "p95_ms": percentile(ordered, 0.95) * 1000,
+                "p99_ms": percentile(ordered, 0.99) * 1000,
+                "max_ms": ordered[-1] * 1000,
+            }
+        return rows
+
+
+class Cashier(threading.Thread):
+    def __init__(self, base_url, user, password, products, options, recorder):
+        super().__init__(name=f"cashier-{user.username}")
+        self.base_url = base_url.rstrip("/")
+        self.user = user
+        self.password = password
+        self.products = products
+        self.options = options
+        self.recorder = recorder
+        self.rng = random.Random(f"{options['seed']}:{user.pk}")
+        self.session = requests.Session()
+        self.login_error = None
+
+    def request(self, step, method, path, **kwargs):
+        """One timed request; ``None`` if it failed at the HTTP level."""
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method,
+                self.base_url + path,
+                timeout=self.options["timeout"],
+                allow_redirects=False,
+                **kwargs,
+            )
+        except requests.RequestException as exc:
+            self.recorder.add(step, time.perf_counter() - started, False, repr(exc))
+            return None
+        latency = time.perf_counter() - started
+        ok = response.status_code < 400
+        self.recorder.add(step, latency, ok, f"HTTP {response.status_code} {path}")
+        return response if ok else None
+
+    def post(self, step, path, data):
+        token = self.session.cookies.get("csrftoken", "")
+        return self.request(
+            step,
+            "POST",
+            path,
+            data={"csrfmiddlewaretoken": token, **data},
+            headers={"Referer": self.base_url + path, "X-CSRFToken": token},
+        )
+
+    def login(self):
+        path = reverse("login")
+        self.request("login", "GET", path)
+        response = self.post(
+            "login", path, {"username": self.user.username, "password": self.password}
+        )
+        if response is None or response.status_code != 302:
+            raise LoginFailed(f"{self.user.username} could not log in")
+
+    def run(self):
+        try:
+            self.login()
+        except LoginFailed as exc:
+            self.login_error = str(exc)
+            return
+        actions, weights = zip(*self.options["mix"].items())
+        while time.monotonic() < self.options["deadline"]:
+            action = self.rng.choices(actions, weights)[0]
+            getattr(self, action)()
+            if self.options["think"]:
+                time.sleep(self.rng.expovariate(1 / self.options["think"]))
+        self.session.close()
+
+    def checkout(self):
+        path = reverse("sale_create")
+        if self.request("sale_form", "GET", path) is None:
+            return
+        lines = self.rng.sample(
+            self.products, min(len(self.products), self.rng.randint(1, 4))
+        )
+        data = {
+            "cashier": self.user.pk,
+            "datetime": timezone.localtime().strftime("%Y-%m-%d %H:%M:%S"),
+            "items-TOTAL_FORMS": len(lines),
+            "items-INITIAL_FORMS": 0,
+            "items-MIN_NUM_FORMS": 1,
+            "items-MAX_NUM_FORMS": 1000,
+        }
+        for n, product in enumerate(lines):
+            data[f"items-{n}-product"] = product
+            data[f"items-{n}-quantity"] = self.rng.randint(1, 3)
+        response = self.post("checkout", path, data)
+        if response is None:
+            return
+        with self.recorder.lock:
+            if response.status_code == 302:
+                self.recorder.sales += 1
+            else:  # the form again, with the insufficient stock error
+                self.recorder.rejected += 1
+
+    def browse(self):
+        path = reverse("product_list")
+        response = self.request("browse", "GET", path)
+        for _ in range(self.rng.randint(0, 3)):
+            found = response is not None and _NEXT_PAGE.search(response.text)
+            if not found:
+                break
+            cursor = unquote(found.group(1))
+            response = self.request("browse", "GET", path, params={"cursor": cursor})
+
+    def dashboard(self):
+        self.request("dashboard", "GET", reverse("dashboard"))
+
+
+def watermarks():
+    """The last sale and stock movement ids, before a run."""
+    return (
+        Sale.objects.aggregate(last=Max("pk"))["last"] or 0,
+        StockMovement.objects.aggregate(last=Max("pk"))["last"] or 0,
+    )
+
+
+def consistency(cashier_ids, product_ids, sale_floor, movement_floor, before):
+    """
+    Violations found after a run, as ``{check: [examples]}``.
+
+    ``before`` is ``{product_id: quantity}`` of ``product_ids`` taken with
+    the watermarks; other writers during the run are fine as long as they
+    journal their stock changes.
+    """
+    violations = defaultdict(list)
+    sales = Sale.objects.filter(pk__gt=sale_floor, cashier_id__in=cashier_ids)
+
+    lines = defaultdict(Decimal)
+    sold = defaultdict(int)
+    for sale_id, product_id, quantity, line_total in SaleItem.objects.filter(
+        sale__in=sales
+    ).values_list("sale_id", "product_id", "quantity", "line_total"):
+        lines[sale_id] += line_total
+        sold[sale_id, product_id] += quantity
+    for pk, total in sales.values_list("pk", "total"):
+        if pk not in lines:
+            violations["sale without lines"].append(pk)
+        elif total != lines[pk]:
+            violations["sale total differs from its lines"].append(pk)
+
+    journaled = defaultdict(int)
+    for reference, product_id, delta in StockMovement.objects.filter(
+        pk__gt=movement_floor,
+        reason=StockMovement.SALE,
+        reference__startswith="sale:",
+    ).values_list("reference", "product_id", "delta"):
+        sale_id = int(reference.split(":", 1)[1])
+        journaled[sale_id, product_id] -= delta
+    for key, units in sold.items():
+        if journaled.get(key) != units:
+            violations["sale line without its stock movement"].append(key)
+
+    moved = dict(
+        StockMovement.objects.filter(pk__gt=movement_floor, product_id__in=product_ids)
+        .values("product")
+        .annotate(total=Sum("delta"))
+        .values_list("product", "total")
+    )
+    for pk, quantity in Product.objects.filter(pk__in=product_ids).values_list(
+        "pk", "quantity"
+    ):
+        if quantity < 0:
+            violations["negative stock"].append(pk)
+        if quantity - before[pk] != moved.get(pk, 0):
+            violations["stock change not in the journal"].append(pk)
+    violations["quantity differs from ledger"] = list(
+        ledger_drift().filter(pk__in=product_ids).values_list("pk", flat=True)
+    )
+    return {check: found for check, found in violations.items() if found}
@@ -0,0 +1,170 @@
+import json
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.load import ACTIONS, Cashier, Recorder, consistency, watermarks
+from inventory.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate concurrent cashiers (seeded staff accounts) against a running "
+        "server, then report throughput, latency, errors and stock consistency. "
+        "Run it against the database the server uses."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument("--cashiers", type=int, default=10)
+        parser.add_argument("--duration", type=float, default=60, help="Seconds")
+        parser.add_argument(
+            "--ramp-up", type=float, default=5, help="Seconds to start every cashier"
+        )
+        parser.add_argument(
+            "--think", type=float, default=1.0, help="Mean seconds between actions"
+        )
+        parser.add_argument(
+            "--mix",
+            default="checkout=5,browse=3,dashboard=2",
+            help="Action weights (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--products",
+            type=int,
+            default=200,
+            help="Size of the stocked product set the cashiers sell from.",
+        )
+        parser.add_argument(
+            "--password",
+            default="demo12345",
+            help="Password of the staff accounts (feed_db's default).",
+        )
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--seed", type=int, default=2025)
+        parser.add_argument("--output", help="Also write the report as JSON here.")
+
+    def handle(self, *args, **opts):
+        mix = self._mix(opts["mix"])
+        users = list(
+            get_user_model()
+            .objects.filter(role="staff", is_active=True)
+            .order_by("pk")[: opts["cashiers"]]
+        )
+        if len(users) < opts["cashiers"]:
+            raise CommandError(
+                f"Only {len(users)} active staff account(s); seed more with "
+                f"feed_db --users or lower --cashiers."
+            )
+        products = dict(
+            Product.objects.filter(is_active=True, quantity__gt=0)
+            .order_by("pk")
+            .values_list("pk", "quantity")[: opts["products"]]
+        )
+        if not products:
+            raise CommandError("No stocked products to sell.")
+
+        sale_floor, movement_floor = watermarks()
+        recorder = Recorder()
+        options = {
+            "mix": mix,
+            "think": opts["think"],
+            "timeout": opts["timeout"],
+            "seed": opts["seed"],
+            "deadline": time.monotonic() + opts["ramp_up"] + opts["duration"],
+        }
+        cashiers = [
+            Cashier(
+                opts["url"], user, opts["password"], list(products), options, recorder
+            )
+            for user in users
+        ]
+        self.stdout.write(
+            f"{len(cashiers)} cashiers against {opts['url']} for "
+            f"{opts['ramp_up']:g}s ramp-up + {opts['duration']:g}s"
+        )
+        started = time.monotonic()
+        for cashier in cashiers:
+            cashier.start()
+            time.sleep(opts["ramp_up"] / len(cashiers))
+        for cashier in cashiers:
+            # join with a timeout so Ctrl+C still reaches the main thread
+            while cashier.is_alive():
+                cashier.join(0.5)
+        elapsed = time.monotonic() - started
+
+        failed = [cashier.login_error for cashier in cashiers if cashier.login_error]
+        for error in failed:
+            self.stderr.write(error)
+        if len(failed) == len(cashiers):
+            raise CommandError("No cashier could log in; check --url and --password.")
+
+        steps = recorder.summary(elapsed)
+        violations = consistency(
+            [user.pk for user in users],
+            list(products),
+            sale_floor,
+            movement_floor,
+            products,
+        )
+        report = {
+            "cashiers": len(cashiers) - len(failed),
+            "seconds": elapsed,
+            "sales": recorder.sales,
+            "rejected_checkouts": recorder.rejected,
+            "sales_per_s": recorder.sales / elapsed,
+            "steps": steps,
+            "error_samples": recorder.error_samples,
+            "violations": violations,
+        }
+        self._print(report)
+        if opts["output"]:
+            Path(opts["output"]).write_text(
+                json.dumps(report, indent=2, default=str) + "\n"
+            )
+        if violations:
+            raise CommandError(f"{len(violations)} stock consistency check(s) failed.")
+
+    def _mix(self, raw):
+        mix = {}
+        for pair in raw.split(","):
+            action, _, weight = pair.partition("=")
+            action = action.strip()
+            if action not in ACTIONS:
+                raise CommandError(
+                    f"Unknown action {action!r}; choose from {', '.join(ACTIONS)}."
+                )
+            try:
+                mix[action] = float(weight)
+            except ValueError:
+                raise CommandError(f"Bad weight in --mix: {pair!r}")
+        if not any(mix.values()):
+            raise CommandError("--mix needs a positive weight.")
+        return mix
+
+    def _print(self, report):
+        self.stdout.write(
+            f"\n{report['sales']} sales ({report['sales_per_s']:.1f}/s), "
+            f"{report['rejected_checkouts']} checkouts refused by the form, "
+            f"in {report['seconds']:.0f}s"
+        )
+        self.stdout.write(
+            f"{'step':10} {'requests':>8} {'req/s':>7} {'errors':>7} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        )
+        for step, row in report["steps"].items():
+            self.stdout.write(
+                f"{step:10} {row['requests']:8d} {row['per_s']:7.1f} "
+                f"{row['error_rate']:7.1%} {row['p50_ms']:8.1f} "
+                f"{row['p95_ms']:8.1f} {row['p99_ms']:8.1f} {row['max_ms']:8.1f}"
+            )
+        for sample in report["error_samples"]:
+            self.stdout.write(self.style.WARNING(f"  {sample}"))
+        if not report["violations"]:
+            self.stdout.write(self.style.SUCCESS("Stock is consistent."))
+        for check, found in report["violations"].items():
+            self.stdout.write(
+                self.style.ERROR(f"{check}: {len(found)} (e.g. {found[:5]})")
+            )
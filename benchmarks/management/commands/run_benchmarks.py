@@ -0,0 +1,185 @@
+import json
+import platform
+import subprocess
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+
+from benchmarks import datasets, suite
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the dashboard, sale list/detail, checkout and admin changelists "
+        "and write the results as JSON; --baseline flags regressions"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dataset",
+            choices=sorted(datasets.DATASETS),
+            help="Label the results with this dataset (see --build).",
+        )
+        parser.add_argument(
+            "--build",
+            action="store_true",
+            help="WIPE the database and load --dataset before running.",
+        )
+        parser.add_argument("--workers", type=int, default=1, help="For --build")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument("--seed", type=int, default=2025)
+        parser.add_argument(
+            "--only", nargs="+", metavar="NAME", help="Run just these benchmarks."
+        )
+        parser.add_argument(
+            "--list", action="store_true", help="List the benchmarks and exit."
+        )
+        parser.add_argument(
+            "--output",
+            default="benchmark-results.json",
+            help="Where to write the results (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--baseline", help="Earlier results to compare with; regressions fail."
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="Allowed p50 slowdown against --baseline (default: %(default)s).",
+        )
+
+    def handle(self, *args, **opts):
+        available = suite.benchmarks()
+        if opts["list"]:
+            for name in available:
+                self.stdout.write(name)
+            return
+        names = opts["only"] or list(available)
+        unknown = sorted(set(names) - set(available))
+        if unknown:
+            raise CommandError(f"Unknown benchmark(s): {', '.join(unknown)}")
+        if opts["repeat"] < 1:
+            raise CommandError("--repeat must be positive")
+        if opts["build"]:
+            if not opts["dataset"]:
+                raise CommandError("--build needs --dataset")
+            datasets.build(
+                opts["dataset"],
+                workers=opts["workers"],
+                seed=opts["seed"],
+                stdout=self.stdout,
+            )
+
+        user = get_user_model().objects.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError("The benchmarks need a superuser (manage.py ca).")
+        baseline = self._load(opts["baseline"]) if opts["baseline"] else None
+
+        meta = {
+            "dataset": opts["dataset"],
+            **datasets.describe(),
+            "started": timezone.now().isoformat(),
+            "repeat": opts["repeat"],
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "commit": self._commit(),
+        }
+        self.stdout.write(
+            f"{meta['sales']:,} sales, {meta['products']:,} products; "
+            f"{opts['repeat']} runs each, cache off"
+        )
+        self.stdout.write(
+            f"{'benchmark':32} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} "
+            f"{'queries':>7} {'ops/s':>7}"
+        )
+        # measure the queries, not the dashboard cache
+        with override_settings(
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+            }
+        ):
+            results = suite.run(
+                user,
+                names,
+                opts["repeat"],
+                warmup=opts["warmup"],
+                seed=opts["seed"],
+                report=self._report,
+            )
+
+        output = Path(opts["output"])
+        output.write_text(
+            json.dumps({"meta": meta, "benchmarks": results}, indent=2) + "\n"
+        )
+        self.stdout.write(f"Results written to {output}")
+        if baseline is not None:
+            self._compare(results, baseline, meta, opts["tolerance"])
+
+    def _load(self, path):
+        try:
+            return json.loads(Path(path).read_text())
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read baseline {path}: {exc}")
+
+    def _commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _report(self, name, stats):
+        errors = f"  {stats['errors']} error(s)" if stats["errors"] else ""
+        self.stdout.write(
+            f"{name:32} {stats['p50_ms']:8.1f} {stats['p95_ms']:8.1f} "
+            f"{stats['max_ms']:8.1f} {stats['queries']:7d} "
+            f"{stats['ops_per_s']:7.1f}{errors}"
+        )
+
+    def _compare(self, results, baseline, meta, tolerance):
+        before = baseline.get("meta", {})
+        # the sale count drifts as checkout runs add sales, so it is not compared
+        for key in ("dataset", "database"):
+            if before.get(key) != meta[key]:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"Baseline {key} is {before.get(key)!r}, "
+                        f"this run's is {meta[key]!r}."
+                    )
+                )
+        self.stdout.write(
+            f"\n{'against baseline':32} {'p50 was':>8} {'p50 now':>8} "
+            f"{'change':>7} {'queries':>9}"
+        )
+        regressions = []
+        for name, was, now, regressed in suite.compare(
+            results, baseline.get("benchmarks", {}), tolerance
+        ):
+            change = now["p50_ms"] / was["p50_ms"] - 1 if was["p50_ms"] else 0
+            line = (
+                f"{name:32} {was['p50_ms']:8.1f} {now['p50_ms']:8.1f} "
+                f"{change:+7.0%} {was['queries']:>4}→{now['queries']:<4}"
+            )
+            if regressed:
+                regressions.append(name)
+                line = self.style.ERROR(line + " REGRESSED")
+            self.stdout.write(line)
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} regression(s): {', '.join(regressions)}"
+            )
+        self.stdout.write(self.style.SUCCESS("No regressions."))
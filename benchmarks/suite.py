@@ -0,0 +1,191 @@
+"""
+The benchmarks and the code that times and compares them.
+
+Each benchmark is a setup function taking the test ``Client``, the
+superuser it is logged in as and a seeded ``Random``; it returns the operation to time,
+a callable making one request through the full middleware stack.  Every
+admin changelist gets a benchmark of its own (``admin:<app>_<model>``).
+"""
+
+import random
+import statistics
+import time
+
+from django.contrib import admin
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from erp_project.pagination import KeysetPaginator
+from inventory.models import Product
+from inventory.services import put_stock
+from sales.models import Sale
+from sales.views import SaleListView
+
+BENCHMARKS = {}
+
+
+def benchmark(setup):
+    BENCHMARKS[setup.__name__] = setup
+    return setup
+
+
+@benchmark
+def dashboard(client, user, rng):
+    url = reverse("dashboard")
+    return lambda: client.get(url)
+
+
+@benchmark
+def sale_list(client, user, rng):
+    url = reverse("sale_list")
+    return lambda: client.get(url)
+
+
+@benchmark
+def sale_list_deep(client, user, rng):
+    """The page 90% of the way down the sale list, reached by its cursor."""
+    paginator = KeysetPaginator(
+        SaleListView.queryset, SaleListView.paginate_by, SaleListView.keyset
+    )
+    # the cursor of the row just before the page
+    offset = max(Sale.objects.count() * 9 // 10 - 1, 0)
+    rows = list(paginator.queryset[offset : offset + 1])
+    cursor = paginator.cursor_for(rows[0], "next", offset + 2) if rows else ""
+    url = reverse("sale_list")
+    return lambda: client.get(url, {"cursor": cursor})
+
+
+@benchmark
+def sale_detail(client, user, rng):
+    last = Sale.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+    candidates = [rng.randint(1, last) for _ in range(200)] if last else []
+    pks = list(Sale.objects.filter(pk__in=candidates).values_list("pk", flat=True)) or [
+        0
+    ]
+    return lambda: client.get(reverse("sale_detail", args=[rng.choice(pks)]))
+
+
+@benchmark
+def checkout(client, user, rng):
+    """``SaleCreateView`` POSTs of three lines each; every sale is committed."""
+    products = list(
+        Product.objects.filter(is_active=True)
+        .order_by("pk")
+        .values_list("pk", flat=True)[:200]
+    )
+    # enough stock for every run, so none fails on an empty shelf
+    put_stock({pk: 1000 for pk in products}, reference="benchmark")
+    url = reverse("sale_create")
+
+    def post():
+        data = {
+            "cashier": user.pk,
+            "datetime": timezone.localtime().strftime("%Y-%m-%d %H:%M:%S"),
+            "items-TOTAL_FORMS": "3",
+            "items-INITIAL_FORMS": "0",
+            "items-MIN_NUM_FORMS": "1",
+            "items-MAX_NUM_FORMS": "1000",
+        }
+        for n, pk in enumerate(rng.sample(products, min(3, len(products)))):
+            data[f"items-{n}-product"] = pk
+            data[f"items-{n}-quantity"] = rng.randint(1, 3)
+        return client.post(url, data)
+
+    return post
+
+
+def _changelist(url):
+    def setup(client, user, rng):
+        return lambda: client.get(url)
+
+    return setup
+
+
+def benchmarks():
+    """Every benchmark by name, admin changelists included."""
+    found = dict(BENCHMARKS)
+    for model in admin.site._registry:
+        opts = model._meta
+        name = f"admin:{opts.app_label}_{opts.model_name}"
+        found[name] = _changelist(reverse(f"{name}_changelist"))
+    return found
+
+
+def _summary(latencies, queries, errors, elapsed):
+    cuts = (
+        statistics.quantiles(latencies, n=20, method="inclusive")
+        if len(latencies) > 1
+        else latencies * 19
+    )
+    return {
+        "runs": len(latencies),
+        "errors": errors,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": cuts[18] * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "max_ms": max(latencies) * 1000,
+        # the typical count: a checkout now and then also flips low-stock flags
+        "queries": statistics.median_low(queries),
+        "ops_per_s": len(latencies) / elapsed,
+    }
+
+
+def measure(operation, repeat, warmup=1):
+    """Time ``repeat`` runs of ``operation`` after ``warmup`` untimed ones."""
+    for _ in range(warmup):
+        operation()
+    latencies, queries, errors = [], [], 0
+    count = [0]
+
+    def counted(execute, sql, params, many, context):
+        count[0] += 1
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    with connection.execute_wrapper(counted):
+        for _ in range(repeat):
+            count[0] = 0
+            run_started = time.perf_counter()
+            response = operation()
+            latencies.append(time.perf_counter() - run_started)
+            queries.append(count[0])
+            errors += response.status_code >= 400
+    return _summary(latencies, queries, errors, time.perf_counter() - started)
+
+
+def run(user, names, repeat, warmup=1, seed=0, report=None):
+    """``{name: summary}`` for the benchmarks in ``names``, in that order."""
+    available = benchmarks()
+    client = Client()
+    client.force_login(user)
+    rng = random.Random(seed)
+    results = {}
+    for name in names:
+        operation = available[name](client, user, rng)
+        results[name] = measure(operation, repeat, warmup)
+        if report:
+            report(name, results[name])
+    return results
+
+
+def compare(results, baseline, tolerance, floor_ms=2.0):
+    """
+    ``[(name, before, after, regressed)]`` for the benchmarks in both runs.
+
+    A benchmark regresses when it runs more queries than before, or when
+    its p50 grew by more than ``tolerance`` (0.25 = 25%) and by more than
+    ``floor_ms``, which keeps the noise of fast pages out.
+    """
+    rows = []
+    for name, after in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        slower = after["p50_ms"] - before["p50_ms"]
+        regressed = after["queries"] > before["queries"] or (
+            after["p50_ms"] > before["p50_ms"] * (1 + tolerance) and slower > floor_ms
+        )
+        rows.append((name, before, after, regressed))
+    return rows
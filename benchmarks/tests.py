@@ -0,0 +1,168 @@
+import json
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import LiveServerTestCase, TestCase
+
+from inventory.models import Category, Product, StockMovement
+from sales.models import Sale
+from sales.services import checkout
+
+from .load import consistency, watermarks
+from .suite import compare
+
+
+class RunBenchmarksTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser(
+            username="root", password="pass", role="admin"
+        )
+        category = Category.objects.create(name="Tools")
+        products = [
+            Product.objects.create(
+                category=category,
+                name=f"Product {n}",
+                sku=f"SKU{n}",
+                cost_price=Decimal("1.00"),
+                sell_price=Decimal("2.00"),
+                quantity=100,
+            )
+            for n in range(4)
+        ]
+        for product in products:
+            checkout(cls.admin, [(product, 1)])
+
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+
+    def run_suite(self, *args, **options):
+        out = StringIO()
+        call_command(
+            "run_benchmarks",
+            *args,
+            repeat=2,
+            warmup=0,
+            output=self.dir / "results.json",
+            stdout=out,
+            **options,
+        )
+        return json.loads((self.dir / "results.json").read_text()), out.getvalue()
+
+    def test_every_benchmark_runs_and_is_written_as_json(self):
+        results, out = self.run_suite()
+        benchmarks = results["benchmarks"]
+        for name in (
+            "dashboard",
+            "sale_list",
+            "sale_list_deep",
+            "sale_detail",
+            "checkout",
+            "admin:sales_sale",
+        ):
+            self.assertEqual(benchmarks[name]["runs"], 2, name)
+            self.assertEqual(benchmarks[name]["errors"], 0, name)
+            self.assertGreater(benchmarks[name]["queries"], 0, name)
+        self.assertEqual(Sale.objects.count(), 4 + 2)  # the checkout runs
+        self.assertEqual(results["meta"]["database"], "sqlite")
+        self.assertIn("admin:inventory_product", out)
+
+    def test_baseline_comparison_flags_regressions(self):
+        results, _ = self.run_suite(only=["sale_detail"])
+        baseline = self.dir / "baseline.json"
+        baseline.write_text(json.dumps(results))
+        _, out = self.run_suite(only=["sale_detail"], baseline=baseline)
+        self.assertIn("No regressions.", out)
+
+        results["benchmarks"]["sale_detail"]["queries"] -= 1
+        baseline.write_text(json.dumps(results))
+        with self.assertRaisesMessage(CommandError, "1 regression(s): sale_detail"):
+            self.run_suite(only=["sale_detail"], baseline=baseline)
+
+    def test_compare_ignores_small_or_tolerated_slowdowns(self):
+        def stats(p50, queries=5):
+            return {"p50_ms": p50, "queries": queries}
+
+        rows = compare(
+            {"a": stats(2.5), "b": stats(120), "c": stats(130), "new": stats(1)},
+            {"a": stats(0.6), "b": stats(100), "c": stats(100)},
+            tolerance=0.25,
+        )
+        self.assertEqual(
+            [(name, regressed) for name, _, _, regressed in rows],
+            [("a", False), ("b", False), ("c", True)],
+        )
+
+
+class LoadTestTests(LiveServerTestCase):
+    def setUp(self):
+        self.cashier = get_user_model().objects.create_user(
+            username="clerk", password="pass", role="staff"
+        )
+        category = Category.objects.create(name="Tools")
+        self.products = [
+            Product.objects.create(
+                category=category,
+                name=f"Product {n}",
+                sku=f"SKU{n}",
+                cost_price=Decimal("1.00"),
+                sell_price=Decimal("2.00"),
+                quantity=500,
+            )
+            for n in range(5)
+        ]
+
+    def test_cashiers_sell_and_stock_stays_consistent(self):
+        out = StringIO()
+        output = Path(tempfile.mkdtemp()) / "load.json"
+        # one cashier: the live server shares the in-memory test database
+        call_command(
+            "load_test",
+            url=self.live_server_url,
+            cashiers=1,
+            duration=1.5,
+            ramp_up=0,
+            think=0,
+            password="pass",
+            output=output,
+            stdout=out,
+        )
+        report = json.loads(output.read_text())
+        self.assertGreater(report["sales"], 0)
+        self.assertEqual(Sale.objects.count(), report["sales"])
+        self.assertEqual(report["steps"]["login"]["errors"], 0)
+        self.assertEqual(report["violations"], {})
+        self.assertIn("Stock is consistent.", out.getvalue())
+
+    def test_consistency_finds_unjournaled_stock_changes(self):
+        before = {p.pk: p.quantity for p in self.products}
+        sale_floor, movement_floor = watermarks()
+        sale = checkout(self.cashier, [(self.products[0], 2), (self.products[1], 1)])
+        args = ([self.cashier.pk], list(before), sale_floor, movement_floor, before)
+        self.assertEqual(consistency(*args), {})
+
+        Product.objects.filter(pk=self.products[2].pk).update(quantity=400)
+        StockMovement.objects.filter(reference=f"sale:{sale.pk}").first().delete()
+        Sale.objects.filter(pk=sale.pk).update(total=0)
+        violations = consistency(*args)
+        self.assertEqual(
+            set(violations),
+            {
+                "sale total differs from its lines",
+                "sale line without its stock movement",
+                "stock change not in the journal",
+                "quantity differs from ledger",
+            },
+        )
+        self.assertEqual(
+            sorted(violations["stock change not in the journal"]),
+            [self.products[0].pk, self.products[2].pk],
+        )
+
+    def test_too_few_staff_accounts(self):
+        with self.assertRaisesMessage(CommandError, "Only 1 active staff account"):
+            call_command("load_test", cashiers=2, stdout=StringIO())
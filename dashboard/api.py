@@ -0,0 +1,35 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from erp_project.api import ApiError, JsonApiView, make_etag
+from .caching import get_block
+from .views import BLOCKS
+
+
+class DashboardApiView(JsonApiView):
+    """
+    The dashboard blocks as JSON; ``?blocks=metrics,top_products`` picks
+    some.
+
+    The blocks come from the dashboard cache, so the ``ETag`` is simply a
+    hash of the document: validating a poll costs no query on a warm cache.
+    """
+
+    def parse(self):
+        names = self.request.GET.get("blocks")
+        names = [name.strip() for name in names.split(",")] if names else BLOCKS
+        unknown = [name for name in names if name not in BLOCKS]
+        if unknown:
+            raise ApiError(f"Unknown block(s): {', '.join(unknown)}")
+        self.blocks = list(dict.fromkeys(names))
+
+    def get_validators(self):
+        self.data = {}
+        for name in self.blocks:
+            self.data.update(get_block(name, BLOCKS[name]))
+        body = json.dumps(self.data, cls=DjangoJSONEncoder, sort_keys=True)
+        return make_etag(body), None
+
+    def get_data(self):
+        return self.data
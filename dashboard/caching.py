@@ -0,0 +1,54 @@
+"""
+Per-block cache for the dashboard.
+
+Each block of ``dashboard_view`` is cached under its own key for
+``DASHBOARD_CACHE_TTL`` seconds; ``dashboard.signals`` drops the blocks a
+write can affect, so the TTL only bounds staleness from writes that bypass
+signals (raw SQL, other processes sharing a local-memory cache).
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+BLOCKS = (
+    "metrics",
+    "sales_over_time",
+    "inventory_by_category",
+    "low_stock",
+    "category_revenue",
+    "top_products",
+    "user_distribution",
+    "top_staff",
+)
+
+
+def block_key(name):
+    return f"dashboard:{name}"
+
+
+def get_block(name, compute):
+    """Return the cached value of block ``name``, computing it on a miss."""
+    return cache.get_or_set(block_key(name), compute, settings.DASHBOARD_CACHE_TTL)
+
+
+async def aget_block(name, compute):
+    """``get_block`` for async views; ``compute`` is a coroutine function."""
+    key = block_key(name)
+    value = await cache.aget(key)
+    if value is None:
+        value = await compute()
+        await cache.aset(key, value, settings.DASHBOARD_CACHE_TTL)
+    return value
+
+
+def invalidate(blocks=BLOCKS):
+    """
+    Drop ``blocks`` now and again when the current transaction commits.
+
+    The second delete catches a reader that re-cached the old values
+    between the write and its commit.
+    """
+    keys = [block_key(name) for name in blocks]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,384 @@
+"""
+Live dashboard updates over Server-Sent Events.
+
+One ``Broadcaster`` thread per process polls for committed changes every
+``DASHBOARD_LIVE_INTERVAL`` seconds and fans the deltas out to every open
+stream, so the database sees the same three index range reads per tick
+whether one dashboard is open or a hundred.  Polling (rather than model
+signals) also picks up sales committed by other processes.
+
+Ids are handed out before commit, so with concurrent checkouts sale N+1
+can be visible while N is not yet; an ``IdCursor`` keeps reading the
+missing ids just below the newest one and reports each row once.
+
+Events:
+
+``sales``
+    ``{"sales", "revenue", "days": [{"day", "sales", "revenue"}]}`` for
+    the sales the client had not seen; the event id is the client's
+    ``IdCursor``, for ``Last-Event-ID``.
+``low_stock``
+    ``{"rows": [...], "left": [ids], "reset": bool}``; ``rows`` are
+    products now at or below their minimum stock, ``left`` the ones that
+    recovered.  ``reset`` rows replace the whole table.
+"""
+
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connections
+from django.db.models import F, Max, Q
+from django.db.models.functions import TruncDate
+
+from inventory.models import LowStockAlert, Product, StockMovement
+from sales.models import Sale
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = 15  # seconds between keep-alive comments
+# published once the poller has its starting point: anything committed
+# between a stream's own catch-up and that point reaches no broadcast
+RESYNC = "resync"
+QUEUE_SIZE = 100  # events buffered per client before it must catch up
+# how far below the newest id a cursor still waits for late commits; a gap
+# that never fills (a rolled back or deleted row) drops out past it
+LATE_COMMIT_WINDOW = 1000
+
+
+def low_stock_values(queryset):
+    """The low-stock table's rows, shared by the dashboard block and events."""
+    return queryset.values(
+        "id", "name", "quantity", "min_stock", "sku", category_name=F("category__name")
+    )
+
+
+class IdCursor:
+    """
+    How far a reader has got through a table: the highest id it has seen
+    and the ``gaps`` below it, ids not committed yet when it last read.
+    Written as ``"last"`` or ``"last:gap,gap"``.
+    """
+
+    def __init__(self, last=0, gaps=()):
+        self.last = last
+        self.gaps = set(gaps)
+
+    @classmethod
+    def current(cls, queryset):
+        """A cursor at the newest row of ``queryset``."""
+        last = queryset.aggregate(last=Max("pk"))["last"] or 0
+        cursor = cls(max(last - LATE_COMMIT_WINDOW, 0))
+        cursor.advance(
+            queryset.filter(pk__gt=cursor.last, pk__lte=last).values_list(
+                "pk", flat=True
+            )
+        )
+        return cursor
+
+    @classmethod
+    def parse(cls, value):
+        """The cursor ``str()`` wrote; ``ValueError`` if it is not one."""
+        last, _, gaps = value.partition(":")
+        return cls(int(last), [int(pk) for pk in gaps.split(",") if pk])
+
+    def __str__(self):
+        if not self.gaps:
+            return str(self.last)
+        return f"{self.last}:{','.join(map(str, sorted(self.gaps)))}"
+
+    def filter(self, queryset):
+        """The rows of ``queryset`` that may be new to the cursor."""
+        if not self.gaps:
+            return queryset.filter(pk__gt=self.last)
+        return queryset.filter(Q(pk__gt=self.last) | Q(pk__in=self.gaps))
+
+    def advance(self, ids):
+        """Take in the ``ids`` just read; return those not seen before."""
+        fresh = {pk for pk in ids if pk > self.last or pk in self.gaps}
+        if fresh:
+            top = max(self.last, *fresh)
+            floor = top - LATE_COMMIT_WINDOW
+            gaps = self.gaps | set(range(max(self.last, floor) + 1, top + 1))
+            self.gaps = {pk for pk in gaps - fresh if pk > floor}
+            self.last = top
+        return fresh
+
+
+def sale_rows(queryset):
+    """``(pk, day, total)`` of the sales in ``queryset``."""
+    return list(
+        queryset.annotate(day=TruncDate("datetime"))
+        .order_by("pk")
+        .values_list("pk", "day", "total")
+    )
+
+
+def sales_delta(rows):
+    """Counts and revenue, in all and per day, of ``(pk, day, total)`` rows."""
+    days = defaultdict(lambda: [0, Decimal(0)])
+    for _, day, total in rows:
+        days[day][0] += 1
+        days[day][1] += total or 0
+    days = [
+        {"day": day.strftime("%Y-%m-%d"), "sales": sales, "revenue": float(revenue)}
+        for day, (sales, revenue) in sorted(days.items())
+    ]
+    return {
+        "sales": len(rows),
+        "revenue": sum(day["revenue"] for day in days),
+        "days": days,
+    }
+
+
+def format_event(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, cls=DjangoJSONEncoder)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class Poller:
+    """The broadcaster's view of the database: what it has already seen."""
+
+    def __init__(self):
+        self.sales = IdCursor.current(Sale.objects)
+        self.movements = IdCursor.current(StockMovement.objects)
+        self.alerts = IdCursor.current(LowStockAlert.objects)
+
+    def poll(self):
+        """
+        Yield ``(event, data)`` for everything committed since the last
+        call; each event is yielded as soon as its state has moved on, so a
+        failing query loses no earlier event.
+        """
+        rows = sale_rows(self.sales.filter(Sale.objects))
+        if rows:
+            self.sales.advance(row[0] for row in rows)
+            yield "sales", {"rows": rows}
+
+        # new alerts name the products that crossed min_stock; new
+        # movements the low ones whose shown quantity is stale
+        moved = list(
+            self.movements.filter(StockMovement.objects).values_list("pk", "product_id")
+        )
+        alerted = list(
+            self.alerts.filter(LowStockAlert.objects).values_list("pk", "product_id")
+        )
+        if moved or alerted:
+            products = {product for _, product in moved + alerted}
+            rows = list(
+                low_stock_values(
+                    Product.objects.filter(is_low_stock=True, pk__in=products)
+                )
+            )
+            left = sorted(
+                {product for _, product in alerted} - {row["id"] for row in rows}
+            )
+            self.movements.advance(pk for pk, _ in moved)
+            self.alerts.advance(pk for pk, _ in alerted)
+            if rows or left:
+                yield "low_stock", {"rows": rows, "left": left}
+
+
+class Subscription:
+    """A WSGI client's queue; ``put`` runs on the broadcaster thread."""
+
+    def __init__(self):
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.dropped = False  # the stream must catch up with a query
+
+    def put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped = True
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription:
+    """An ASGI client's queue, fed through its event loop."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.dropped = False
+
+    def put(self, item):
+        self.loop.call_soon_threadsafe(self._put, item)
+
+    def _put(self, item):
+        if self.queue.full():
+            self.dropped = True
+        else:
+            self.queue.put_nowait(item)
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except TimeoutError:
+            return None
+
+
+class Broadcaster:
+    """
+    Fan ``Poller`` events out to the subscribed streams.
+
+    The polling thread starts with the first subscriber and exits once the
+    last one has gone.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.thread = None
+        self.poller = None
+
+    def subscribe(self, subscription):
+        with self.lock:
+            self.subscribers.add(subscription)
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._run, name="dashboard-live", daemon=True
+                )
+                self.thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def publish(self, event, data):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.put((event, data))
+            except RuntimeError:  # its event loop is gone
+                self.unsubscribe(subscription)
+
+    def _run(self):
+        try:
+            while True:
+                with self.lock:
+                    if not self.subscribers:
+                        self.thread = self.poller = None
+                        return
+                close_old_connections()
+                try:
+                    if self.poller is None:
+                        self.poller = Poller()
+                        self.publish(RESYNC, None)
+                    else:
+                        for event, data in self.poller.poll():
+                            self.publish(event, data)
+                except Exception:
+                    logger.exception("Dashboard live poll failed")
+                time.sleep(settings.DASHBOARD_LIVE_INTERVAL)
+        finally:
+            connections.close_all()
+
+
+broadcaster = Broadcaster()
+
+
+class Feed:
+    """
+    One client's position in the ``sales`` events.
+
+    ``cursor`` is the ``IdCursor`` of the sales the client has counted
+    (``None``: whatever arrives next).  On connecting, and after its queue
+    overflowed, the client is caught up with its own query plus the current
+    low-stock rows from ``low_stock()``; otherwise it only receives the
+    shared broadcast, minus the sales its catch-up already counted.
+    """
+
+    def __init__(self, cursor, low_stock):
+        self.cursor = cursor
+        self.low_stock = low_stock
+
+    def catch_up(self):
+        """Events bringing the client up to date with the database."""
+        if self.cursor is None:
+            self.cursor = IdCursor.current(Sale.objects)
+            return []
+        messages = []
+        rows = sale_rows(self.cursor.filter(Sale.objects))
+        if rows:
+            self.cursor.advance(row[0] for row in rows)
+            messages.append(self.sales_event(rows))
+        messages.append(
+            format_event(
+                "low_stock", {"rows": self.low_stock(), "left": [], "reset": True}
+            )
+        )
+        return messages
+
+    def render(self, event, data):
+        if event == RESYNC:
+            return []
+        if event == "sales":
+            fresh = self.cursor.advance(row[0] for row in data["rows"])
+            rows = [row for row in data["rows"] if row[0] in fresh]
+            return [self.sales_event(rows)] if rows else []
+        return [format_event(event, data)]
+
+    def sales_event(self, rows):
+        return format_event("sales", sales_delta(rows), str(self.cursor))
+
+
+def sync_stream(feed):
+    """The event stream for a WSGI worker (one thread per client)."""
+    subscription = broadcaster.subscribe(Subscription())
+    try:
+        yield "retry: 3000\n\n"
+        yield from feed.catch_up()
+        while True:
+            item = subscription.get(HEARTBEAT)
+            if subscription.dropped or (item and item[0] == RESYNC):
+                subscription.dropped = False
+                yield from feed.catch_up()
+            if item is None:
+                yield ": ping\n\n"
+                continue
+            yield from feed.render(*item)
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+async def async_stream(feed, catch_up):
+    """
+    The event stream under ASGI; ``catch_up`` is ``feed.catch_up`` wrapped
+    for the async context.
+    """
+    subscription = broadcaster.subscribe(AsyncSubscription(asyncio.get_running_loop()))
+    try:
+        yield "retry: 3000\n\n"
+        for message in await catch_up():
+            yield message
+        while True:
+            item = await subscription.get(HEARTBEAT)
+            if subscription.dropped or (item and item[0] == RESYNC):
+                subscription.dropped = False
+                for message in await catch_up():
+                    yield message
+            if item is None:
+                yield ": ping\n\n"
+                continue
+            for message in feed.render(*item):
+                yield message
+    finally:
+        broadcaster.unsubscribe(subscription)
@@ -0,0 +1,94 @@
+import asyncio
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import RequestFactory, override_settings
+
+from dashboard.views import (
+    BLOCKS,
+    _on_own_connection,
+    dashboard_async_view,
+    dashboard_view,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare uncached dashboard latency of the sync (WSGI) view and the "
+        "async view that computes its blocks concurrently"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=30)
+
+    def handle(self, *args, requests, **kwargs):
+        self.request = RequestFactory().get("/")
+        self.request.user = AnonymousUser()
+        self.stdout.write(
+            f"{requests} uncached runs each; 'blocks' rows time the queries "
+            f"alone, 'view' rows add rendering"
+        )
+        self.stdout.write(f"{'':14} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        # measure the queries, not the dashboard cache
+        with override_settings(
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+            }
+        ):
+            self._report("blocks, serial", self._time(self._serial, requests))
+            self._report("view, wsgi", self._time(self._sync_view, requests))
+            # one event loop for all runs, as under an ASGI server, so pool
+            # threads keep their connections
+            gathered, view = asyncio.run(self._async(requests))
+            self._report("blocks, gather", gathered)
+            self._report("view, async", view)
+        connections.close_all()
+
+    def _time(self, func, requests):
+        latencies = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            func()
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    def _serial(self):
+        for compute in BLOCKS.values():
+            compute()
+
+    def _sync_view(self):
+        dashboard_view(self.request)
+
+    async def _async(self, requests):
+        async def gathered():
+            await asyncio.gather(
+                *(_on_own_connection(compute)() for compute in BLOCKS.values())
+            )
+
+        async def view():
+            await dashboard_async_view(self.request)
+
+        results = []
+        for func in (gathered, view):
+            await func()  # open the pool threads' connections
+            latencies = []
+            for _ in range(requests):
+                started = time.perf_counter()
+                await func()
+                latencies.append(time.perf_counter() - started)
+            results.append(latencies)
+        return results
+
+    def _report(self, name, latencies):
+        cuts = (
+            statistics.quantiles(latencies, n=20)
+            if len(latencies) > 1
+            else latencies * 19
+        )
+        self.stdout.write(
+            f"{name:14} {statistics.median(latencies) * 1000:8.1f} "
+            f"{cuts[18] * 1000:8.1f} {max(latencies) * 1000:8.1f}"
+        )
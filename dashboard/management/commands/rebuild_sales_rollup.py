@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from dashboard import rollups
+from dashboard.models import DailySalesRollup, ProductSalesRollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the dashboard sales rollup tables from scratch"
+
+    def handle(self, *args, **kwargs):
+        rollups.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rollups rebuilt: {DailySalesRollup.objects.count()} daily rows, "
+                f"{ProductSalesRollup.objects.count()} product rows."
+            )
+        )
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0001_initial"),
+        ("inventory", "0004_product_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="productsalesrollup",
+            index=models.Index(
+                fields=["-quantity"], name="product_rollup_quantity_idx"
+            ),
+        ),
+    ]
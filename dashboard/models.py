@@ -1,3 +1,65 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+from inventory.models import Category, Product
+
+
+class DailySalesRollup(models.Model):
+    """
+    Pre-aggregated sales per day, cashier and category.
+
+    Rows with an empty ``category`` carry the sale-level counters
+    (``sales_count``); rows with a category carry the line-level counters
+    (``quantity``, ``revenue``).  Summing any column over any subset of rows
+    therefore never double-counts a sale that spans several categories.
+    """
+
+    day = models.DateField()
+    cashier = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, null=True, blank=True, related_name="+"
+    )
+    sales_count = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-day"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "cashier", "category"],
+                name="daily_rollup_day_cashier_category_uniq",
+            ),
+            models.UniqueConstraint(
+                fields=["day", "cashier"],
+                condition=models.Q(category__isnull=True),
+                name="daily_rollup_day_cashier_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} – {self.cashier_id} – {self.category_id or 'sales'}"
+
+
+class ProductSalesRollup(models.Model):
+    """All-time units and revenue per product (feeds "Top Selling Products")."""
+
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name="+")
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-quantity"]
+        indexes = [
+            # top-selling products
+            models.Index(fields=["-quantity"], name="product_rollup_quantity_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.quantity}"
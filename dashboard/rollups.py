@@ -0,0 +1,172 @@
+"""
+Incremental maintenance of the dashboard rollup tables.
+
+Every write path that creates, changes or deletes sales calls into this
+module with *deltas*; ``rebuild()`` recomputes both tables from scratch with
+set-based queries and is the repair tool for anything that bypassed the
+incremental path (raw SQL, ``QuerySet.update``/``delete``).
+
+Like ``Category``'s counters, the daily rows count a line under its
+product's current category: ``move_products()`` carries a product's rows
+along when it changes category, so ``rebuild()`` arrives at the same rows.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from inventory.models import Category
+from .caching import invalidate
+from .models import DailySalesRollup, ProductSalesRollup
+
+
+def sale_day(sale):
+    return timezone.localdate(sale.datetime)
+
+
+def _bump(model, lookup, **deltas):
+    """Add ``deltas`` to the row identified by ``lookup``, creating it if needed."""
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas:
+        return
+    changes = {field: F(field) + value for field, value in deltas.items()}
+    changes["updated_at"] = timezone.now()
+    if model.objects.filter(**lookup).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # another worker created the row between our UPDATE and INSERT
+        model.objects.filter(**lookup).update(**changes)
+
+
+def record_sale(sale, sign=1):
+    """Count (``sign=1``) or uncount (``sign=-1``) one sale."""
+    _bump(
+        DailySalesRollup,
+        {"day": sale_day(sale), "cashier_id": sale.cashier_id, "category": None},
+        sales_count=sign,
+    )
+
+
+def record_lines(sale, lines, sign=1):
+    """
+    Apply sale lines to the rollups.
+
+    ``lines`` is an iterable of ``(product_id, category_id, quantity,
+    line_total)`` tuples; lines are merged per category and per product so
+    a sale costs one rollup write per distinct category/product (plus the
+    category's own sales counters, see ``Category.count_sales``).
+    """
+    by_category = defaultdict(lambda: [0, Decimal("0")])
+    by_product = defaultdict(lambda: [0, Decimal("0")])
+    for product_id, category_id, quantity, line_total in lines:
+        for bucket in (by_category[category_id], by_product[product_id]):
+            bucket[0] += sign * quantity
+            bucket[1] += sign * line_total
+
+    day = sale_day(sale)
+    for category_id, (quantity, revenue) in by_category.items():
+        _bump(
+            DailySalesRollup,
+            {"day": day, "cashier_id": sale.cashier_id, "category_id": category_id},
+            quantity=quantity,
+            revenue=revenue,
+        )
+    Category.count_sales(by_category)
+    for product_id, (quantity, revenue) in by_product.items():
+        _bump(
+            ProductSalesRollup,
+            {"product_id": product_id},
+            quantity=quantity,
+            revenue=revenue,
+        )
+
+
+def move_products(moves):
+    """
+    Move the daily rows of products to their new category; ``moves`` maps
+    product ids to ``(old_category_id, new_category_id)``.
+    """
+    from sales.models import SaleItem
+
+    deltas = defaultdict(lambda: [0, Decimal("0")])
+    sold = (
+        SaleItem.objects.filter(product_id__in=moves)
+        .annotate(day=TruncDate("sale__datetime"))
+        .values("day", "product_id", cashier_id=F("sale__cashier_id"))
+        .annotate(quantity=Sum("quantity"), revenue=Sum("line_total"))
+        .order_by()
+    )
+    for row in sold:
+        old, new = moves[row["product_id"]]
+        for category_id, sign in ((old, -1), (new, 1)):
+            bucket = deltas[row["day"], row["cashier_id"], category_id]
+            bucket[0] += sign * row["quantity"]
+            bucket[1] += sign * row["revenue"]
+    for (day, cashier_id, category_id), (quantity, revenue) in sorted(deltas.items()):
+        _bump(
+            DailySalesRollup,
+            {"day": day, "cashier_id": cashier_id, "category_id": category_id},
+            quantity=quantity,
+            revenue=revenue,
+        )
+
+
+def sale_lines(sale):
+    """Current lines of a saved sale in the shape ``record_lines`` expects."""
+    return sale.items.values_list(
+        "product_id", "product__category_id", "quantity", "line_total"
+    )
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute both rollup tables from ``Sale``/``SaleItem``."""
+    from sales.models import Sale, SaleItem
+
+    DailySalesRollup.objects.all().delete()
+    ProductSalesRollup.objects.all().delete()
+
+    sale_rows = (
+        Sale.objects.annotate(day=TruncDate("datetime"))
+        .values("day", "cashier_id")
+        .annotate(sales_count=Count("id"))
+        .order_by()
+    )
+    DailySalesRollup.objects.bulk_create(
+        [DailySalesRollup(category=None, **row) for row in sale_rows],
+        batch_size=1000,
+    )
+
+    line_rows = (
+        SaleItem.objects.annotate(day=TruncDate("sale__datetime"))
+        .values(
+            "day",
+            cashier_id=F("sale__cashier_id"),
+            category_id=F("product__category_id"),
+        )
+        .annotate(quantity=Sum("quantity"), revenue=Sum("line_total"))
+        .order_by()
+    )
+    DailySalesRollup.objects.bulk_create(
+        [DailySalesRollup(**row) for row in line_rows],
+        batch_size=1000,
+    )
+
+    product_rows = (
+        SaleItem.objects.values("product_id")
+        .annotate(quantity=Sum("quantity"), revenue=Sum("line_total"))
+        .order_by()
+    )
+    ProductSalesRollup.objects.bulk_create(
+        [ProductSalesRollup(**row) for row in product_rows],
+        batch_size=1000,
+    )
+    # bulk loaders (feed_db, seed_sales) end here without firing signals
+    invalidate()
@@ -0,0 +1,64 @@
+"""
+Drop the cached dashboard blocks a write can affect, and move the rollups
+of products that change category.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+
+from inventory.models import Category, Product
+from inventory.signals import catalog_changed, products_moved, stock_changed
+from sales.models import Sale, SaleItem
+from . import rollups
+from .caching import invalidate
+
+User = get_user_model()
+
+SALE_BLOCKS = (
+    "metrics",
+    "sales_over_time",
+    "low_stock",  # sales take stock
+    "category_revenue",
+    "top_products",
+    "top_staff",
+)
+
+AFFECTED_BLOCKS = {
+    Sale: SALE_BLOCKS,
+    SaleItem: SALE_BLOCKS,
+    Product: ("metrics", "inventory_by_category", "low_stock", "top_products"),
+    Category: ("inventory_by_category", "low_stock", "category_revenue"),
+    User: ("metrics", "user_distribution", "top_staff"),
+}
+
+
+def model_changed(sender, update_fields=None, **kwargs):
+    # every login saves last_login, which no block shows
+    if sender is User and update_fields and set(update_fields) <= {"last_login"}:
+        return
+    invalidate(AFFECTED_BLOCKS[sender])
+
+
+def stock_moved(sender, **kwargs):
+    invalidate(["low_stock"])
+
+
+def catalog_imported(sender, **kwargs):
+    invalidate(AFFECTED_BLOCKS[Product])
+
+
+def products_recategorized(sender, moves, **kwargs):
+    rollups.move_products(moves)
+    invalidate(["category_revenue"])
+
+
+def connect():
+    for model in AFFECTED_BLOCKS:
+        uid = f"dashboard.cache.{model._meta.label_lower}"
+        post_save.connect(model_changed, sender=model, dispatch_uid=uid)
+        post_delete.connect(model_changed, sender=model, dispatch_uid=uid)
+    stock_changed.connect(stock_moved, dispatch_uid="dashboard.cache.stock")
+    catalog_changed.connect(catalog_imported, dispatch_uid="dashboard.cache.catalog")
+    products_moved.connect(
+        products_recategorized, dispatch_uid="dashboard.rollups.moved"
+    )
@@ -0,0 +1,12 @@
+from tasks.queue import register
+from . import rollups
+from .models import DailySalesRollup, ProductSalesRollup
+
+
+@register
+def rebuild_rollups():
+    rollups.rebuild()
+    return {
+        "daily_rows": DailySalesRollup.objects.count(),
+        "product_rows": ProductSalesRollup.objects.count(),
+    }
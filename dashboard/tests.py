@@ -1,3 +1,572 @@
-from django.test import TestCase
+import itertools
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from erp_project.testing import QueryPlanMixin
+from inventory.models import Category, Product
+from inventory.services import restock, take_stock
+from sales.models import Sale, SaleItem
+from .models import DailySalesRollup, ProductSalesRollup
+from . import rollups
+from . import live, views
+from .caching import BLOCKS, block_key
+
+User = get_user_model()
+
+
+def rollup_snapshot():
+    daily = sorted(
+        (
+            (r.day, r.cashier_id, r.category_id, r.sales_count, r.quantity, r.revenue)
+            for r in DailySalesRollup.objects.all()
+            if r.sales_count or r.quantity or r.revenue
+        ),
+        key=lambda row: (row[0], row[1], row[2] or 0),
+    )
+    products = sorted(
+        (r.product_id, r.quantity, r.revenue)
+        for r in ProductSalesRollup.objects.all()
+        if r.quantity or r.revenue
+    )
+    return daily, products
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.snacks = Category.objects.create(name="Snacks")
+        self.drinks = Category.objects.create(name="Drinks")
+        self.chips = Product.objects.create(
+            category=self.snacks,
+            name="Chips",
+            sku="CHIPS",
+            cost_price=Decimal("1.00"),
+            sell_price=Decimal("2.50"),
+            quantity=100,
+        )
+        self.cola = Product.objects.create(
+            category=self.drinks,
+            name="Cola",
+            sku="COLA",
+            cost_price=Decimal("0.50"),
+            sell_price=Decimal("1.25"),
+            quantity=100,
+        )
+        self.cashier = User.objects.create_user(username="cashier", password="pass")
+        self.other = User.objects.create_user(username="other", password="pass")
+
+    def make_sale(self, cashier=None, when=None, lines=()):
+        sale = Sale.objects.create(
+            cashier=cashier or self.cashier, datetime=when or timezone.now()
+        )
+        for product, qty in lines:
+            SaleItem.objects.create(sale=sale, product=product, quantity=qty)
+        return sale
+
+    def test_sale_creation_counts_once_across_categories(self):
+        self.make_sale(lines=[(self.chips, 2), (self.cola, 4)])
+        today = timezone.localdate()
+        sales_row = DailySalesRollup.objects.get(
+            day=today, cashier=self.cashier, category=None
+        )
+        self.assertEqual(sales_row.sales_count, 1)
+        snacks_row = DailySalesRollup.objects.get(
+            day=today, cashier=self.cashier, category=self.snacks
+        )
+        self.assertEqual(snacks_row.quantity, 2)
+        self.assertEqual(snacks_row.revenue, Decimal("5.00"))
+        self.assertEqual(
+            ProductSalesRollup.objects.get(product=self.cola).revenue, Decimal("5.00")
+        )
+
+    def test_item_update_applies_delta(self):
+        sale = self.make_sale(lines=[(self.chips, 2)])
+        item = sale.items.get()
+        item.quantity = 5
+        item.save(force_update=True)
+        row = DailySalesRollup.objects.get(category=self.snacks)
+        self.assertEqual(row.quantity, 5)
+        self.assertEqual(row.revenue, Decimal("12.50"))
+
+    def test_moving_sale_moves_its_buckets(self):
+        sale = self.make_sale(lines=[(self.chips, 1)])
+        sale.datetime = timezone.now() - timedelta(days=3)
+        sale.cashier = self.other
+        sale.save()
+        before, _ = rollup_snapshot()
+        rollups.rebuild()
+        after, _ = rollup_snapshot()
+        self.assertEqual(before, after)
+        self.assertEqual(
+            DailySalesRollup.objects.get(category=None, cashier=self.other).day,
+            timezone.localdate(sale.datetime),
+        )
+
+    def test_deletes_are_subtracted(self):
+        keep = self.make_sale(lines=[(self.chips, 1), (self.cola, 1)])
+        drop = self.make_sale(lines=[(self.chips, 3)])
+        keep.items.get(product=self.cola).delete()
+        drop.delete()
+        before = rollup_snapshot()
+        rollups.rebuild()
+        self.assertEqual(before, rollup_snapshot())
+
+    def test_admin_bulk_deletes_are_subtracted(self):
+        keep = self.make_sale(lines=[(self.chips, 1), (self.cola, 2)])
+        drop = self.make_sale(lines=[(self.chips, 3)])
+        admin.site._registry[SaleItem].delete_queryset(
+            None, SaleItem.objects.filter(sale=keep, product=self.cola)
+        )
+        admin.site._registry[Sale].delete_queryset(
+            None, Sale.objects.filter(pk=drop.pk)
+        )
+        keep.refresh_from_db()
+        self.assertEqual(keep.total, Decimal("2.50"))
+        before = rollup_snapshot()
+        rollups.rebuild()
+        self.assertEqual(before, rollup_snapshot())
+
+    def test_moved_product_moves_its_rows(self):
+        self.make_sale(lines=[(self.chips, 2), (self.cola, 1)])
+        self.make_sale(when=timezone.now() - timedelta(days=2), lines=[(self.chips, 1)])
+        self.chips.category = self.drinks
+        self.chips.save()
+        self.assertFalse(
+            DailySalesRollup.objects.filter(category=self.snacks)
+            .exclude(quantity=0)
+            .exists()
+        )
+        before = rollup_snapshot()
+        rollups.rebuild()
+        self.assertEqual(before, rollup_snapshot())
+
+    def test_incremental_matches_rebuild(self):
+        now = timezone.now()
+        self.make_sale(lines=[(self.chips, 2), (self.cola, 1)])
+        self.make_sale(cashier=self.other, lines=[(self.cola, 3)])
+        self.make_sale(when=now - timedelta(days=2), lines=[(self.chips, 1)])
+        before = rollup_snapshot()
+        call_command("rebuild_sales_rollup", stdout=StringIO())
+        self.assertEqual(before, rollup_snapshot())
+
+
+class DashboardViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cat = Category.objects.create(name="Snacks")
+        self.product = Product.objects.create(
+            category=cat,
+            name="Chips",
+            sku="CHIPS",
+            cost_price=Decimal("1.00"),
+            sell_price=Decimal("2.00"),
+            quantity=100,
+        )
+        self.user = User.objects.create_user(username="viewer", password="pass")
+        for qty in (1, 2):
+            sale = Sale.objects.create(cashier=self.user)
+            SaleItem.objects.create(sale=sale, product=self.product, quantity=qty)
+
+    def test_metrics_come_from_rollups(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("dashboard"))
+        self.assertEqual(response.status_code, 200)
+        ctx = response.context
+        self.assertEqual(ctx["total_sales_count"], 2)
+        self.assertEqual(ctx["total_revenue"], Decimal("6.00"))
+        self.assertEqual(ctx["sales_over_time"][-1]["total_sales"], 2)
+        self.assertEqual(
+            ctx["category_revenue"], [{"category": "Snacks", "revenue": 6.0}]
+        )
+        self.assertEqual(ctx["top_selling_products"][0]["total_qty"], 3)
+        self.assertEqual(ctx["top_staff"][0]["transactions"], 2)
+
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cat = Category.objects.create(name="Snacks")
+        self.product = Product.objects.create(
+            category=self.cat,
+            name="Chips",
+            sku="CHIPS",
+            cost_price=Decimal("1.00"),
+            sell_price=Decimal("2.00"),
+            quantity=10,
+            min_stock=5,
+        )
+        self.user = User.objects.create_user(username="viewer", password="pass")
+        self.client.force_login(self.user)
+
+    def get(self):
+        return self.client.get(reverse("dashboard")).context
+
+    def cached(self, name):
+        return cache.get(block_key(name)) is not None
+
+    def test_warm_dashboard_skips_aggregates(self):
+        self.get()
+        with CaptureQueriesContext(connection) as ctx:
+            self.get()
+        tables = ("dashboard_", "inventory_", "sales_")
+        self.assertFalse(
+            [
+                q["sql"]
+                for q in ctx.captured_queries
+                if any(t in q["sql"] for t in tables)
+            ]
+        )
+
+    def test_sale_invalidates_sales_blocks_on_commit(self):
+        self.assertEqual(self.get()["total_sales_count"], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            sale = Sale.objects.create(cashier=self.user)
+            SaleItem.objects.create(sale=sale, product=self.product, quantity=2)
+        self.assertFalse(self.cached("metrics"))
+        self.assertTrue(self.cached("user_distribution"))
+        ctx = self.get()
+        self.assertEqual(ctx["total_sales_count"], 1)
+        self.assertEqual(ctx["top_selling_products"][0]["total_qty"], 2)
+
+    def test_stock_update_invalidates_low_stock_only(self):
+        self.assertEqual(self.get()["low_stock_products"], [])
+        take_stock({self.product.pk: 6})
+        self.assertFalse(self.cached("low_stock"))
+        self.assertTrue(self.cached("metrics"))
+        self.assertEqual(self.get()["low_stock_products"][0]["quantity"], 4)
+
+    def test_login_keeps_user_blocks(self):
+        self.get()
+        self.user.last_login = timezone.now()
+        self.user.save(update_fields=["last_login"])
+        self.assertTrue(self.cached("user_distribution"))
+        self.user.role = "manager"
+        self.user.save()
+        self.assertFalse(self.cached("user_distribution"))
+
+    def test_rebuild_drops_every_block(self):
+        self.get()
+        rollups.rebuild()
+        self.assertFalse(any(self.cached(name) for name in BLOCKS))
+
+
+class RollupIndexTests(QueryPlanMixin, TestCase):
+    def test_top_products_read_in_index_order(self):
+        self.assertUsesIndex(
+            ProductSalesRollup.objects.filter(quantity__gt=0)[:5],
+            "product_rollup_quantity_idx",
+        )
+
+
+class DashboardApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cat = Category.objects.create(name="Snacks")
+        self.product = Product.objects.create(
+            category=self.cat,
+            name="Chips",
+            sku="CHIPS",
+            cost_price=Decimal("1.00"),
+            sell_price=Decimal("2.00"),
+            quantity=3,
+            min_stock=5,
+        )
+        self.user = User.objects.create_user(username="bi", password="pass")
+        self.client.force_login(self.user)
+
+    def get(self, headers=None):
+        return self.client.get(
+            reverse("api_dashboard"), {"blocks": "metrics,low_stock"}, headers=headers
+        )
+
+    def test_selected_blocks(self):
+        data = self.get().json()
+        self.assertEqual(
+            set(data),
+            {
+                "last_sale_id",
+                "live_cursor",
+                "total_sales_count",
+                "total_revenue",
+                "total_products",
+                "active_users",
+                "low_stock_products",
+            },
+        )
+        self.assertEqual(data["low_stock_products"][0]["sku"], "CHIPS")
+        bad = self.client.get(reverse("api_dashboard"), {"blocks": "nope"})
+        self.assertEqual(bad.status_code, 400)
+
+    def test_warm_poll_is_not_modified_without_aggregates(self):
+        etag = self.get()["ETag"]
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.get({"If-None-Match": etag}).status_code, 304)
+        self.assertFalse([q for q in ctx.captured_queries if "inventory_" in q["sql"]])
+        take_stock({self.product.pk: 1})
+        self.assertEqual(self.get({"If-None-Match": etag}).status_code, 200)
+
+
+class DashboardAsyncViewTests(TransactionTestCase):
+    # committed rows: the blocks read them on pool-thread connections
+
+    def setUp(self):
+        cache.clear()
+        cat = Category.objects.create(name="Snacks")
+        product = Product.objects.create(
+            category=cat,
+            name="Chips",
+            sku="CHIPS",
+            cost_price=Decimal("1.00"),
+            sell_price=Decimal("2.00"),
+            quantity=3,
+            min_stock=5,
+        )
+        self.user = User.objects.create_user(username="viewer", password="pass")
+        sale = Sale.objects.create(cashier=self.user)
+        SaleItem.objects.create(sale=sale, product=product, quantity=1)
+
+    async def test_matches_sync_view(self):
+        response = await self.async_client.get(reverse("dashboard_async"))
+        self.assertEqual(response.status_code, 200)
+        expected = {}
+        for compute in views.BLOCKS.values():
+            expected.update(await views._on_own_connection(compute)())
+        for name, value in expected.items():
+            self.assertEqual(response.context[name], value, name)
+        self.assertTrue(response.context["live_updates"])
+
+    async def test_blocks_run_concurrently(self):
+        def slow(name):
+            def compute():
+                time.sleep(0.2)
+                return {name: name}
+
+            return compute
+
+        blocks = {name: slow(name) for name in BLOCKS}
+        with mock.patch.dict(views.BLOCKS, blocks, clear=True):
+            started = time.perf_counter()
+            response = await self.async_client.get(reverse("dashboard_async"))
+            elapsed = time.perf_counter() - started
+        self.assertEqual(response.context["top_staff"], "top_staff")
+        self.assertLess(elapsed, 0.2 * len(BLOCKS) / 2)
+
+
+class DashboardLiveTests(TestCase):
+    def setUp(self):
+        cat = Category.objects.create(name="Snacks")
+        self.product = Product.objects.create(
+            category=cat,
+            name="Chips",
+            sku="CHIPS",
+            cost_price=Decimal("1.00"),
+            sell_price=Decimal("2.00"),
+            quantity=10,
+            min_stock=5,
+        )
+        self.user = User.objects.create_user(username="viewer", password="pass")
+
+    def sell(self, quantity):
+        sale = Sale.objects.create(cashier=self.user)
+        SaleItem.objects.create(sale=sale, product=self.product, quantity=quantity)
+        return sale
+
+    def test_poller_reports_sales_and_low_stock_transitions(self):
+        poller = live.Poller()
+        self.assertEqual(list(poller.poll()), [])
+
+        first = self.sell(3)
+        second = self.sell(3)  # 4 left: low
+        (_, sales), (_, low) = poller.poll()
+        self.assertEqual([row[0] for row in sales["rows"]], [first.pk, second.pk])
+        delta = live.sales_delta(sales["rows"])
+        self.assertEqual((delta["sales"], delta["revenue"]), (2, 12.0))
+        self.assertEqual(delta["days"][0]["day"], str(timezone.localdate()))
+        self.assertEqual(low["rows"][0]["id"], self.product.pk)
+        self.assertEqual(low["rows"][0]["quantity"], 4)
+
+        restock(self.product, 10)
+        self.assertEqual(
+            list(poller.poll()),
+            [("low_stock", {"rows": [], "left": [self.product.pk]})],
+        )
+        self.assertEqual(list(poller.poll()), [])
+
+        self.product.refresh_from_db()
+        self.product.min_stock = 20  # no movement, only the alert
+        self.product.save(update_fields=["min_stock"])
+        [(_, low)] = poller.poll()
+        self.assertEqual([row["id"] for row in low["rows"]], [self.product.pk])
+
+    def test_poller_reports_sales_committed_out_of_id_order(self):
+        poller = live.Poller()
+        first = Sale.objects.create(cashier=self.user)
+        # the next id was taken by a checkout that has not committed yet
+        Sale.objects.create(pk=first.pk + 2, cashier=self.user)
+        [(_, sales)] = poller.poll()
+        self.assertEqual([row[0] for row in sales["rows"]], [first.pk, first.pk + 2])
+        self.assertIn(first.pk + 1, poller.sales.gaps)
+
+        Sale.objects.create(pk=first.pk + 1, cashier=self.user)
+        [(_, sales)] = poller.poll()
+        self.assertEqual([row[0] for row in sales["rows"]], [first.pk + 1])
+        self.assertEqual(list(poller.poll()), [])
+        self.assertNotIn(first.pk + 1, poller.sales.gaps)
+
+    def test_feed_catches_up_and_skips_what_it_has_seen(self):
+        first = self.sell(1)
+        feed = live.Feed(live.IdCursor(first.pk - 1), lambda: ["rows"])
+        sales, low = feed.catch_up()
+        self.assertIn(f"id: {first.pk}\n", sales)
+        self.assertIn('"reset": true', low)
+
+        seen = live.sale_rows(Sale.objects.filter(pk=first.pk))
+        self.assertEqual(feed.render("sales", {"rows": seen}), [])
+        later = Sale.objects.create(pk=first.pk + 2, cashier=self.user)
+        [event] = feed.render(
+            "sales", {"rows": live.sale_rows(Sale.objects.filter(pk=later.pk))}
+        )
+        self.assertIn(f"id: {later.pk}:{first.pk + 1}\n", event)
+        cursor = live.IdCursor.parse(f"{later.pk}:{first.pk + 1}")
+        self.assertEqual((cursor.last, cursor.gaps), (later.pk, {first.pk + 1}))
+
+
+@override_settings(DASHBOARD_LIVE_INTERVAL=0.02, DASHBOARD_LIVE_WSGI=True)
+class DashboardLiveStreamTests(TransactionTestCase):
+    # the broadcaster polls on its own connection, so rows must be committed
+
+    def setUp(self):
+        cache.clear()
+        # the in-memory test database locks whole tables while a test writes;
+        # the poller just retries on its next tick
+        patcher = mock.patch.object(live.logger, "exception")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cat = Category.objects.create(name="Snacks")
+        self.product = Product.objects.create(
+            category=cat,
+            name="Chips",
+            sku="CHIPS",
+            cost_price=Decimal("1.00"),
+            sell_price=Decimal("2.00"),
+            quantity=100,
+            min_stock=5,
+        )
+        self.user = User.objects.create_user(username="viewer", password="pass")
+
+    def tearDown(self):
+        # no poller may outlive the test, let alone its database
+        with live.broadcaster.lock:
+            live.broadcaster.subscribers.clear()
+            thread = live.broadcaster.thread
+        if thread:
+            thread.join(5)
+            self.assertFalse(thread.is_alive(), "the dashboard-live thread hangs")
+
+    def sell(self):
+        sale = Sale.objects.create(cashier=self.user)
+        SaleItem.objects.create(sale=sale, product=self.product, quantity=1)
+        return sale
+
+    def next_event(self, chunks, event):
+        for chunk in chunks:
+            chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if chunk.startswith(f"event: {event}"):
+                return chunk
+
+    def next_item(self, subscription, event):
+        item = subscription.get(5)
+        while item and item[0] != event:
+            item = subscription.get(5)
+        return item
+
+    def test_one_poller_fans_out_to_every_client(self):
+        subscriptions = [
+            live.broadcaster.subscribe(live.Subscription()) for _ in range(3)
+        ]
+        try:
+            deadline = time.monotonic() + 5
+            while live.broadcaster.poller is None:  # take the starting point
+                self.assertLess(time.monotonic(), deadline, "no poller started")
+                time.sleep(0.01)
+            sale = self.sell()
+            events = [self.next_item(s, "sales") for s in subscriptions]
+        finally:
+            for subscription in subscriptions:
+                live.broadcaster.unsubscribe(subscription)
+        self.assertEqual(events[0][0], "sales")
+        self.assertEqual([row[0] for row in events[0][1]["rows"]], [sale.pk])
+        # one poll, one payload shared by every client
+        self.assertTrue(all(event[1] is events[0][1] for event in events))
+
+    def test_stream_catches_up_when_the_poller_starts(self):
+        first = self.sell()
+        caught_up, sold = threading.Event(), []
+        start_poller = live.Poller
+
+        def late_poller():
+            caught_up.wait(5)
+            sold.append(self.sell())  # after the stream's own catch-up
+            return start_poller()
+
+        feed = live.Feed(live.IdCursor(first.pk - 1), lambda: [])
+        with mock.patch.object(live, "Poller", late_poller), mock.patch.object(
+            live, "HEARTBEAT", 0.05
+        ):
+            stream = live.sync_stream(feed)
+            try:
+                self.assertIn(f"id: {first.pk}", self.next_event(stream, "sales"))
+                self.next_event(stream, "low_stock")
+                caught_up.set()
+                # a bounded wait: without a catch-up it would only see pings
+                chunk = self.next_event(itertools.islice(stream, 100), "sales")
+                self.assertIn(f"id: {sold[0].pk}", chunk)
+            finally:
+                stream.close()
+
+    def test_wsgi_stream(self):
+        first = self.sell()
+        response = self.client.get(reverse("dashboard_live"), {"after": first.pk - 1})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        chunks = iter(response.streaming_content)
+        try:
+            self.assertIn(f"id: {first.pk}", self.next_event(chunks, "sales"))
+            second = self.sell()
+            self.assertIn(f"id: {second.pk}", self.next_event(chunks, "sales"))
+        finally:
+            response.close()
+
+    @override_settings(DASHBOARD_LIVE_WSGI=False)
+    def test_wsgi_has_no_live_updates(self):
+        self.client.force_login(self.user)
+        page = self.client.get(reverse("dashboard"))
+        self.assertNotContains(page, "startLiveUpdates(renderCharts())")
+        self.assertEqual(self.client.get(reverse("dashboard_live")).status_code, 204)
+        self.assertIsNone(live.broadcaster.thread)
+
+    async def test_asgi_stream_resumes_from_last_event_id(self):
+        first = await Sale.objects.acreate(cashier=self.user)
+        response = await self.async_client.get(
+            reverse("dashboard_live"), headers={"Last-Event-ID": str(first.pk - 1)}
+        )
+        chunks = aiter(response.streaming_content)
+        try:
+            chunk = await anext(chunks)
+            while not chunk.startswith(b"event: sales"):
+                chunk = await anext(chunks)
+            self.assertIn(f"id: {first.pk}".encode(), chunk)
+        finally:
+            await chunks.aclose()
@@ -1,6 +1,8 @@
 from django.urls import path
-from .views import dashboard_view
+from .views import dashboard_async_view, dashboard_live_view, dashboard_view
 
 urlpatterns = [
     path("", dashboard_view, name="dashboard"),
+    path("async/", dashboard_async_view, name="dashboard_async"),
+    path("live/", dashboard_live_view, name="dashboard_live"),
 ]
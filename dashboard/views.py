@@ -1,30 +1,53 @@
+import asyncio
 from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render
 from django.utils import timezone
-from django.db.models import Count, Sum, F
-from django.db.models.functions import TruncDay
+from django.db.models import Count, F, Sum
 from django.contrib.auth import get_user_model
 
 from inventory.models import Category, Product
-from sales.models import Sale, SaleItem
+from sales.models import Sale
+from . import live
+from .caching import aget_block, get_block
+from .models import DailySalesRollup, ProductSalesRollup
 
 User = get_user_model()
 
 
-def dashboard_view(request):
-    # Metrics
-    total_sales_count = Sale.objects.count()
-    total_revenue = Sale.objects.aggregate(total=Sum("total"))["total"] or 0
-    total_products = Product.objects.filter(is_active=True).count()
-    active_users = User.objects.filter(is_active=True).count()
-
-    # Sales Over Time (last 30 days)
-    since = timezone.now() - timedelta(days=30)
+# Each block returns its slice of the template context and is cached on its
+# own (see dashboard.caching / dashboard.signals).
+
+
+def metrics_block():
+    totals = DailySalesRollup.objects.aggregate(
+        sales=Sum("sales_count"), revenue=Sum("revenue")
+    )
+    products = Category.objects.aggregate(active=Sum("active_product_count"))
+    # where the live feed (dashboard.live) takes over from these numbers
+    cursor = live.IdCursor.current(Sale.objects)
+    return {
+        "total_sales_count": totals["sales"] or 0,
+        "total_revenue": totals["revenue"] or 0,
+        "total_products": products["active"] or 0,
+        "active_users": User.objects.filter(is_active=True).count(),
+        "last_sale_id": cursor.last,
+        "live_cursor": str(cursor),
+    }
+
+
+def sales_over_time_block():
+    # last 30 days
+    since = timezone.localdate() - timedelta(days=30)
     raw_sales = (
-        Sale.objects.filter(datetime__gte=since)
-        .annotate(day=TruncDay("datetime"))
+        DailySalesRollup.objects.filter(day__gte=since)
         .values("day")
-        .annotate(total_sales=Count("id"), total_revenue=Sum("total"))
+        .annotate(total_sales=Sum("sales_count"), total_revenue=Sum("revenue"))
         .order_by("day")
     )
     sales_over_time = [
@@ -35,42 +58,39 @@ def dashboard_view(request):
         }
         for entry in raw_sales
     ]
+    return {"sales_over_time": sales_over_time}
 
-    # Inventory By Category
-    raw_inv = (
-        Category.objects.annotate(product_count=Count("products"))
-        .values("name", "product_count")
-        .order_by("name")
-    )
+
+def inventory_by_category_block():
+    raw_inv = Category.objects.values("name", "product_count").order_by("name")
     inventory_by_category = [
         {"name": c["name"], "product_count": c["product_count"]} for c in raw_inv
     ]
+    return {"inventory_by_category": inventory_by_category}
+
+
+def low_stock_block():
+    low_stock_qs = live.low_stock_values(Product.objects.filter(is_low_stock=True))
+    return {"low_stock_products": list(low_stock_qs)}
 
-    # Low Stock Products
-    low_stock_qs = Product.objects.filter(quantity__lte=F("min_stock")).values(
-        "name", "quantity", "min_stock", "sku", category_name=F("category__name")
-    )
-    low_stock_products = list(low_stock_qs)
 
-    # Category Revenue
+def category_revenue_block():
     raw_cat_rev = (
-        SaleItem.objects.values("product__category__name")
-        .annotate(revenue=Sum(F("quantity") * F("price")))
+        Category.objects.filter(units_sold__gt=0)
+        .values("name", "revenue")
         .order_by("-revenue")
     )
     category_revenue = [
-        {"category": r["product__category__name"], "revenue": float(r["revenue"] or 0)}
+        {"category": r["name"], "revenue": float(r["revenue"] or 0)}
         for r in raw_cat_rev
     ]
+    return {"category_revenue": category_revenue}
 
-    # Top Selling Products
-    raw_top = (
-        SaleItem.objects.values("product__name")
-        .annotate(
-            total_qty=Sum("quantity"), total_revenue=Sum(F("quantity") * F("price"))
-        )
-        .order_by("-total_qty")[:5]
-    )
+
+def top_products_block():
+    raw_top = ProductSalesRollup.objects.filter(quantity__gt=0).values(
+        "product__name", total_qty=F("quantity"), total_revenue=F("revenue")
+    )[:5]
     top_selling_products = [
         {
             "name": p["product__name"],
@@ -79,15 +99,19 @@ def dashboard_view(request):
         }
         for p in raw_top
     ]
+    return {"top_selling_products": top_selling_products}
+
 
-    # User Distribution
+def user_distribution_block():
     raw_users = User.objects.values("role").annotate(count=Count("id"))
     user_distribution = [{"role": u["role"], "count": u["count"]} for u in raw_users]
+    return {"user_distribution": user_distribution}
+
 
-    # Top Performing Staff
+def top_staff_block():
     raw_staff = (
-        Sale.objects.values("cashier__username", "cashier__role")
-        .annotate(revenue=Sum("total"), transactions=Count("id"))
+        DailySalesRollup.objects.values("cashier__username", "cashier__role")
+        .annotate(revenue=Sum("revenue"), transactions=Sum("sales_count"))
         .order_by("-revenue")[:5]
     )
     top_staff = [
@@ -99,18 +123,99 @@ def dashboard_view(request):
         }
         for s in raw_staff
     ]
+    return {"top_staff": top_staff}
 
-    context = {
-        "total_sales_count": total_sales_count,
-        "total_revenue": total_revenue,
-        "total_products": total_products,
-        "active_users": active_users,
-        "sales_over_time": sales_over_time,
-        "inventory_by_category": inventory_by_category,
-        "low_stock_products": low_stock_products,
-        "category_revenue": category_revenue,
-        "top_selling_products": top_selling_products,
-        "user_distribution": user_distribution,
-        "top_staff": top_staff,
-    }
+
+BLOCKS = {
+    "metrics": metrics_block,
+    "sales_over_time": sales_over_time_block,
+    "inventory_by_category": inventory_by_category_block,
+    "low_stock": low_stock_block,
+    "category_revenue": category_revenue_block,
+    "top_products": top_products_block,
+    "user_distribution": user_distribution_block,
+    "top_staff": top_staff_block,
+}
+
+
+def live_updates(request):
+    """Whether the server ``request`` came through can hold live streams."""
+    return isinstance(request, ASGIRequest) or settings.DASHBOARD_LIVE_WSGI
+
+
+def dashboard_view(request):
+    context = {"live_updates": live_updates(request)}
+    for name, compute in BLOCKS.items():
+        context.update(get_block(name, compute))
     return render(request, "dashboard/index.html", context)
+
+
+def _on_own_connection(compute):
+    """
+    ``compute`` as a coroutine function running in a pool thread.
+
+    The async ORM (``aaggregate``, ``acount``...) funnels every query
+    through the one thread-sensitive executor, so gathering it would still
+    run the aggregates back to back.  A pool thread gets its own database
+    connection instead, which is what lets the blocks overlap.  Like a
+    request, each run recycles that connection per ``CONN_MAX_AGE`` (or
+    hands it back to the psycopg pool).
+    """
+
+    def run():
+        close_old_connections()
+        try:
+            return compute()
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False)
+
+
+async def dashboard_async_view(request):
+    """``dashboard_view`` with the uncached blocks computed concurrently."""
+    blocks = await asyncio.gather(
+        *(
+            aget_block(name, _on_own_connection(compute))
+            for name, compute in BLOCKS.items()
+        )
+    )
+    context = {"live_updates": live_updates(request)}
+    for block in blocks:
+        context.update(block)
+    # the auth and messages context processors touch the session
+    return await sync_to_async(render)(request, "dashboard/index.html", context)
+
+
+async def dashboard_live_view(request):
+    """
+    Server-Sent Events with the dashboard's deltas (see dashboard.live).
+
+    ``?after=`` (or the browser's ``Last-Event-ID`` on reconnect) is the
+    ``IdCursor`` of the sales the page accounts for.  Under ASGI a client costs a queue on
+    the event loop; under WSGI it would hold a worker for as long as the tab
+    stays open, so there it answers 204, which tells the browser to stop
+    reconnecting (see ``live_updates``).
+    """
+    if not live_updates(request):
+        return HttpResponse(status=204)
+    after = request.headers.get("Last-Event-ID") or request.GET.get("after")
+    try:
+        cursor = live.IdCursor.parse(after) if after else None
+    except ValueError:
+        return HttpResponseBadRequest("after must be a sale cursor.")
+
+    def low_stock():
+        return get_block("low_stock", low_stock_block)["low_stock_products"]
+
+    feed = live.Feed(cursor, low_stock)
+    if isinstance(request, ASGIRequest):
+        stream = live.async_stream(feed, sync_to_async(feed.catch_up))
+    else:
+        stream = live.sync_stream(feed)
+    return StreamingHttpResponse(
+        stream,
+        content_type="text/event-stream",
+        # nginx would otherwise buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,76 @@
+"""
+Changelist helpers for admins over big tables (sales, sale lines, stock
+movements).
+
+``LargeTableAdmin`` drops the second ``COUNT(*)`` Django runs for "N total"
+and counts with ``EstimatedCountPaginator``.  The ``Cached*ListFilter``
+classes keep the sidebar's distinct values, which take a scan of the whole
+table to find, in the cache for ``ADMIN_FILTER_CACHE_TTL`` seconds; new
+values show up once it expires.
+"""
+
+from functools import cached_property, partial
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.paginator import Paginator
+
+from .pagination import estimate_count
+
+# below this many rows COUNT(*) is cheap, and exact counts keep the admin
+# from listing every row when a stale estimate says they fit on one page
+EXACT_COUNT_BELOW = 10_000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    ``count`` is the planner's estimate for a big, unfiltered changelist.
+
+    A filtered changelist is counted exactly: a planner's guess for a
+    ``WHERE`` can be far off, and the filtered page count has to be right.
+    """
+
+    @cached_property
+    def count(self):
+        if self.object_list.query.where:
+            return super().count
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < EXACT_COUNT_BELOW:
+            return super().count
+        return estimate
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+def _cached_choices(model, field_path, compute):
+    key = f"admin-filter:{model._meta.label_lower}:{field_path}"
+    choices = cache.get(key)
+    if choices is None:
+        choices = list(compute())
+        cache.set(key, choices, settings.ADMIN_FILTER_CACHE_TTL)
+    return choices
+
+
+class CachedValuesFieldListFilter(admin.AllValuesFieldListFilter):
+    """``AllValuesFieldListFilter`` with the distinct values cached."""
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.lookup_choices = _cached_choices(
+            model, field_path, lambda: self.lookup_choices
+        )
+
+
+class CachedRelatedOnlyFieldListFilter(admin.RelatedOnlyFieldListFilter):
+    """``RelatedOnlyFieldListFilter`` with the related objects in use cached."""
+
+    def field_choices(self, field, request, model_admin):
+        return _cached_choices(
+            model_admin.model,
+            self.field_path,
+            partial(super().field_choices, field, request, model_admin),
+        )
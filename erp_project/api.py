@@ -0,0 +1,236 @@
+"""
+Read-only JSON endpoints for POS terminals and BI tools.
+
+List endpoints read ``.values()`` projections (no model instances),
+page with keyset cursors and accept ``?fields=a,b`` and the filters each
+view declares.  Every response carries an ``ETag`` and ``Last-Modified``
+derived from the latest ``updated_at`` and id and the delete count of the
+tables it reads, so a poll that finds nothing changed costs a few index
+lookups and gets an empty ``304 Not Modified``.
+"""
+
+import hashlib
+from datetime import datetime
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+from django.db.models.signals import post_delete
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views import View
+
+from .models import DeleteCounter
+from .pagination import EXACT, KeysetPaginator
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class ApiError(Exception):
+    """A bad query parameter; answered with ``400`` and the message."""
+
+
+def _count_delete(sender, **kwargs):
+    lookup = {"table": sender._meta.db_table}
+    if DeleteCounter.objects.filter(**lookup).update(deletes=F("deletes") + 1):
+        return
+    try:
+        with transaction.atomic():
+            DeleteCounter.objects.create(**lookup, deletes=1)
+    except IntegrityError:  # another process created the row meanwhile
+        DeleteCounter.objects.filter(**lookup).update(deletes=F("deletes") + 1)
+
+
+def track_deletes(*models):
+    """
+    Count the deletes from ``models`` for ``table_state``; call it from the
+    app's ``AppConfig.ready()`` so every process counts them.  Raw SQL and
+    ``QuerySet._raw_delete`` go uncounted.
+    """
+    for model in models:
+        post_delete.connect(
+            _count_delete,
+            sender=model,
+            dispatch_uid=f"api-deletes:{model._meta.label_lower}",
+        )
+
+
+def table_state(models):
+    """
+    ``[(latest updated_at, latest id, deletes)]`` for each model's table.
+
+    ``updated_at`` moves on inserts and updates, the id on inserts that
+    carry an older ``updated_at``, the count of ``track_deletes`` on
+    deletes.  Each ``MAX`` is its own query so it is read off the end of
+    one index; no query touches more than a row per table, whatever its
+    size.
+    """
+    deletes = dict(
+        DeleteCounter.objects.filter(
+            table__in=[model._meta.db_table for model in models]
+        ).values_list("table", "deletes")
+    )
+    return [
+        (
+            model.objects.aggregate(latest=Max("updated_at"))["latest"],
+            model.objects.aggregate(last=Max("pk"))["last"],
+            deletes.get(model._meta.db_table, 0),
+        )
+        for model in models
+    ]
+
+
+def make_etag(*parts):
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False)
+    return '"%s"' % digest.hexdigest()
+
+
+class JsonApiView(LoginRequiredMixin, View):
+    """
+    Conditional JSON ``GET``.
+
+    Subclasses implement ``get_validators()``, returning an ``(etag,
+    last_modified)`` pair (either may be ``None``), and ``get_data()``;
+    the latter only runs when the client's copy is stale.
+    """
+
+    http_method_names = ["get", "head", "options"]
+
+    def handle_no_permission(self):
+        return JsonResponse({"error": "Authentication required."}, status=403)
+
+    def parse(self):
+        """Validate the query string before anything touches the database."""
+
+    def get_validators(self):
+        return None, None
+
+    def get_data(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        try:
+            self.parse()
+        except ApiError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+        etag, last_modified = self.get_validators()
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = JsonResponse(
+                self.get_data(), encoder=DjangoJSONEncoder, safe=False
+            )
+        if etag:
+            response.headers["ETag"] = etag
+        if timestamp is not None:
+            response.headers["Last-Modified"] = http_date(timestamp)
+        # clients may keep a copy but must revalidate before every use
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class JsonListView(JsonApiView):
+    """
+    A keyset-paginated list of ``queryset`` projected onto ``fields``.
+
+    ``fields`` maps the public names to ORM paths (``"category":
+    "category__name"``), ``filters`` maps query parameters to lookups
+    (``"since": "datetime__gte"``); values are parsed by the model field the
+    lookup ends on.  ``tables`` lists the models whose rows the response is
+    built from; their state keys the ``ETag``.  Query parameters:
+    ``fields``, ``limit``, ``cursor`` and the declared filters.
+    """
+
+    queryset = None
+    fields = {}
+    default_fields = None  # all of ``fields``
+    filters = {}
+    keyset = ("-pk",)
+    count_mode = EXACT
+    tables = ()
+
+    def parse(self):
+        params = self.request.GET
+        if params.get("fields"):
+            names = [name.strip() for name in params["fields"].split(",")]
+            unknown = [name for name in names if name not in self.fields]
+            if unknown:
+                raise ApiError(f"Unknown field(s): {', '.join(unknown)}")
+            self.selected = list(dict.fromkeys(names))
+        else:
+            self.selected = list(self.default_fields or self.fields)
+
+        try:
+            self.limit = int(params.get("limit", DEFAULT_PAGE_SIZE))
+        except ValueError:
+            raise ApiError("limit must be a whole number.")
+        if not 1 <= self.limit <= MAX_PAGE_SIZE:
+            raise ApiError(f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+
+        self.lookups = {}
+        for param, lookup in self.filters.items():
+            if param in params:
+                self.lookups[lookup] = self.parse_filter(param, lookup, params[param])
+
+    def parse_filter(self, param, lookup, raw):
+        model, field = self.queryset.model, None
+        for part in lookup.split("__"):
+            try:
+                field = model._meta.get_field(part)
+            except FieldDoesNotExist:  # the lookup itself (gte, icontains...)
+                break
+            if field.is_relation:
+                model = field.related_model
+        if field.is_relation:
+            field = field.target_field
+        try:
+            value = field.to_python(raw)
+        except ValidationError as exc:
+            raise ApiError(f"{param}: {' '.join(exc.messages)}")
+        if value is None or value == "":
+            raise ApiError(f"{param}: This field cannot be blank.")
+        if isinstance(value, datetime) and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+
+    def get_queryset(self):
+        return self.queryset.filter(**self.lookups)
+
+    def get_validators(self):
+        state = table_state(self.tables)
+        stamps = [latest for latest, _, _ in state if latest]
+        return (
+            make_etag(self.request.get_full_path(), state),
+            max(stamps) if stamps else None,
+        )
+
+    def page_url(self, cursor):
+        params = self.request.GET.copy()
+        params["cursor"] = cursor
+        return self.request.build_absolute_uri(
+            f"{self.request.path}?{params.urlencode()}"
+        )
+
+    def get_data(self):
+        keys = [name.lstrip("-") for name in self.keyset]
+        paths = list(dict.fromkeys([self.fields[name] for name in self.selected]))
+        queryset = self.get_queryset().values(*dict.fromkeys(paths + keys))
+        paginator = KeysetPaginator(
+            queryset, self.limit, self.keyset, count_mode=self.count_mode
+        )
+        page = paginator.page(self.request.GET.get("cursor"))
+        return {
+            "count": paginator.count,
+            "next": self.page_url(page.next_cursor) if page.has_next() else None,
+            "previous": (
+                self.page_url(page.previous_cursor) if page.has_previous() else None
+            ),
+            "results": [
+                {name: row[self.fields[name]] for name in self.selected} for row in page
+            ],
+        }
@@ -0,0 +1,13 @@
+from django.urls import path
+
+from dashboard.api import DashboardApiView
+from inventory.api import CategoryApiView, ProductApiView
+from sales.api import SaleApiView, SaleDetailApiView
+
+urlpatterns = [
+    path("products/", ProductApiView.as_view(), name="api_products"),
+    path("categories/", CategoryApiView.as_view(), name="api_categories"),
+    path("sales/", SaleApiView.as_view(), name="api_sales"),
+    path("sales/<int:pk>/", SaleDetailApiView.as_view(), name="api_sale_detail"),
+    path("dashboard/", DashboardApiView.as_view(), name="api_dashboard"),
+]
@@ -0,0 +1,25 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class ErpProjectConfig(AppConfig):
+    """Project-wide hooks and management commands."""
+
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "erp_project"
+    verbose_name = "ERP project"
+
+    def ready(self):
+        from .db import apply_sqlite_pragmas
+        from .perf import install_query_timer
+        from .slow_queries import install_slow_query_log
+
+        connection_created.connect(
+            apply_sqlite_pragmas, dispatch_uid="erp_project.sqlite_pragmas"
+        )
+        connection_created.connect(
+            install_query_timer, dispatch_uid="erp_project.perf_queries"
+        )
+        connection_created.connect(
+            install_slow_query_log, dispatch_uid="erp_project.slow_queries"
+        )
@@ -0,0 +1,139 @@
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test import RequestFactory, override_settings
+
+from dashboard.views import dashboard_view
+from erp_project.db import SQLITE_DEFAULT_PRAGMAS, SQLITE_TUNED_PRAGMAS
+from inventory.models import Product
+from inventory.services import InsufficientStock
+from sales.services import checkout
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare dashboard and checkout throughput on SQLite with and without "
+        "the SQLITE_TUNING profile (runs against a scratch copy of the DB)"
+    )
+
+    # name -> (pragmas, transaction_mode); mirrors SQLITE_TUNING in settings
+    PROFILES = {
+        "default": (SQLITE_DEFAULT_PRAGMAS, None),
+        "tuned": (SQLITE_TUNED_PRAGMAS, "IMMEDIATE"),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=10)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--writers", type=int, default=2)
+
+    def handle(self, *args, seconds, readers, writers, **kwargs):
+        if connection.vendor != "sqlite":
+            raise CommandError("bench_sqlite only runs against a SQLite database.")
+        source = Path(connection.settings_dict["NAME"])
+        if not source.is_file():
+            raise CommandError(f"{source} is not a SQLite file (run migrate/feed_db).")
+
+        self.cashier = get_user_model().objects.filter(is_active=True).first()
+        self.products = list(
+            Product.objects.filter(is_active=True, quantity__gt=0).values_list(
+                "pk", flat=True
+            )
+        )
+        if not self.cashier or not self.products:
+            raise CommandError("The database needs users and stocked products.")
+
+        self.stdout.write(
+            f"{readers} dashboard readers + {writers} checkout writers, "
+            f"{seconds:g}s per profile"
+        )
+        self.stdout.write(
+            f"{'profile':8} {'op':10} {'ops/s':>8} {'p50 ms':>8} "
+            f"{'p95 ms':>8} {'errors':>7}"
+        )
+        with tempfile.TemporaryDirectory() as scratch:
+            for name, (pragmas, mode) in self.PROFILES.items():
+                copy = Path(scratch) / f"{name}.sqlite3"
+                shutil.copyfile(source, copy)
+                results = self._run(copy, pragmas, mode, seconds, readers, writers)
+                for op, (latencies, errors) in results.items():
+                    self._report(name, op, latencies, errors, seconds)
+
+    def _run(self, path, pragmas, mode, seconds, readers, writers):
+        # new per-thread connections are built from this dict
+        db = connections.settings["default"]
+        original = db["NAME"], db["OPTIONS"]
+        connections.close_all()
+        db["NAME"] = str(path)
+        db["OPTIONS"] = {**db["OPTIONS"], "transaction_mode": mode}
+        results = {"dashboard": ([], [0]), "checkout": ([], [0])}
+        deadline = time.perf_counter() + seconds
+        try:
+            # measure the database, not the dashboard cache
+            with override_settings(
+                SQLITE_PRAGMAS=pragmas,
+                CACHES={
+                    "default": {
+                        "BACKEND": "django.core.cache.backends.dummy.DummyCache"
+                    }
+                },
+            ):
+                threads = [
+                    threading.Thread(
+                        target=self._loop, args=(op, deadline, results[op])
+                    )
+                    for op, count in (("dashboard", readers), ("checkout", writers))
+                    for _ in range(count)
+                ]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+        finally:
+            connections.close_all()
+            db["NAME"], db["OPTIONS"] = original
+        return {op: (lat, err[0]) for op, (lat, err) in results.items()}
+
+    def _loop(self, op, deadline, result):
+        latencies, errors = result
+        rng = random.Random()
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        try:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    if op == "dashboard":
+                        dashboard_view(request)
+                    else:
+                        checkout(self.cashier, [(rng.choice(self.products), 1)])
+                except (OperationalError, InsufficientStock):
+                    errors[0] += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+
+    def _report(self, profile, op, latencies, errors, seconds):
+        if latencies:
+            cuts = (
+                statistics.quantiles(latencies, n=20)
+                if len(latencies) > 1
+                else latencies * 19
+            )
+            p50, p95 = statistics.median(latencies) * 1000, cuts[18] * 1000
+        else:
+            p50 = p95 = float("nan")
+        self.stdout.write(
+            f"{profile:8} {op:10} {len(latencies) / seconds:8.1f} "
+            f"{p50:8.1f} {p95:8.1f} {errors:7d}"
+        )
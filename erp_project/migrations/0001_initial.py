@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="DeleteCounter",
+            fields=[
+                (
+                    "table",
+                    models.CharField(max_length=100, primary_key=True, serialize=False),
+                ),
+                ("deletes", models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,14 @@
+from django.db import models
+
+
+class DeleteCounter(models.Model):
+    """
+    Rows deleted so far from a table the JSON API serves (see
+    ``erp_project.api.track_deletes``); part of its validators.
+    """
+
+    table = models.CharField(max_length=100, primary_key=True)
+    deletes = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.table}: {self.deletes}"
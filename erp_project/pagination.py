@@ -0,0 +1,224 @@
+"""
+Keyset ("seek") pagination for list views over big tables.
+
+OFFSET paging reads and throws away every row before the requested page,
+and Django's ``Paginator`` adds a ``COUNT(*)`` on each request.  Keyset
+paging instead remembers the sort key of the last row shown and asks for
+the rows after it (``WHERE (datetime, id) < (:dt, :id)``), so every page
+costs the same index seek however deep it is.  Pages are addressed by
+signed, opaque ``?cursor=`` tokens instead of page numbers.
+"""
+
+import json
+from functools import cached_property
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.http import Http404
+
+CURSOR_SALT = "erp_project.pagination.cursor"
+
+EXACT, ESTIMATE, NONE = "exact", "estimate", "none"
+
+
+def estimate_count(queryset):
+    """
+    Planner row estimate for ``queryset``, or ``None`` when there is none.
+
+    PostgreSQL reports it for any query via ``EXPLAIN``.  SQLite only keeps
+    whole-table statistics (after ``ANALYZE``), so filtered querysets there
+    have no estimate.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    if connection.vendor == "sqlite" and not queryset.query.where:
+        table = queryset.model._meta.db_table
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute(
+                    "SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table]
+                )
+            except DatabaseError:  # no sqlite_stat1 until the first ANALYZE
+                return None
+            row = cursor.fetchone()
+        return int(row[0].split()[0]) if row else None
+    return None
+
+
+class KeysetPage:
+    """A page of rows plus the cursors of its neighbours."""
+
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, start, has_previous, has_next):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.start = start
+        self.has_previous_page = has_previous
+        self.has_next_page = has_next
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    def start_index(self):
+        return self.start if self.object_list else 0
+
+    def end_index(self):
+        return self.start + len(self.object_list) - 1
+
+    @cached_property
+    def next_cursor(self):
+        if not self.has_next_page:
+            return ""
+        last = self.object_list[-1]
+        return self.paginator.cursor_for(last, "next", self.end_index() + 1)
+
+    @cached_property
+    def previous_cursor(self):
+        # a cursor past the last row gives an empty page
+        if not self.has_previous_page or not self.object_list:
+            return ""
+        first = self.object_list[0]
+        return self.paginator.cursor_for(first, "prev", self.start)
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` by ``keyset``: ordering fields whose last entry
+    is unique (normally ``id``/``-id``) and none of which are nullable.
+    ``.values()`` querysets must include the keyset fields.
+
+    ``count`` follows ``count_mode``: ``EXACT`` runs ``COUNT(*)``,
+    ``ESTIMATE`` asks the planner (see ``estimate_count``) and ``NONE``
+    skips it; the latter two may give ``None``.
+    """
+
+    def __init__(self, queryset, per_page, keyset, count_mode=EXACT):
+        self.queryset = queryset.order_by(*keyset)
+        self.per_page = per_page
+        self.keyset = [
+            (name.lstrip("-"), name.startswith("-")) for name in keyset
+        ]  # (field, descending)
+        self.count_mode = count_mode
+
+    @cached_property
+    def count(self):
+        if self.count_mode == EXACT:
+            return self.queryset.count()
+        if self.count_mode == ESTIMATE:
+            return estimate_count(self.queryset)
+        return None
+
+    @property
+    def count_is_estimate(self):
+        return self.count_mode == ESTIMATE
+
+    def _field(self, name):
+        opts = self.queryset.model._meta
+        return opts.pk if name == "pk" else opts.get_field(name)
+
+    def _value(self, obj, name):
+        if isinstance(obj, dict):  # a .values() queryset
+            return obj[name]
+        return getattr(obj, self._field(name).attname)
+
+    def cursor_for(self, obj, direction, index):
+        # datetimes, decimals... travel as strings; _decode runs to_python
+        field_values = [
+            value if isinstance(value, (int, str)) else str(value)
+            for value in (self._value(obj, name) for name, _ in self.keyset)
+        ]
+        return signing.dumps(
+            {"k": field_values, "d": direction, "i": index},
+            salt=CURSOR_SALT,
+            compress=True,
+        )
+
+    def _decode(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+            values = [
+                self._field(name).to_python(raw)
+                for (name, _), raw in zip(self.keyset, data["k"], strict=True)
+            ]
+            return values, data["d"], int(data["i"])
+        except (
+            signing.BadSignature,
+            ValidationError,
+            KeyError,
+            TypeError,
+            ValueError,
+        ) as exc:
+            raise Http404("Invalid page cursor.") from exc
+
+    def _after(self, values, forward):
+        """Rows after ``values`` in keyset order (before it if not ``forward``)."""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.keyset, values):
+            lookup = "lt" if descending == forward else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return self.queryset.filter(condition)
+
+    def page(self, cursor=None):
+        if not cursor:
+            rows = list(self.queryset[: self.per_page + 1])
+            return KeysetPage(
+                rows[: self.per_page], self, 1, False, len(rows) > self.per_page
+            )
+
+        values, direction, index = self._decode(cursor)
+        if direction == "next":
+            rows = list(self._after(values, forward=True)[: self.per_page + 1])
+            return KeysetPage(
+                rows[: self.per_page], self, index, True, len(rows) > self.per_page
+            )
+        rows = list(self._after(values, forward=False).reverse()[: self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[: self.per_page][::-1]
+        return KeysetPage(rows, self, max(index - len(rows), 1), more, True)
+
+
+class KeysetPaginationMixin:
+    """
+    ``ListView`` mixin replacing page numbers with keyset cursors.
+
+    Set ``keyset`` to the list ordering (e.g. ``("-datetime", "-id")``) and
+    optionally ``count_mode``; ``paginate_by`` still sets the page size.
+    """
+
+    keyset = ("-pk",)
+    count_mode = EXACT
+    cursor_kwarg = "cursor"
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(
+            queryset, page_size, self.keyset, count_mode=self.count_mode
+        )
+        page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,363 @@
+"""
+Request-level performance instrumentation.
+
+``PerfMiddleware`` measures every request: wall time, database queries and
+time, template render time and response size, keyed by URL name.  The last
+``PERF_WINDOW`` samples of each URL name are kept in memory for
+percentiles, shown on ``/perf/`` and exported in the Prometheus text format
+at ``/perf/metrics``.  With ``PERF_PROFILE_RATE`` a sample of requests runs
+under ``cProfile``; the profiles of those slower than ``PERF_SLOW_MS`` are
+kept (the last ``PERF_PROFILES`` of them) and shown on ``/perf/``.
+
+Queries are counted by an execute wrapper installed on every connection
+and templates are timed by the ``DjangoTemplates`` backend below; both
+report to the request's ``Sample`` through a context variable, so queries
+an async view runs via ``sync_to_async`` are counted too.  Template time
+includes the queries run while rendering.  All numbers are per process.
+"""
+
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.template.backends import django as django_backend
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+METRICS = {
+    # name: (help, Prometheus metric); times are in seconds
+    "wall": ("Request wall time", "erp_request_duration_seconds"),
+    "queries": ("Database queries per request", "erp_request_db_queries"),
+    "db": ("Database time per request", "erp_request_db_duration_seconds"),
+    "template": (
+        "Template render time per request",
+        "erp_request_template_duration_seconds",
+    ),
+    "bytes": ("Response body size", "erp_response_size_bytes"),
+}
+QUANTILES = (0.5, 0.95, 0.99)
+
+_current = ContextVar("perf_sample", default=None)
+
+
+class Sample:
+    """What one request has spent so far."""
+
+    __slots__ = ("request", "queries", "db", "template", "rendering")
+
+    def __init__(self, request=None):
+        self.request = request
+        self.queries = 0
+        self.db = self.template = 0.0
+        self.rendering = False
+
+
+def record_query(execute, sql, params, many, context):
+    sample = _current.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.queries += 1
+        sample.db += time.perf_counter() - started
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """``connection_created`` receiver; the wrapper outlives reconnects."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate(django_backend.Template):
+    def render(self, context=None, request=None):
+        sample = _current.get()
+        if sample is None or sample.rendering:
+            return super().render(context, request)
+        sample.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            sample.template += time.perf_counter() - started
+            sample.rendering = False
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The stock template backend, timing each top-level render."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of an already sorted list."""
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Route:
+    """Rolling samples and running totals of one URL name."""
+
+    def __init__(self, window):
+        self.samples = {metric: deque(maxlen=window) for metric in METRICS}
+        self.totals = dict.fromkeys(METRICS, 0)
+        self.count = self.errors = 0
+
+    def add(self, values, status):
+        self.count += 1
+        self.errors += status >= 500
+        for metric, value in values.items():
+            if value is not None:
+                self.samples[metric].append(value)
+                self.totals[metric] += value
+
+    def summary(self):
+        summary = {"count": self.count, "errors": self.errors}
+        for metric, samples in self.samples.items():
+            ordered = sorted(samples)
+            summary[metric] = {
+                "quantiles": (
+                    {q: percentile(ordered, q) for q in QUANTILES} if ordered else {}
+                ),
+                "mean": sum(ordered) / len(ordered) if ordered else 0,
+                "max": ordered[-1] if ordered else 0,
+                "sum": self.totals[metric],
+                "count": len(ordered),
+            }
+        return summary
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.profiles = deque()
+        self.started = timezone.now()
+
+    def add(self, name, values, status):
+        with self.lock:
+            route = self.routes.get(name)
+            if route is None:
+                route = self.routes[name] = Route(settings.PERF_WINDOW)
+            route.add(values, status)
+
+    def add_profile(self, profile):
+        with self.lock:
+            self.profiles.appendleft(profile)
+            while len(self.profiles) > settings.PERF_PROFILES:
+                self.profiles.pop()
+
+    def snapshot(self):
+        with self.lock:
+            return {name: route.summary() for name, route in self.routes.items()}
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
+            self.profiles.clear()
+            self.started = timezone.now()
+
+
+registry = Registry()
+
+# cProfile can only run one profiler per thread (and, on Python 3.12+, per
+# process); requests that find it busy go unprofiled
+_profiling = threading.Lock()
+
+
+class PerfMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PERF_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        sample = Sample(request)
+        profiler = self.start_profile()
+        token = _current.set(sample)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            wall = time.perf_counter() - started
+            _current.reset(token)
+            if profiler:
+                profiler.disable()
+                _profiling.release()
+        self.finish(request, response, sample, wall, profiler)
+        return response
+
+    async def __acall__(self, request):
+        # the event loop thread is shared, so async requests are not profiled
+        sample = Sample(request)
+        token = _current.set(sample)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            wall = time.perf_counter() - started
+            _current.reset(token)
+        self.finish(request, response, sample, wall)
+        return response
+
+    def start_profile(self):
+        rate = settings.PERF_PROFILE_RATE
+        if not rate or random.random() >= rate:
+            return None
+        if not _profiling.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # another profiler is active
+            _profiling.release()
+            return None
+        return profiler
+
+    def finish(self, request, response, sample, wall, profiler=None):
+        match = request.resolver_match
+        name = match.view_name if match else "<unresolved>"
+        registry.add(
+            name,
+            {
+                "wall": wall,
+                "queries": sample.queries,
+                "db": sample.db,
+                "template": sample.template,
+                # a stream's size is unknown until it has been sent
+                "bytes": None if response.streaming else len(response.content),
+            },
+            response.status_code,
+        )
+        if profiler and wall * 1000 >= settings.PERF_SLOW_MS:
+            out = io.StringIO()
+            stats = pstats.Stats(profiler, stream=out)
+            stats.sort_stats("cumulative").print_stats(40)
+            registry.add_profile(
+                {
+                    "at": timezone.now(),
+                    "view": name,
+                    "path": request.get_full_path(),
+                    "wall": wall,
+                    "queries": sample.queries,
+                    "text": out.getvalue(),
+                }
+            )
+
+
+# --- views -------------------------------------------------------------
+
+
+def _is_admin(user):
+    return user.is_authenticated and (user.is_superuser or user.role == "admin")
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def prometheus_text(snapshot):
+    lines = []
+    for metric, (help_text, prom_name) in METRICS.items():
+        lines.append(f"# HELP {prom_name} {help_text}.")
+        lines.append(f"# TYPE {prom_name} summary")
+        for name, summary in sorted(snapshot.items()):
+            stats = summary[metric]
+            view = _label(name)
+            for q, value in stats["quantiles"].items():
+                lines.append(f'{prom_name}{{view="{view}",quantile="{q}"}} {value:g}')
+            lines.append(f'{prom_name}_sum{{view="{view}"}} {stats["sum"]:g}')
+            lines.append(f'{prom_name}_count{{view="{view}"}} {stats["count"]}')
+    lines.append("# HELP erp_request_errors_total Responses with a 5xx status.")
+    lines.append("# TYPE erp_request_errors_total counter")
+    for name, summary in sorted(snapshot.items()):
+        lines.append(
+            f'erp_request_errors_total{{view="{_label(name)}"}} {summary["errors"]}'
+        )
+    return "\n".join(lines) + "\n"
+
+
+def _row(name, summary):
+    """One line of ``/perf/``, times in milliseconds."""
+    wall, quantiles = summary["wall"], summary["wall"]["quantiles"]
+    return {
+        "name": name,
+        "count": summary["count"],
+        "errors": summary["errors"],
+        "total": wall["sum"],
+        "p50": quantiles.get(0.5, 0) * 1000,
+        "p95": quantiles.get(0.95, 0) * 1000,
+        "p99": quantiles.get(0.99, 0) * 1000,
+        "max": wall["max"] * 1000,
+        "queries": summary["queries"]["mean"],
+        "queries_p95": summary["queries"]["quantiles"].get(0.95, 0),
+        "db": summary["db"]["mean"] * 1000,
+        "template": summary["template"]["mean"] * 1000,
+        "bytes": summary["bytes"]["mean"],
+    }
+
+
+def perf_view(request):
+    """Percentiles per URL name and the kept profiles; admins only."""
+    if not _is_admin(request.user):
+        raise PermissionDenied
+    if request.method == "POST" and "reset" in request.POST:
+        registry.reset()
+    sort = request.GET.get("sort", "total")
+    rows = [_row(name, summary) for name, summary in registry.snapshot().items()]
+    if sort not in ("total", "p95", "queries", "count"):
+        sort = "total"
+    rows.sort(key=lambda row: row[sort], reverse=True)
+    return render(
+        request,
+        "perf/index.html",
+        {
+            "rows": rows,
+            "sort": sort,
+            "profiles": [
+                {**profile, "wall": profile["wall"] * 1000}
+                for profile in registry.profiles
+            ],
+            "started": registry.started,
+            "profile_rate": settings.PERF_PROFILE_RATE,
+            "slow_ms": settings.PERF_SLOW_MS,
+        },
+    )
+
+
+def perf_metrics_view(request):
+    """
+    Prometheus scrape endpoint: ``Authorization: Bearer <PERF_METRICS_TOKEN>``
+    or an admin session.
+    """
+    token = settings.PERF_METRICS_TOKEN
+    header = request.headers.get("Authorization", "")
+    authorized = token and constant_time_compare(header, f"Bearer {token}")
+    if not authorized and not _is_admin(request.user):
+        return HttpResponse("Forbidden\n", status=403, content_type="text/plain")
+    return HttpResponse(
+        prometheus_text(registry.snapshot()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
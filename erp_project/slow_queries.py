@@ -0,0 +1,235 @@
+"""
+Slow-query log.
+
+``record_slow_query`` is an execute wrapper installed on every connection.
+A query slower than ``SLOW_QUERY_MS`` is logged (``erp_project.slow_queries``
+at WARNING) with where it came from, and kept in a ring buffer of the last
+``SLOW_QUERY_BUFFER`` samples shown on ``/perf/queries/``.  Reads also get
+their ``EXPLAIN`` output, run right after the query on the same connection
+and reused for that query's fingerprint for ``EXPLAIN_EVERY`` seconds.
+
+The fingerprint is the SQL with literals, placeholders and ``IN`` lists
+replaced by ``?``, so the same ORM query groups together whatever its
+arguments.  The buffer is per process.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import DatabaseError, transaction
+from django.shortcuts import render
+from django.utils import timezone
+
+from . import perf
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_EVERY = 300  # seconds
+STACK_DEPTH = 8
+
+_explaining = ContextVar("slow_query_explaining", default=False)
+
+_NORMALIZE = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s|%\(\w+\)s"), "?"),
+    (re.compile(r'\bSAVEPOINT "[^"]+"'), "SAVEPOINT ?"),
+    (re.compile(r"\bIN \((?:\?, )*\?\)", re.IGNORECASE), "IN (...)"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def fingerprint(sql):
+    """``(key, normalized SQL)`` of a statement."""
+    for pattern, replacement in _NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    sql = sql.strip()
+    return hashlib.md5(sql.encode()).hexdigest()[:12], sql
+
+
+def _project_frames():
+    """``(path, line, function)`` of the project's frames, innermost first."""
+    root = str(settings.BASE_DIR) + os.sep
+    skip = (perf.__file__, __file__)
+    frames = []
+    frame = sys._getframe(2)
+    while frame is not None:
+        path = frame.f_code.co_filename
+        if path.startswith(root) and path not in skip and "-packages" not in path:
+            frames.append((path[len(root) :], frame.f_lineno, frame.f_code.co_name))
+        frame = frame.f_back
+    return frames
+
+
+def _origin(frames):
+    """What the query ran for: a view, an admin page, a command or a task."""
+    sample = perf._current.get()
+    match = sample and sample.request and sample.request.resolver_match
+    if match:
+        kind = "admin" if match.view_name.startswith("admin:") else "view"
+        return f"{kind} {match.view_name}"
+    for path, line, function in frames:
+        directory, _, module = path.rpartition("/")
+        if directory.endswith("management/commands"):
+            return f"command {module[:-3]}"
+        if module == "tasks.py" and "/" not in directory:
+            return f"task {directory}.{function}"
+    if frames:
+        path, line, function = frames[0]
+        return f"{path}:{line}"
+    return "unknown"
+
+
+def explain(connection, sql, params):
+    """The plan of ``sql`` as text, or ``None`` if it cannot be explained."""
+    token = _explaining.set(True)
+    # the EXPLAIN is not part of the request's query count
+    sample_token = perf._current.set(None)
+    try:
+        # in a savepoint, so a failed EXPLAIN leaves the transaction usable
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+                rows = cursor.fetchall()
+    except DatabaseError:
+        return None
+    finally:
+        perf._current.reset(sample_token)
+        _explaining.reset(token)
+    return "\n".join(" ".join(str(col) for col in row) for row in rows)
+
+
+class SlowQueryLog:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = deque()
+        self.plans = {}  # fingerprint -> (monotonic time, plan)
+
+    def recent_plan(self, key):
+        """
+        ``(found, plan)``: whether ``key`` was explained in the last
+        ``EXPLAIN_EVERY`` seconds, and the plan it got.
+        """
+        with self.lock:
+            captured, plan = self.plans.get(key, (None, None))
+        if captured is None or time.monotonic() - captured > EXPLAIN_EVERY:
+            return False, None
+        return True, plan
+
+    def add(self, sample, explained=False):
+        with self.lock:
+            if explained:
+                self.plans[sample["key"]] = (time.monotonic(), sample["plan"])
+            self.samples.appendleft(sample)
+            while len(self.samples) > settings.SLOW_QUERY_BUFFER:
+                self.samples.pop()
+
+    def groups(self):
+        """The buffered samples grouped by fingerprint, slowest total first."""
+        groups = {}
+        with self.lock:
+            samples = list(self.samples)
+        for sample in samples:
+            group = groups.get(sample["key"])
+            if group is None:
+                group = groups[sample["key"]] = {
+                    "key": sample["key"],
+                    "normalized": sample["normalized"],
+                    "latest": sample,
+                    "plan": None,
+                    "count": 0,
+                    "total": 0.0,
+                    "max": 0.0,
+                    "origins": {},
+                }
+            group["count"] += 1
+            group["total"] += sample["duration"]
+            group["max"] = max(group["max"], sample["duration"])
+            group["origins"][sample["origin"]] = (
+                group["origins"].get(sample["origin"], 0) + 1
+            )
+            group["plan"] = group["plan"] or sample["plan"]
+        return sorted(groups.values(), key=lambda group: group["total"], reverse=True)
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.plans.clear()
+
+
+slow_queries = SlowQueryLog()
+
+
+def record_slow_query(execute, sql, params, many, context):
+    threshold = settings.SLOW_QUERY_MS
+    if threshold is None or _explaining.get():
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = (time.perf_counter() - started) * 1000
+    if duration >= threshold:
+        _record(context["connection"], sql, params, many, duration)
+    return result
+
+
+def _record(connection, sql, params, many, duration):
+    key, normalized = fingerprint(sql)
+    frames = _project_frames()
+    origin = _origin(frames)
+    plan, explained = None, False
+    if not many and sql.split(None, 1)[0].upper() in ("SELECT", "WITH"):
+        found, plan = slow_queries.recent_plan(key)
+        if not found:
+            plan, explained = explain(connection, sql, params), True
+    logger.warning(
+        "Slow query (%.0f ms, %s) [%s]: %s", duration, origin, key, normalized
+    )
+    slow_queries.add(
+        {
+            "key": key,
+            "normalized": normalized,
+            "sql": sql,
+            "params": repr(params)[:500],
+            "duration": duration,
+            "origin": origin,
+            "stack": [
+                f"{path}:{line} in {function}"
+                for path, line, function in frames[:STACK_DEPTH]
+            ],
+            "plan": plan,
+            "at": timezone.now(),
+        },
+        explained,
+    )
+
+
+def install_slow_query_log(sender, connection, **kwargs):
+    """``connection_created`` receiver, like ``perf.install_query_timer``."""
+    if record_slow_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_slow_query)
+
+
+def slow_queries_view(request):
+    """The buffered slow queries grouped by fingerprint; admins only."""
+    if not perf._is_admin(request.user):
+        raise PermissionDenied
+    if request.method == "POST" and "reset" in request.POST:
+        slow_queries.reset()
+    return render(
+        request,
+        "perf/slow_queries.html",
+        {
+            "groups": slow_queries.groups(),
+            "threshold": settings.SLOW_QUERY_MS,
+            "buffer": settings.SLOW_QUERY_BUFFER,
+        },
+    )
@@ -0,0 +1,49 @@
+"""Shared test helpers."""
+
+import time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+
+class QueryPlanMixin:
+    """
+    ``assertUsesIndex`` checks ``QuerySet.explain()`` for an index name.
+
+    Test tables hold a handful of rows, so on PostgreSQL sequential scans
+    are switched off for the duration of the EXPLAIN; otherwise the
+    planner would (rightly) ignore every index.
+    """
+
+    def query_plan(self, queryset):
+        with transaction.atomic(using=queryset.db):
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            return queryset.explain()
+
+    def assertUsesIndex(self, queryset, index_name, sorted_by_index=True):
+        plan = self.query_plan(queryset)
+        self.assertIn(index_name, plan)
+        if sorted_by_index and connection.vendor == "sqlite":
+            self.assertNotIn("TEMP B-TREE", plan)
+        return plan
+
+
+class QueryCountMixin:
+    """``measure`` GETs a URL and returns its status, query count and SQL time."""
+
+    def measure(self, url):
+        cache.clear()  # dashboard blocks would hide their queries
+        timings = []
+
+        def timed(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                timings.append(time.perf_counter() - started)
+
+        with connection.execute_wrapper(timed):
+            response = self.client.get(url)
+        return response.status_code, len(timings), sum(timings) * 1000
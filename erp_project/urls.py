@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.i18n import i18n_patterns
 from erp_project import settings
+from erp_project.perf import perf_metrics_view, perf_view
+from erp_project.slow_queries import slow_queries_view
 
 urlpatterns = [
     path("i18n/", include("django.conf.urls.i18n")),  # ← KIRITING
@@ -9,6 +11,11 @@ urlpatterns = [
     path("accounts/", include("accounts.urls")),
     path("inventory/", include("inventory.urls")),
     path("sales/", include("sales.urls")),
+    path("tasks/", include("tasks.urls")),
+    path("perf/", perf_view, name="perf"),
+    path("perf/metrics", perf_metrics_view, name="perf_metrics"),
+    path("perf/queries/", slow_queries_view, name="slow_queries"),
+    path("api/", include("erp_project.api_urls")),
     path("", include("dashboard.urls")),  # bosh sahifa
 ]
 
@@ -1,27 +1,80 @@
 from django.contrib import admin
-from .models import Category, Product
+from django.utils import timezone
+
+from erp_project.admin_utils import LargeTableAdmin
+from .models import Category, LowStockAlert, Product, StockMovement, StockSnapshot
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ("id", "name", "product_count")
+    list_display = (
+        "id",
+        "name",
+        "product_count",
+        "active_product_count",
+        "units_sold",
+        "revenue",
+    )
     search_fields = ("name",)
     ordering = ("name",)
 
-    @admin.display(description="Products")
-    def product_count(self, obj):
-        return obj.products.count()
-
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdmin):
     list_display = ("id", "name", "category", "quantity", "sell_price", "is_low")
-    list_filter = ("category",)  # sidebar filter
+    list_select_related = ("category",)
+    list_filter = ("category", "is_low_stock")  # sidebar filter
     search_fields = ("name", "sku")
-    list_editable = ("quantity", "sell_price")  # ro‘yxatda to‘g‘ridan tahrir
+    autocomplete_fields = ("category",)
+    # ro‘yxatda to‘g‘ridan tahrir; the formset covers one page, so keep it short
+    list_editable = ("quantity", "sell_price")
+    list_per_page = 50
     readonly_fields = ("cost_price",)  # faqat ko‘rish
     ordering = ("name",)
 
     @admin.display(boolean=True, description="Low?")
     def is_low(self, obj):
-        return obj.quantity <= obj.min_stock
+        return obj.is_low_stock
+
+
+@admin.register(LowStockAlert)
+class LowStockAlertAdmin(admin.ModelAdmin):
+    list_display = ("id", "created_at", "product", "state", "quantity", "handled_at")
+    list_filter = ("state", ("handled_at", admin.EmptyFieldListFilter))
+    search_fields = ("product__name",)
+    list_select_related = ("product",)
+    raw_id_fields = ("product",)
+    date_hierarchy = "created_at"
+    actions = ["mark_handled"]
+
+    @admin.action(description="Mark selected alerts as handled")
+    def mark_handled(self, request, queryset):
+        handled = queryset.filter(handled_at__isnull=True).update(
+            handled_at=timezone.now()
+        )
+        self.message_user(request, f"{handled} alert(s) marked as handled.")
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(LargeTableAdmin):
+    list_display = ("id", "created_at", "product", "delta", "reason", "reference")
+    list_select_related = ("product",)
+    # fixed date ranges instead of date_hierarchy's scan of the journal
+    list_filter = ("reason", ("created_at", admin.DateFieldListFilter))
+    search_fields = ("product__name", "reference")
+    raw_id_fields = ("product",)
+
+    # the journal is append-only
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(LargeTableAdmin):
+    list_display = ("id", "taken_at", "product", "quantity", "last_movement_id")
+    list_select_related = ("product",)
+    search_fields = ("product__name",)
+    raw_id_fields = ("product",)
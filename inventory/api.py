@@ -0,0 +1,44 @@
+from erp_project.api import JsonListView
+from .models import Category, Product
+
+
+class ProductApiView(JsonListView):
+    queryset = Product.objects.all()
+    fields = {
+        "id": "id",
+        "name": "name",
+        "sku": "sku",
+        "category_id": "category_id",
+        "category": "category__name",
+        "cost_price": "cost_price",
+        "sell_price": "sell_price",
+        "quantity": "quantity",
+        "min_stock": "min_stock",
+        "is_low_stock": "is_low_stock",
+        "is_active": "is_active",
+        "updated_at": "updated_at",
+    }
+    filters = {
+        "category": "category_id",
+        "sku": "sku",
+        "name": "name__icontains",
+        "is_active": "is_active",
+        "low_stock": "is_low_stock",
+        "updated_since": "updated_at__gte",
+    }
+    keyset = ("pk",)
+    tables = (Product, Category)
+
+
+class CategoryApiView(JsonListView):
+    queryset = Category.objects.all()
+    fields = {
+        "id": "id",
+        "name": "name",
+        "product_count": "product_count",
+        "active_product_count": "active_product_count",
+        "updated_at": "updated_at",
+    }
+    filters = {"name": "name__icontains"}
+    keyset = ("name", "id")
+    tables = (Category, Product)
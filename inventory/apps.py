@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "inventory"
+
+    def ready(self):
+        from erp_project.api import track_deletes
+
+        # the JSON API's validators (erp_project.api.table_state)
+        track_deletes(self.get_model("Product"), self.get_model("Category"))
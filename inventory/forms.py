@@ -10,6 +10,23 @@ class CategoryForm(forms.ModelForm):
         fields = ["name"]
 
 
+class ProductImportForm(forms.Form):
+    file = forms.FileField(
+        help_text="CSV with category, name, sku, cost_price, sell_price and optionally quantity, min_stock, is_active"
+    )
+    key = forms.ChoiceField(
+        choices=[("name", "Category + name"), ("sku", "SKU")],
+        initial="name",
+        label="Match existing products on",
+    )
+    create_categories = forms.BooleanField(required=False)
+    background = forms.BooleanField(
+        required=False,
+        label="Run in the background",
+        help_text="For big files: queue the import and follow it on the task page",
+    )
+
+
 class ProductForm(forms.ModelForm):
     class Meta:
         model = Product
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from inventory.services import compact_ledger, ledger_drift
+
+
+class Command(BaseCommand):
+    help = "Fold stock movements into per-product snapshots"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before",
+            help="Snapshot cutoff (ISO datetime). Defaults to 24 hours ago.",
+        )
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            help="Delete the movements folded into the new snapshots.",
+        )
+
+    def handle(self, *args, before=None, prune=False, **kwargs):
+        if before:
+            cutoff = parse_datetime(before)
+            if cutoff is None:
+                raise CommandError(f"Invalid datetime: {before}")
+            if timezone.is_naive(cutoff):
+                cutoff = timezone.make_aware(cutoff)
+        else:
+            cutoff = timezone.now() - timedelta(days=1)
+
+        try:
+            written = compact_ledger(cutoff, prune=prune)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{written} snapshots written at {cutoff:%Y-%m-%d %H:%M}."
+            )
+        )
+
+        drift = ledger_drift().count()
+        if drift:
+            self.stdout.write(
+                self.style.WARNING(f"{drift} products disagree with their ledger.")
+            )
@@ -0,0 +1,55 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.importing import ProductImporter
+
+
+class Command(BaseCommand):
+    help = "Upsert products from a supplier CSV (streamed, batched bulk upserts)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file ('-' reads stdin)")
+        parser.add_argument(
+            "--key",
+            choices=["name", "sku"],
+            default="name",
+            help="Match existing products on (category, name) or on sku",
+        )
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument(
+            "--create-categories",
+            action="store_true",
+            help="Create unknown categories instead of rejecting their rows",
+        )
+        parser.add_argument(
+            "--max-errors", type=int, default=100, help="Row errors to print"
+        )
+
+    def handle(self, *args, path, **opts):
+        if opts["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+        importer = ProductImporter(
+            key=opts["key"],
+            batch_size=opts["batch_size"],
+            create_categories=opts["create_categories"],
+            reference=f"import:{path}"[:40],
+            max_errors=opts["max_errors"],
+        )
+        try:
+            if path == "-":
+                report = importer.run(sys.stdin)
+            else:
+                with open(path, newline="", encoding="utf-8-sig") as fh:
+                    report = importer.run(fh)
+        except (OSError, ValueError) as exc:
+            raise CommandError(exc)
+
+        for line, message in report.errors:
+            self.stderr.write(f"line {line}: {message}")
+        if report.error_count > len(report.errors):
+            self.stderr.write(
+                f"… {report.error_count - len(report.errors):,} more errors"
+            )
+        style = self.style.WARNING if report.error_count else self.style.SUCCESS
+        self.stdout.write(style(str(report)))
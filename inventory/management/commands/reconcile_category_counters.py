@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from inventory.models import Category
+from inventory.services import reconcile_category_counters
+
+
+class Command(BaseCommand):
+    help = "Recount the category product and sales counters, fixing any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "categories",
+            nargs="*",
+            type=int,
+            help="Category ids to recount. Defaults to all categories.",
+        )
+
+    def handle(self, *args, categories, **kwargs):
+        fixed = reconcile_category_counters(categories or None)
+        if not fixed:
+            self.stdout.write(self.style.SUCCESS("All category counters are exact."))
+            return
+        names = Category.objects.filter(pk__in=fixed).values_list("name", flat=True)
+        self.stdout.write(
+            self.style.WARNING(f"Fixed {len(fixed)} categories: {', '.join(names)}")
+        )
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:52
+
+from django.db import migrations
+
+
+def journal_opening_stock(apps, schema_editor):
+    Product = apps.get_model("inventory", "Product")
+    StockMovement = apps.get_model("inventory", "StockMovement")
+    StockMovement.objects.bulk_create(
+        (
+            StockMovement(
+                product_id=product_id,
+                delta=quantity,
+                reason="opening",
+                reference="migration",
+            )
+            for product_id, quantity in Product.objects.exclude(quantity=0)
+            .values_list("id", "quantity")
+            .iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0002_stock_ledger"),
+    ]
+
+    operations = [
+        migrations.RunPython(journal_opening_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0003_opening_stock_movements"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["name"],
+                name="product_active_name_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("quantity__lte", models.F("min_stock"))),
+                fields=["name"],
+                name="product_low_stock_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0004_product_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["updated_at"], name="product_updated_at_idx"),
+        ),
+    ]
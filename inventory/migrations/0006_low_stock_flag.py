@@ -0,0 +1,88 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def flag_low_stock(apps, schema_editor):
+    Product = apps.get_model("inventory", "Product")
+    Product.objects.filter(quantity__lte=models.F("min_stock")).update(
+        is_low_stock=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0005_product_updated_at_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LowStockAlert",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "state",
+                    models.CharField(
+                        choices=[
+                            ("low", "Fell to minimum stock"),
+                            ("recovered", "Recovered"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("quantity", models.IntegerField()),
+                ("min_stock", models.IntegerField()),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("handled_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "ordering": ["-id"],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_low_stock_idx",
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="is_low_stock",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(flag_low_stock, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_low_stock", True)),
+                fields=["name"],
+                name="product_low_stock_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="lowstockalert",
+            name="product",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="low_stock_alerts",
+                to="inventory.product",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="lowstockalert",
+            index=models.Index(
+                condition=models.Q(("handled_at__isnull", True)),
+                fields=["created_at"],
+                name="low_stock_alert_open_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:00
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def count_categories(apps, schema_editor):
+    Category = apps.get_model("inventory", "Category")
+    Product = apps.get_model("inventory", "Product")
+    SaleItem = apps.get_model("sales", "SaleItem")
+    counts = {}
+    for row in (
+        Product.objects.values("category_id")
+        .annotate(
+            product_count=Count("pk"),
+            active_product_count=Count("pk", filter=Q(is_active=True)),
+        )
+        .order_by()
+    ):
+        counts.setdefault(row.pop("category_id"), {}).update(row)
+    for row in (
+        SaleItem.objects.values(category_id=models.F("product__category_id"))
+        .annotate(units_sold=Sum("quantity"), revenue=Sum("line_total"))
+        .order_by()
+    ):
+        counts.setdefault(row.pop("category_id"), {}).update(row)
+    for category_id, values in counts.items():
+        Category.objects.filter(pk=category_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0006_low_stock_flag"),
+        ("sales", "0003_sale_updated_at_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="active_product_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="product_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="revenue",
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=14
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="units_sold",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_categories, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,23 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import models, transaction
 from django.urls import reverse
+from django.utils import timezone
+
+from .signals import products_moved
 
 
 class Category(models.Model):
     name = models.CharField(max_length=60, unique=True)
+    # denormalized counters: kept by count_products()/count_sales(), repaired
+    # by services.reconcile_category_counters().  They count by the products'
+    # current category: a product that moves takes its sales along.
+    product_count = models.IntegerField(default=0, editable=False)
+    active_product_count = models.IntegerField(default=0, editable=False)
+    units_sold = models.IntegerField(default=0, editable=False)
+    revenue = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, editable=False
+    )
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -15,6 +29,85 @@ class Category(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    COUNTERS = ("product_count", "active_product_count", "units_sold", "revenue")
+
+    def save(self, *args, **kwargs):
+        # the counters only move by F() increments; writing back the values
+        # read with the row (the category form, the admin) would undo any
+        # made since
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTERS
+            ]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def _bump(cls, deltas):
+        """
+        Add ``{category_id: {field: delta}}`` with one UPDATE per category,
+        in id order (as ``take_stock`` locks products) so two transactions
+        bumping the same categories cannot deadlock.
+        """
+        for category_id in sorted(pk for pk in deltas if pk is not None):
+            changes = {
+                field: models.F(field) + value
+                for field, value in deltas[category_id].items()
+                if value
+            }
+            if changes:
+                cls.objects.filter(pk=category_id).update(**changes)
+
+    @classmethod
+    def count_products(cls, added=(), removed=()):
+        """
+        Count products in or out of their categories; ``added`` and
+        ``removed`` hold ``(category_id, is_active)`` pairs.
+        """
+        deltas = defaultdict(lambda: {"product_count": 0, "active_product_count": 0})
+        for pairs, sign in ((added, 1), (removed, -1)):
+            for category_id, is_active in pairs:
+                deltas[category_id]["product_count"] += sign
+                deltas[category_id]["active_product_count"] += sign * bool(is_active)
+        cls._bump(deltas)
+
+    @classmethod
+    def move_sales(cls, moves):
+        """
+        Carry the units sold and revenue of products to their new category;
+        ``moves`` maps product ids to ``(old_category_id, new_category_id)``.
+        """
+        from sales.models import SaleItem
+
+        moves = {pk: move for pk, move in moves.items() if move[0] != move[1]}
+        if not moves:
+            return
+        totals = defaultdict(lambda: [0, 0])
+        sold = (
+            SaleItem.objects.filter(product_id__in=moves)
+            .values("product_id")
+            .annotate(units=models.Sum("quantity"), revenue=models.Sum("line_total"))
+            .order_by()
+        )
+        for row in sold:
+            old, new = moves[row["product_id"]]
+            for category_id, sign in ((old, -1), (new, 1)):
+                totals[category_id][0] += sign * row["units"]
+                totals[category_id][1] += sign * row["revenue"]
+        cls.count_sales(totals)
+        products_moved.send(sender=Product, moves=moves)
+
+    @classmethod
+    def count_sales(cls, totals):
+        """Add ``{category_id: (units, revenue)}`` to the sales counters."""
+        cls._bump(
+            {
+                category_id: {"units_sold": units, "revenue": revenue}
+                for category_id, (units, revenue) in totals.items()
+            }
+        )
+
 
 class Product(models.Model):
     category = models.ForeignKey(
@@ -29,16 +122,88 @@ class Product(models.Model):
         default=5, help_text="Minimal zaxira miqdori"
     )
     is_active = models.BooleanField(default=True)
+    # quantity <= min_stock, kept by save() and services.sync_low_stock
+    is_low_stock = models.BooleanField(default=False, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["name"]
         unique_together = ("category", "name")
+        indexes = [
+            # product list: active products by name (archived rows left out)
+            models.Index(
+                fields=["name"],
+                condition=models.Q(is_active=True),
+                name="product_active_name_idx",
+            ),
+            # dashboard low-stock list; only the few low rows are indexed
+            # (backends without partial indexes skip it)
+            models.Index(
+                fields=["name"],
+                condition=models.Q(is_low_stock=True),
+                name="product_low_stock_idx",
+            ),
+            # ETag of the JSON API (MAX(updated_at))
+            models.Index(fields=["updated_at"], name="product_updated_at_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        tracks_quantity = update_fields is None or "quantity" in update_fields
+        tracks_low = tracks_quantity or "min_stock" in update_fields
+        tracks_counts = update_fields is None or bool(
+            {"category", "category_id", "is_active"} & set(update_fields)
+        )
+        adding = self._state.adding
+        if tracks_low:
+            self.is_low_stock = self.quantity <= self.min_stock
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "is_low_stock"}
+        with transaction.atomic():
+            before, was_low, counted = 0, False, None
+            if not adding and (tracks_low or tracks_counts):
+                previous = (
+                    Product.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list("quantity", "is_low_stock", "category_id", "is_active")
+                    .first()
+                )
+                if previous:
+                    before, was_low = previous[:2]
+                    counted = previous[2:]
+            super().save(*args, **kwargs)
+
+            if adding:
+                Category.count_products(added=[(self.category_id, self.is_active)])
+            elif tracks_counts and counted != (self.category_id, self.is_active):
+                Category.count_products(
+                    added=[(self.category_id, self.is_active)],
+                    removed=[counted] if counted else [],
+                )
+                if counted:
+                    Category.move_sales({self.pk: (counted[0], self.category_id)})
+
+            if tracks_low and self.is_low_stock != was_low:
+                LowStockAlert.log([(self.pk, self.quantity, self.min_stock, was_low)])
+
+            # journal manual stock changes (form edits, admin list_editable)
+            delta = self.quantity - before
+            if tracks_quantity and delta:
+                StockMovement.objects.create(
+                    product=self,
+                    delta=delta,
+                    reason=StockMovement.OPENING if adding else StockMovement.EDIT,
+                )
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            Category.count_products(removed=[(self.category_id, self.is_active)])
+            return super().delete(*args, **kwargs)
+
     # URL helper
     def get_absolute_url(self):
         return reverse("product_list")
@@ -46,4 +211,124 @@ class Product(models.Model):
     # Low-stock flag
     @property
     def is_low(self):
-        return self.quantity <= self.min_stock
+        return self.is_low_stock
+
+
+class StockMovement(models.Model):
+    """Append-only journal of every change to ``Product.quantity``."""
+
+    OPENING = "opening"
+    SALE = "sale"
+    EDIT = "edit"
+    RESTOCK = "restock"
+    REASON_CHOICES = [
+        (OPENING, "Opening balance"),
+        (SALE, "Sale"),
+        (EDIT, "Manual edit"),
+        (RESTOCK, "Restock"),
+    ]
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="movements"
+    )
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=10, choices=REASON_CHOICES)
+    reference = models.CharField(max_length=40, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [models.Index(fields=["product", "created_at"])]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.delta:+d} ({self.reason})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Stock movements are append-only.")
+        super().save(*args, **kwargs)
+
+
+class StockSnapshot(models.Model):
+    """
+    Stock of a product folded from the ledger up to ``last_movement_id``.
+
+    Written by ``compact_stock_ledger`` so point-in-time queries read one
+    snapshot plus the movements after it instead of the whole journal.
+    """
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="snapshots"
+    )
+    quantity = models.IntegerField()
+    taken_at = models.DateTimeField()
+    last_movement_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-taken_at"]
+        indexes = [models.Index(fields=["product", "taken_at"])]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.taken_at:%Y-%m-%d %H:%M}: {self.quantity}"
+
+
+class LowStockAlert(models.Model):
+    """
+    A product's stock crossing its ``min_stock``, in either direction.
+
+    Only transitions are logged, never the steady state.  ``LOW`` rows with
+    no ``handled_at`` are the open alerts; a product recovering closes its
+    open alert.
+    """
+
+    LOW = "low"
+    RECOVERED = "recovered"
+    STATE_CHOICES = [(LOW, "Fell to minimum stock"), (RECOVERED, "Recovered")]
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="low_stock_alerts"
+    )
+    state = models.CharField(max_length=10, choices=STATE_CHOICES)
+    quantity = models.IntegerField()
+    min_stock = models.IntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+    handled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-id"]
+        indexes = [
+            # the open-alert queue
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(handled_at__isnull=True),
+                name="low_stock_alert_open_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.state} ({self.quantity}/{self.min_stock})"
+
+    @classmethod
+    def log(cls, flips, now=None):
+        """
+        Record ``flips`` (``(product_id, quantity, min_stock, was_low)``);
+        recoveries also close their product's open alert.
+        """
+        now = now or timezone.now()
+        recovered = [pk for pk, _, _, was_low in flips if was_low]
+        if recovered:
+            cls.objects.filter(
+                product_id__in=recovered, state=cls.LOW, handled_at__isnull=True
+            ).update(handled_at=now)
+        return cls.objects.bulk_create(
+            cls(
+                product_id=pk,
+                state=cls.RECOVERED if was_low else cls.LOW,
+                quantity=quantity,
+                min_stock=min_stock,
+                created_at=now,
+                handled_at=now if was_low else None,
+            )
+            for pk, quantity, min_stock, was_low in flips
+        )
@@ -0,0 +1,277 @@
+"""
+Stock movement primitives.
+
+Quantities are only ever changed with conditional ``UPDATE ... SET quantity
+= quantity - n WHERE quantity >= n`` statements, so concurrent workers can
+neither lose updates nor drive stock below zero.  Every change is journaled
+as a ``StockMovement``; ``StockSnapshot`` rows fold old movements so
+``stock_at`` never has to replay the whole journal.  Changes that cross
+``min_stock`` flip ``Product.is_low_stock`` and are logged as
+``LowStockAlert`` rows (``sync_low_stock``).  ``Category`` counters are
+kept incrementally by the models; ``reconcile_category_counters`` repairs
+them.
+"""
+
+import operator
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Category, LowStockAlert, Product, StockMovement, StockSnapshot
+from .signals import stock_changed
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id, name, requested, available):
+        self.product_id = product_id
+        self.name = name
+        self.requested = requested
+        self.available = available
+        super().__init__(
+            f"Not enough stock for {name}: requested {requested}, "
+            f"available {available}."
+        )
+
+
+def _journal(quantities, sign, reason, reference, now):
+    StockMovement.objects.bulk_create(
+        StockMovement(
+            product_id=product_id,
+            delta=sign * units,
+            reason=reason,
+            reference=reference,
+            created_at=now,
+        )
+        for product_id, units in quantities.items()
+        if units
+    )
+
+
+@transaction.atomic
+def take_stock(quantities, reason=StockMovement.SALE, reference=""):
+    """
+    Remove ``quantities`` (``{product_id: units}``) from stock.
+
+    Either every product is decremented or ``InsufficientStock`` is raised
+    and nothing is.  Products are updated in pk order so two concurrent
+    multi-product sales always lock rows in the same order.
+    """
+    now = timezone.now()
+    for product_id in sorted(quantities):
+        units = quantities[product_id]
+        if not units:
+            continue
+        taken = Product.objects.filter(pk=product_id, quantity__gte=units).update(
+            quantity=F("quantity") - units, updated_at=now
+        )
+        if not taken:
+            name, available = Product.objects.values_list("name", "quantity").get(
+                pk=product_id
+            )
+            raise InsufficientStock(product_id, name, units, available)
+    _journal(quantities, -1, reason, reference, now)
+    sync_low_stock(quantities, now)
+    stock_changed.send(sender=Product, product_ids=set(quantities))
+
+
+@transaction.atomic
+def put_stock(quantities, reason=StockMovement.RESTOCK, reference=""):
+    """Add ``quantities`` (``{product_id: units}``) to stock."""
+    now = timezone.now()
+    for product_id in sorted(quantities):
+        units = quantities[product_id]
+        if units:
+            Product.objects.filter(pk=product_id).update(
+                quantity=F("quantity") + units, updated_at=now
+            )
+    _journal(quantities, 1, reason, reference, now)
+    sync_low_stock(quantities, now)
+    stock_changed.send(sender=Product, product_ids=set(quantities))
+
+
+def sync_low_stock(product_ids=None, now=None):
+    """
+    Flip ``is_low_stock`` on the products among ``product_ids`` (default:
+    all) whose stock crossed ``min_stock`` and log each flip as a
+    ``LowStockAlert``; returns the new alerts.
+
+    Run it in the transaction that changed the quantities: the rows are
+    locked already, and products that did not cross cost one indexed read.
+    """
+    low = Q(quantity__lte=F("min_stock"))
+    crossed = Product.objects.filter(
+        (low & Q(is_low_stock=False)) | (~low & Q(is_low_stock=True))
+    )
+    if product_ids is not None:
+        crossed = crossed.filter(pk__in=list(product_ids))
+    crossed = list(crossed.values_list("pk", "quantity", "min_stock", "is_low_stock"))
+    if not crossed:
+        return []
+
+    for was_low in (False, True):
+        flipped = [pk for pk, _, _, low in crossed if low == was_low]
+        if flipped:
+            Product.objects.filter(pk__in=flipped).update(is_low_stock=not was_low)
+    return LowStockAlert.log(crossed, now)
+
+
+def restock(product, units, reference=""):
+    put_stock({product.pk: units}, reference=reference)
+
+
+def _category_counts():
+    """Each ``Category`` counter as a subquery recounting it from its rows."""
+    from sales.models import SaleItem
+
+    products = Product.objects.filter(category=OuterRef("pk")).order_by()
+    lines = SaleItem.objects.filter(product__category=OuterRef("pk")).order_by()
+
+    def recount(field, queryset, group, aggregate):
+        return Coalesce(
+            Subquery(queryset.values(group).annotate(n=aggregate).values("n")),
+            Value(0),
+            output_field=Category._meta.get_field(field),
+        )
+
+    return {
+        "product_count": recount("product_count", products, "category", Count("pk")),
+        "active_product_count": recount(
+            "active_product_count",
+            products.filter(is_active=True),
+            "category",
+            Count("pk"),
+        ),
+        "units_sold": recount(
+            "units_sold", lines, "product__category", Sum("quantity")
+        ),
+        "revenue": recount("revenue", lines, "product__category", Sum("line_total")),
+    }
+
+
+@transaction.atomic
+def reconcile_category_counters(category_ids=None):
+    """
+    Recount the ``Category`` counters of ``category_ids`` (default: all) and
+    return the pks of the categories that had drifted.
+
+    Two statements whatever the number of categories: one finds the drifted
+    rows, one UPDATE rewrites them from the same correlated subqueries.
+    Counts are taken from the statement's snapshot, so run it while sales
+    are quiet to avoid overwriting a concurrent increment.
+    """
+    counts = _category_counts()
+    drifted = Category.objects.annotate(
+        **{f"fresh_{field}": count for field, count in counts.items()}
+    ).filter(
+        reduce(
+            operator.or_,
+            (~Q(**{field: F(f"fresh_{field}")}) for field in counts),
+        )
+    )
+    if category_ids is not None:
+        drifted = drifted.filter(pk__in=list(category_ids))
+    drifted = list(drifted.values_list("pk", flat=True))
+    if drifted:
+        Category.objects.filter(pk__in=drifted).update(**counts)
+    return drifted
+
+
+def _latest_snapshot(product_ref):
+    return StockSnapshot.objects.filter(product=product_ref).order_by(
+        "-taken_at", "-id"
+    )
+
+
+def stock_at(product, when):
+    """Quantity of ``product`` at ``when``: one snapshot plus the deltas after it."""
+    product_id = getattr(product, "pk", product)
+    movements = StockMovement.objects.filter(
+        product_id=product_id, created_at__lte=when
+    )
+    base = 0
+    snapshot = _latest_snapshot(product_id).filter(taken_at__lte=when).first()
+    if snapshot:
+        base = snapshot.quantity
+        movements = movements.filter(id__gt=snapshot.last_movement_id)
+    return base + (movements.aggregate(total=Sum("delta"))["total"] or 0)
+
+
+def ledger_drift():
+    """Products whose ``quantity`` disagrees with their journal."""
+    latest = _latest_snapshot(OuterRef("pk"))
+    after_snapshot = (
+        StockMovement.objects.filter(
+            product=OuterRef("pk"), id__gt=OuterRef("snapshot_last")
+        )
+        .values("product")
+        .annotate(total=Sum("delta"))
+        .values("total")
+    )
+    return (
+        Product.objects.annotate(
+            snapshot_qty=Coalesce(Subquery(latest.values("quantity")[:1]), Value(0)),
+            snapshot_last=Coalesce(
+                Subquery(latest.values("last_movement_id")[:1]), Value(0)
+            ),
+        )
+        .annotate(
+            ledger=F("snapshot_qty") + Coalesce(Subquery(after_snapshot), Value(0))
+        )
+        .filter(~Q(quantity=F("ledger")))
+    )
+
+
+@transaction.atomic
+def compact_ledger(cutoff, prune=False):
+    """
+    Write a ``StockSnapshot`` at ``cutoff`` for every product that moved since
+    its previous snapshot and return how many were written.
+
+    ``cutoff`` should lie safely in the past (the command defaults to one
+    day ago) so no transaction that is still open can commit a movement
+    behind it.  With ``prune`` the folded movements are deleted, which
+    shrinks the journal but limits ``stock_at`` precision before ``cutoff``
+    to snapshot granularity.
+    """
+    newest = StockSnapshot.objects.aggregate(newest=Max("taken_at"))["newest"]
+    if newest and cutoff <= newest:
+        raise ValueError(f"Ledger is already compacted up to {newest:%Y-%m-%d %H:%M}.")
+
+    latest = _latest_snapshot(OuterRef("product"))
+    folded = (
+        StockMovement.objects.filter(created_at__lte=cutoff)
+        .annotate(
+            floor=Coalesce(Subquery(latest.values("last_movement_id")[:1]), Value(0))
+        )
+        .filter(id__gt=F("floor"))
+        .values("product_id")
+        .annotate(delta=Sum("delta"), last=Max("id"))
+        .order_by()
+    )
+    previous = dict(
+        StockSnapshot.objects.filter(
+            pk__in=StockSnapshot.objects.values("product")
+            .annotate(newest=Max("id"))
+            .values("newest")
+        ).values_list("product_id", "quantity")
+    )
+    snapshots = StockSnapshot.objects.bulk_create(
+        (
+            StockSnapshot(
+                product_id=row["product_id"],
+                quantity=previous.get(row["product_id"], 0) + row["delta"],
+                taken_at=cutoff,
+                last_movement_id=row["last"],
+            )
+            for row in folded.iterator()
+        ),
+        batch_size=1000,
+    )
+    if prune:
+        StockMovement.objects.filter(
+            id__lte=Subquery(latest.values("last_movement_id")[:1])
+        ).delete()
+    return len(snapshots)
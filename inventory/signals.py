@@ -0,0 +1,14 @@
+from django.dispatch import Signal
+
+# Sent by inventory.services after quantities change through
+# ``QuerySet.update`` (which fires no model signals); ``product_ids`` is the
+# set of products touched.
+stock_changed = Signal()
+
+# Sent by inventory.importing after each upserted batch (bulk_create fires
+# no post_save); ``product_ids`` is the set of products written.
+catalog_changed = Signal()
+
+# Sent by Category.move_sales when products change category; ``moves`` maps
+# product ids to ``(old_category_id, new_category_id)``.
+products_moved = Signal()
@@ -0,0 +1,43 @@
+import io
+
+from django.core.files.storage import default_storage
+
+from tasks.queue import PermanentFailure, register
+from .importing import ProductImporter
+from .services import reconcile_category_counters as reconcile
+
+
+@register
+def import_products(path, key="name", create_categories=False, reference="import"):
+    """Import the CSV an upload left at ``path`` in the default storage."""
+    if not default_storage.exists(path):
+        raise PermanentFailure(f"The uploaded file {path} is gone.")
+    importer = ProductImporter(
+        key=key,
+        create_categories=create_categories,
+        reference=reference,
+        max_errors=200,
+    )
+    with default_storage.open(path, "rb") as upload:
+        stream = io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")
+        try:
+            report = importer.run(stream)
+        except (UnicodeDecodeError, ValueError) as exc:
+            default_storage.delete(path)
+            raise PermanentFailure(str(exc))
+        finally:
+            stream.detach()
+    # kept until now so a crashed attempt can be retried
+    default_storage.delete(path)
+    return {
+        "summary": str(report),
+        "created": report.created,
+        "updated": report.updated,
+        "rejected": report.error_count,
+        "errors": report.errors,
+    }
+
+
+@register
+def reconcile_category_counters():
+    return {"fixed": reconcile()}
@@ -1,9 +1,41 @@
+import os
+import tempfile
+from datetime import timedelta
 from decimal import Decimal
-from django.test import TestCase
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.db.utils import IntegrityError, DataError
 from django.core.exceptions import ValidationError
 from django.urls import reverse
-from .models import Category, Product
+from erp_project.testing import QueryPlanMixin
+from tasks.models import Task
+from tasks.queue import claim, run
+from .importing import ProductImporter
+from .models import (
+    Category,
+    LowStockAlert,
+    Product,
+    StockMovement,
+    StockSnapshot,
+)
+from .services import (
+    InsufficientStock,
+    compact_ledger,
+    ledger_drift,
+    put_stock,
+    reconcile_category_counters,
+    restock,
+    stock_at,
+    sync_low_stock,
+    take_stock,
+)
 
 
 class CategoryModelTests(TestCase):
@@ -282,3 +314,539 @@ class ProductModelTests(TestCase):
             quantity=1,
         )
         self.assertIn(prod, self.cat.products.all())
+
+
+class StockServiceTests(TestCase):
+    def setUp(self):
+        cat = Category.objects.create(name="Tools")
+        self.hammer = Product.objects.create(
+            category=cat,
+            name="Hammer",
+            sku="HAM01",
+            cost_price=Decimal("3.00"),
+            sell_price=Decimal("6.00"),
+            quantity=10,
+        )
+        self.saw = Product.objects.create(
+            category=cat,
+            name="Saw",
+            sku="SAW01",
+            cost_price=Decimal("5.00"),
+            sell_price=Decimal("9.00"),
+            quantity=2,
+        )
+
+    def test_take_stock_decrements(self):
+        take_stock({self.hammer.pk: 4, self.saw.pk: 2})
+        self.hammer.refresh_from_db()
+        self.saw.refresh_from_db()
+        self.assertEqual(self.hammer.quantity, 6)
+        self.assertEqual(self.saw.quantity, 0)
+
+    def test_take_stock_is_all_or_nothing(self):
+        with self.assertRaises(InsufficientStock) as ctx:
+            take_stock({self.hammer.pk: 4, self.saw.pk: 3})
+        self.assertEqual(ctx.exception.product_id, self.saw.pk)
+        self.assertEqual(ctx.exception.requested, 3)
+        self.assertEqual(ctx.exception.available, 2)
+        self.hammer.refresh_from_db()
+        self.assertEqual(self.hammer.quantity, 10)
+
+    def test_put_stock_increments(self):
+        put_stock({self.saw.pk: 5})
+        self.saw.refresh_from_db()
+        self.assertEqual(self.saw.quantity, 7)
+
+
+class CategoryCounterTests(TestCase):
+    def setUp(self):
+        self.tools = Category.objects.create(name="Tools")
+        self.garden = Category.objects.create(name="Garden")
+        self.saw = self.product(self.tools, "Saw")
+        self.cashier = get_user_model().objects.create_user(
+            username="cashier", password="pass"
+        )
+
+    def product(self, category, name, **kwargs):
+        return Product.objects.create(
+            category=category,
+            name=name,
+            sku=name.upper(),
+            cost_price=Decimal("5.00"),
+            sell_price=Decimal("9.00"),
+            quantity=50,
+            **kwargs,
+        )
+
+    def counters(self, category):
+        return Category.objects.values_list(
+            "product_count", "active_product_count", "units_sold", "revenue"
+        ).get(pk=category.pk)
+
+    def test_product_changes_move_the_counts(self):
+        self.product(self.tools, "Hammer", is_active=False)
+        self.assertEqual(self.counters(self.tools)[:2], (2, 1))
+
+        self.saw.is_active = False
+        self.saw.save(update_fields=["is_active", "updated_at"])
+        self.assertEqual(self.counters(self.tools)[:2], (2, 0))
+
+        self.saw.category = self.garden
+        self.saw.save()
+        self.assertEqual(self.counters(self.tools)[:2], (1, 0))
+        self.assertEqual(self.counters(self.garden)[:2], (1, 0))
+
+        self.saw.delete()
+        self.assertEqual(self.counters(self.garden)[:2], (0, 0))
+        self.assertEqual(reconcile_category_counters(), [])
+
+    def test_sales_add_units_and_revenue(self):
+        from sales.models import Sale, SaleItem
+        from sales.services import checkout
+
+        sale = checkout(self.cashier, [(self.saw, 2)])
+        SaleItem.objects.create(
+            sale=Sale.objects.create(cashier=self.cashier), product=self.saw, quantity=1
+        )
+        self.assertEqual(self.counters(self.tools)[2:], (3, Decimal("27.00")))
+
+        sale.delete()
+        self.assertEqual(self.counters(self.tools)[2:], (1, Decimal("9.00")))
+        self.assertEqual(reconcile_category_counters(), [])
+
+    def test_moved_product_takes_its_sales_along(self):
+        from sales.services import checkout
+
+        checkout(self.cashier, [(self.saw, 2)])
+        self.saw.refresh_from_db()
+        self.saw.category = self.garden
+        self.saw.save()
+        self.assertEqual(self.counters(self.tools)[2:], (0, Decimal("0.00")))
+        self.assertEqual(self.counters(self.garden)[2:], (2, Decimal("18.00")))
+        self.assertEqual(reconcile_category_counters(), [])
+
+    def test_saving_a_category_keeps_its_counters(self):
+        stale = Category.objects.get(pk=self.tools.pk)
+        Category.count_sales({self.tools.pk: (2, Decimal("18.00"))})
+        stale.name = "Hand tools"
+        stale.save()
+        self.assertEqual(self.counters(self.tools), (1, 1, 2, Decimal("18.00")))
+        self.assertEqual(Category.objects.get(pk=self.tools.pk).name, "Hand tools")
+
+    def test_categories_are_updated_in_id_order(self):
+        # lines in either order lock the rows alike: no deadlock between sales
+        with CaptureQueriesContext(connection) as ctx:
+            Category.count_sales(
+                {
+                    self.garden.pk: (1, Decimal("6.00")),
+                    self.tools.pk: (1, Decimal("9.00")),
+                }
+            )
+        updated = [
+            int(q["sql"].rsplit("=", 1)[1])
+            for q in ctx.captured_queries
+            if q["sql"].startswith('UPDATE "inventory_category"')
+        ]
+        self.assertEqual(updated, sorted([self.garden.pk, self.tools.pk]))
+
+    def test_imports_are_counted(self):
+        csv = (
+            "category,name,sku,cost_price,sell_price,is_active\n"
+            "Garden,Saw,SAW,5,9,1\n"
+            "Garden,Rake,RAKE,3,6,0\n"
+        )
+        ProductImporter(key="sku").run(StringIO(csv))
+        self.assertEqual(self.counters(self.tools)[:2], (0, 0))
+        self.assertEqual(self.counters(self.garden)[:2], (2, 1))
+        self.assertEqual(reconcile_category_counters(), [])
+
+    def test_reconcile_fixes_drift(self):
+        Product.objects.filter(pk=self.saw.pk).update(category=self.garden)
+        out = StringIO()
+        call_command("reconcile_category_counters", stdout=out)
+        self.assertIn("Fixed 2 categories", out.getvalue())
+        self.assertEqual(self.counters(self.garden)[:2], (1, 1))
+        self.assertEqual(self.counters(self.tools)[:2], (0, 0))
+
+        out = StringIO()
+        call_command("reconcile_category_counters", self.tools.pk, stdout=out)
+        self.assertIn("exact", out.getvalue())
+
+
+class LowStockAlertTests(TestCase):
+    def setUp(self):
+        cat = Category.objects.create(name="Tools")
+        self.drill = Product.objects.create(
+            category=cat,
+            name="Drill",
+            sku="DRL01",
+            cost_price=Decimal("20.00"),
+            sell_price=Decimal("35.00"),
+            quantity=8,
+            min_stock=5,
+        )
+
+    def alerts(self):
+        return list(
+            self.drill.low_stock_alerts.order_by("id").values_list(
+                "state", "quantity", "handled_at"
+            )
+        )
+
+    def flag(self):
+        return Product.objects.values_list("is_low_stock", flat=True).get(
+            pk=self.drill.pk
+        )
+
+    def test_only_crossings_are_logged(self):
+        take_stock({self.drill.pk: 2})  # 6: still above
+        self.assertFalse(self.flag())
+        self.assertEqual(self.alerts(), [])
+
+        take_stock({self.drill.pk: 2})  # 4: low
+        take_stock({self.drill.pk: 1})  # 3: still low
+        self.assertTrue(self.flag())
+        [(state, quantity, handled_at)] = self.alerts()
+        self.assertEqual((state, quantity, handled_at), (LowStockAlert.LOW, 4, None))
+
+        put_stock({self.drill.pk: 10})
+        self.assertFalse(self.flag())
+        low, recovered = LowStockAlert.objects.order_by("id")
+        self.assertIsNotNone(low.handled_at)
+        self.assertEqual((recovered.state, recovered.quantity), ("recovered", 13))
+
+    def test_saves_keep_the_flag(self):
+        self.drill.min_stock = 10
+        self.drill.save(update_fields=["min_stock"])
+        self.assertTrue(self.flag())
+        self.assertEqual(self.alerts()[0][:2], (LowStockAlert.LOW, 8))
+
+        self.drill.name = "Cordless drill"
+        self.drill.save(update_fields=["name"])
+        self.assertEqual(len(self.alerts()), 1)
+
+    def test_sync_repairs_untracked_updates(self):
+        Product.objects.filter(pk=self.drill.pk).update(quantity=1)
+        self.assertEqual(len(sync_low_stock()), 1)
+        self.assertTrue(self.flag())
+        self.assertEqual(sync_low_stock(), [])
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        cat = Category.objects.create(name="Garden")
+        self.hose = Product.objects.create(
+            category=cat,
+            name="Hose",
+            sku="HOSE01",
+            cost_price=Decimal("4.00"),
+            sell_price=Decimal("8.00"),
+            quantity=20,
+        )
+
+    def reasons(self):
+        return list(self.hose.movements.values_list("reason", "delta"))
+
+    def test_every_stock_change_is_journaled(self):
+        take_stock({self.hose.pk: 3}, reference="sale:1")
+        restock(self.hose, 10)
+        self.hose.refresh_from_db()
+        self.hose.quantity = 25
+        self.hose.save()
+        self.assertEqual(
+            self.reasons(),
+            [("opening", 20), ("sale", -3), ("restock", 10), ("edit", -2)],
+        )
+        self.assertFalse(ledger_drift().exists())
+
+    def test_saves_without_quantity_are_not_journaled(self):
+        self.hose.is_active = False
+        self.hose.save(update_fields=["is_active"])
+        self.hose.name = "Garden hose"
+        self.hose.save()
+        self.assertEqual(self.reasons(), [("opening", 20)])
+
+    def test_movements_are_append_only(self):
+        movement = self.hose.movements.get()
+        movement.delta = 99
+        with self.assertRaises(ValueError):
+            movement.save()
+
+    def test_failed_take_is_not_journaled(self):
+        with self.assertRaises(InsufficientStock):
+            take_stock({self.hose.pk: 21})
+        self.assertEqual(self.reasons(), [("opening", 20)])
+
+    def test_stock_at_replays_movements(self):
+        t0 = timezone.now()
+        take_stock({self.hose.pk: 5})
+        t1 = timezone.now()
+        put_stock({self.hose.pk: 2})
+        self.assertEqual(stock_at(self.hose, t0), 20)
+        self.assertEqual(stock_at(self.hose, t1), 15)
+        self.assertEqual(stock_at(self.hose.pk, timezone.now()), 17)
+        self.assertEqual(stock_at(self.hose, t0 - timedelta(days=1)), 0)
+
+    def test_compaction_snapshots_and_prunes(self):
+        take_stock({self.hose.pk: 5})
+        cutoff = timezone.now()
+        put_stock({self.hose.pk: 7})
+
+        self.assertEqual(compact_ledger(cutoff, prune=True), 1)
+        snapshot = StockSnapshot.objects.get()
+        self.assertEqual(snapshot.quantity, 15)
+        self.assertEqual(self.reasons(), [("restock", 7)])
+        self.assertEqual(stock_at(self.hose, cutoff), 15)
+        self.assertEqual(stock_at(self.hose, timezone.now()), 22)
+        self.assertFalse(ledger_drift().exists())
+
+        later = timezone.now()
+        take_stock({self.hose.pk: 2})
+        self.assertEqual(compact_ledger(later), 1)
+        self.assertEqual(StockSnapshot.objects.latest("taken_at").quantity, 22)
+        with self.assertRaises(ValueError):
+            compact_ledger(cutoff)
+
+    def test_drift_detects_untracked_updates(self):
+        Product.objects.filter(pk=self.hose.pk).update(quantity=1)
+        self.assertEqual(list(ledger_drift()), [self.hose])
+
+
+class ProductIndexTests(QueryPlanMixin, TestCase):
+    def test_product_list_uses_active_name_index(self):
+        self.assertUsesIndex(
+            Product.objects.filter(is_active=True)[:10], "product_active_name_idx"
+        )
+
+    def test_low_stock_uses_partial_index(self):
+        self.assertUsesIndex(
+            Product.objects.filter(is_low_stock=True), "product_low_stock_idx"
+        )
+
+
+class ProductImportTests(TestCase):
+    HEADER = "category,name,sku,cost_price,sell_price,quantity\n"
+
+    def setUp(self):
+        self.garden = Category.objects.create(name="Garden")
+        self.hose = Product.objects.create(
+            category=self.garden,
+            name="Hose",
+            sku="HOSE01",
+            cost_price=Decimal("4.00"),
+            sell_price=Decimal("8.00"),
+            quantity=20,
+        )
+
+    def run_import(self, body, header=HEADER, **kwargs):
+        kwargs.setdefault("batch_size", 2)
+        return ProductImporter(**kwargs).run(StringIO(header + body))
+
+    def test_upserts_on_category_and_name(self):
+        report = self.run_import(
+            "Garden,Hose,HOSE01,4.00,9.50,25\n"
+            "Garden,Rake,RAKE01,3.00,6.00,7\n"
+            "Garden,Shovel,SHOV01,5.00,11.00,0\n"
+        )
+        self.assertEqual((report.created, report.updated), (2, 1))
+        self.hose.refresh_from_db()
+        self.assertEqual(self.hose.sell_price, Decimal("9.50"))
+        self.assertEqual(self.hose.quantity, 25)
+        self.assertEqual(Product.objects.get(name="Rake").quantity, 7)
+        self.assertEqual(
+            list(self.hose.movements.values_list("reason", "delta")),
+            [("opening", 20), ("edit", 5)],
+        )
+        self.assertFalse(ledger_drift().exists())
+
+    def test_reports_row_errors_and_keeps_good_rows(self):
+        report = self.run_import(
+            "Garden,Rake,RAKE01,3.00,abc,7\n"
+            "Kitchen,Pan,PAN01,3.00,6.00,1\n"
+            "Garden,Hoe,HOE01,3.00,6.00,\n"
+            "Garden,Shovel,SHOV01,5.00,11.00,4\n"
+        )
+        self.assertEqual(report.created, 1)
+        lines = dict(report.errors)
+        self.assertEqual(sorted(lines), [2, 3, 4])
+        self.assertIn("sell_price", lines[2])
+        self.assertIn("Unknown category", lines[3])
+        self.assertIn("quantity", lines[4])
+
+    def test_later_duplicate_wins(self):
+        report = self.run_import(
+            "Garden,Rake,RAKE01,3.00,6.00,7\nGarden,Rake,RAKE01,3.00,6.50,8\n"
+        )
+        self.assertEqual(report.errors, [(2, "superseded by line 3")])
+        rake = Product.objects.get(name="Rake")
+        self.assertEqual((rake.sell_price, rake.quantity), (Decimal("6.50"), 8))
+
+    def test_missing_optional_columns_are_left_alone(self):
+        self.run_import(
+            "Garden,Hose,HOSE01,4.00,8.75\n",
+            header="category,name,sku,cost_price,sell_price\n",
+        )
+        self.hose.refresh_from_db()
+        self.assertEqual((self.hose.quantity, self.hose.min_stock), (20, 5))
+        self.assertEqual(self.hose.sell_price, Decimal("8.75"))
+
+    def test_sku_key_renames_matched_products(self):
+        report = self.run_import(
+            "Garden,Garden Hose,HOSE01,4.00,8.00,20\n" "Tools,Saw,SAW01,9.00,15.00,3\n",
+            key="sku",
+            create_categories=True,
+        )
+        self.assertEqual((report.created, report.updated), (1, 1))
+        self.hose.refresh_from_db()
+        self.assertEqual(self.hose.name, "Garden Hose")
+        self.assertTrue(Product.objects.filter(category__name="Tools").exists())
+
+    def test_colliding_row_is_rejected_alone(self):
+        Product.objects.create(
+            category=self.garden,
+            name="Rake",
+            sku="RAKE01",
+            cost_price=Decimal("1.00"),
+            sell_price=Decimal("2.00"),
+        )
+        report = self.run_import(
+            "Garden,Rake,HOSE01,4.00,8.00,20\nGarden,Hoe,HOE01,1.00,2.00,1\n",
+            key="sku",
+        )
+        self.assertEqual([line for line, _ in report.errors], [2])
+        self.assertTrue(Product.objects.filter(name="Hoe").exists())
+
+    def test_missing_required_column(self):
+        with self.assertRaisesMessage(ValueError, "sell_price"):
+            self.run_import("", header="category,name,sku,cost_price\n")
+
+    def test_upload_view_and_command(self):
+        user = get_user_model().objects.create_user(
+            username="clerk", password="pass", role="staff"
+        )
+        self.client.force_login(user)
+        upload = SimpleUploadedFile(
+            "catalog.csv", (self.HEADER + "Garden,Rake,RAKE01,3.00,6.00,7\n").encode()
+        )
+        response = self.client.post(
+            reverse("product_import"), {"file": upload, "key": "name"}
+        )
+        self.assertEqual(response.context["report"].created, 1)
+        self.assertContains(response, "1 created")
+
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as fh:
+            fh.write(self.HEADER + "Garden,Rake,RAKE01,3.00,6.00,9\nGarden,X,,1,1,1\n")
+        out, err = StringIO(), StringIO()
+        try:
+            call_command("import_products", fh.name, stdout=out, stderr=err)
+        finally:
+            os.unlink(fh.name)
+        self.assertIn("1 updated", out.getvalue())
+        self.assertIn("line 3: sku", err.getvalue())
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_background_upload_is_handed_to_a_worker(self):
+        user = get_user_model().objects.create_user(
+            username="clerk", password="pass", role="staff"
+        )
+        self.client.force_login(user)
+        upload = SimpleUploadedFile(
+            "catalog.csv", (self.HEADER + "Garden,Rake,RAKE01,3.00,6.00,7\n").encode()
+        )
+        response = self.client.post(
+            reverse("product_import"),
+            {"file": upload, "key": "name", "background": "on"},
+        )
+        task = Task.objects.get()
+        self.assertRedirects(response, task.get_absolute_url())
+        self.assertFalse(Product.objects.filter(name="Rake").exists())
+
+        run(claim("test")[0])
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.result["created"]), (Task.DONE, 1))
+        self.assertTrue(Product.objects.filter(name="Rake").exists())
+        self.assertFalse(default_storage.exists(task.kwargs["path"]))
+
+
+class ProductApiTests(TestCase):
+    def setUp(self):
+        self.garden = Category.objects.create(name="Garden")
+        self.products = [
+            Product.objects.create(
+                category=self.garden,
+                name=f"Tool {i}",
+                sku=f"TOOL{i}",
+                cost_price=Decimal("1.00"),
+                sell_price=Decimal("2.50"),
+                quantity=i,
+                min_stock=2,
+            )
+            for i in range(5)
+        ]
+        user = get_user_model().objects.create_user(username="pos", password="pass")
+        self.client.force_login(user)
+
+    def get(self, headers=None, **params):
+        return self.client.get(reverse("api_products"), params, headers=headers)
+
+    def test_projects_selected_fields(self):
+        data = self.get(fields="id,category,sell_price", limit=2).json()
+        self.assertEqual(data["count"], 5)
+        self.assertEqual(
+            data["results"][0],
+            {"id": self.products[0].pk, "category": "Garden", "sell_price": "2.50"},
+        )
+        self.assertIsNone(data["previous"])
+        rest = self.client.get(data["next"]).json()
+        self.assertEqual(
+            [row["id"] for row in rest["results"]],
+            [p.pk for p in self.products[2:4]],
+        )
+
+    def test_filters(self):
+        data = self.get(low_stock="1", fields="name").json()
+        self.assertEqual(
+            [row["name"] for row in data["results"]], ["Tool 0", "Tool 1", "Tool 2"]
+        )
+        data = self.get(sku="TOOL4", fields="quantity").json()
+        self.assertEqual(data["results"], [{"quantity": 4}])
+
+    def test_rejects_bad_parameters(self):
+        self.assertEqual(self.get(fields="id,secret").status_code, 400)
+        self.assertEqual(self.get(category="garden").status_code, 400)
+        self.assertEqual(self.get(limit="0").status_code, 400)
+
+    def test_unchanged_poll_is_not_modified(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first["Last-Modified"])
+        etag = first["ETag"]
+
+        # session, user, delete counters, then MAX(updated_at) and MAX(id)
+        # for products and categories
+        with self.assertNumQueries(7):
+            again = self.get({"If-None-Match": etag})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(
+            self.get({"If-Modified-Since": first["Last-Modified"]}).status_code, 304
+        )
+
+        take_stock({self.products[3].pk: 1})
+        self.assertEqual(self.get({"If-None-Match": etag}).status_code, 200)
+        etag = self.get()["ETag"]
+        # neither the newest nor the last changed product: only the delete
+        # counter moves
+        self.products[2].delete()
+        self.assertEqual(self.get({"If-None-Match": etag}).status_code, 200)
+
+    def test_categories_carry_product_counts(self):
+        Category.objects.create(name="Empty")
+        data = self.client.get(reverse("api_categories")).json()
+        self.assertEqual(
+            [(c["name"], c["product_count"]) for c in data["results"]],
+            [("Empty", 0), ("Garden", 5)],
+        )
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.get().status_code, 403)
@@ -9,6 +9,7 @@ from .views import (
     ProductCreateView,
     ProductUpdateView,
     ProductDeleteView,
+    ProductImportView,
 )
 
 urlpatterns = [
@@ -22,6 +23,7 @@ urlpatterns = [
     ),
     path("products/", ProductListView.as_view(), name="product_list"),
     path("products/new/", ProductCreateView.as_view(), name="product_create"),
+    path("products/import/", ProductImportView.as_view(), name="product_import"),
     path("products/<int:pk>/edit", ProductUpdateView.as_view(), name="product_update"),
     path("products/<int:pk>/del", ProductDeleteView.as_view(), name="product_delete"),
 ]
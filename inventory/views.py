@@ -1,13 +1,26 @@
+import io
+
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.shortcuts import redirect, get_object_or_404
 from django.urls import reverse_lazy
-from django.views.generic import ListView, CreateView, UpdateView, DeleteView
+from django.views.generic import (
+    ListView,
+    CreateView,
+    UpdateView,
+    DeleteView,
+    FormView,
+)
 from django.views.generic.base import View
 from django.contrib import messages
+from django.core.files.storage import default_storage
 
 
+from erp_project.pagination import KeysetPaginationMixin
+from tasks.views import hand_off
+from .importing import ProductImporter
 from .models import Product, Category
-from .forms import ProductForm, CategoryForm
+from .forms import ProductForm, ProductImportForm, CategoryForm
+from .tasks import import_products
 
 
 class StaffOrAdminMixin(UserPassesTestMixin):
@@ -47,11 +60,14 @@ class CategoryDeleteView(LoginRequiredMixin, StaffOrAdminMixin, DeleteView):
     success_url = reverse_lazy("category_list")
 
 
-class ProductListView(LoginRequiredMixin, StaffOrAdminMixin, ListView):
+class ProductListView(
+    LoginRequiredMixin, StaffOrAdminMixin, KeysetPaginationMixin, ListView
+):
     model = Product
     template_name = "inventory/product_list.html"
     paginate_by = 10
-    queryset = Product.objects.filter(is_active=True)
+    keyset = ("name", "id")
+    queryset = Product.objects.filter(is_active=True).select_related("category")
 
 
 class ProductCreateView(
@@ -71,10 +87,38 @@ class ProductDeleteView(LoginRequiredMixin, StaffOrAdminMixin, View):
     def post(self, request, *args, **kwargs):
         obj = get_object_or_404(Product, pk=kwargs["pk"])
         obj.is_active = False
-        obj.save(update_fields=["is_active"])
+        obj.save(update_fields=["is_active", "updated_at"])
         messages.success(request, "Mahsulot arxivga o‘tkazildi 👍")
         return redirect("product_list")
 
     def get(self, request, *args, **kwargs):
         self.post(request, *args, **kwargs)
         return redirect("product_list")
+
+
+class ProductImportView(LoginRequiredMixin, StaffOrAdminMixin, FormView):
+    form_class = ProductImportForm
+    template_name = "inventory/product_import.html"
+
+    def form_valid(self, form):
+        options = {
+            "key": form.cleaned_data["key"],
+            "create_categories": form.cleaned_data["create_categories"],
+            "reference": f"import:{self.request.user.username}"[:40],
+        }
+        upload = form.cleaned_data["file"]
+        if form.cleaned_data["background"]:
+            path = default_storage.save(f"imports/{upload.name}", upload)
+            return hand_off(self.request, import_products, path=path, **options)
+
+        importer = ProductImporter(max_errors=200, **options)
+        # big uploads are already spooled to disk; decode them as a stream
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+        try:
+            report = importer.run(stream)
+        except (UnicodeDecodeError, ValueError) as exc:
+            form.add_error("file", str(exc))
+            return self.form_invalid(form)
+        finally:
+            stream.detach()
+        return self.render_to_response(self.get_context_data(form=form, report=report))
@@ -1,25 +1,80 @@
+from collections import defaultdict
+
 from django.contrib import admin
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.forms.models import BaseInlineFormSet
+
+from erp_project.admin_utils import CachedRelatedOnlyFieldListFilter, LargeTableAdmin
+from inventory.services import InsufficientStock
 from .models import Sale, SaleItem
 
 
+class SaleItemInlineFormSet(BaseInlineFormSet):
+    def clean(self):
+        """Refuse lines the stock cannot cover (SaleItem.save would raise)."""
+        super().clean()
+        wanted, products = defaultdict(int), {}
+        for form in self.forms:
+            data = getattr(form, "cleaned_data", None)
+            if not data or self._should_delete_form(form):
+                continue
+            if form.instance.pk:  # an edited line takes only the difference
+                wanted[form.initial["product"]] -= form.initial["quantity"]
+            product = data.get("product")
+            if product is not None and data.get("quantity"):
+                wanted[product.pk] += data["quantity"]
+                products[product.pk] = product
+        for pk, quantity in wanted.items():
+            product = products.get(pk)
+            if product and quantity > product.quantity:
+                raise ValidationError(
+                    str(InsufficientStock(pk, product.name, quantity, product.quantity))
+                )
+
+
 class SaleItemInline(admin.TabularInline):
     model = SaleItem
+    formset = SaleItemInlineFormSet
     extra = 0
     readonly_fields = ("line_total",)
+    autocomplete_fields = ("product",)
 
 
 @admin.register(Sale)
-class SaleAdmin(admin.ModelAdmin):
+class SaleAdmin(LargeTableAdmin):
     list_display = ("id", "datetime", "cashier", "total")
-    list_filter = ("cashier",)
-    date_hierarchy = "datetime"
+    list_select_related = ("cashier",)
+    # date_hierarchy would scan every sale for the years/months it offers;
+    # the date filter's choices are fixed ranges over the datetime index
+    list_filter = (
+        ("datetime", admin.DateFieldListFilter),
+        ("cashier", CachedRelatedOnlyFieldListFilter),
+    )
+    search_fields = ("=id", "cashier__username")
+    autocomplete_fields = ("cashier",)
     inlines = [SaleItemInline]
 
     # readonly total (avtomatik)
     readonly_fields = ("total",)
 
+    def delete_queryset(self, request, queryset):
+        # QuerySet.delete() skips Sale.delete() and the rollups with it
+        with transaction.atomic():
+            for sale in queryset:
+                sale.delete()
+
 
 @admin.register(SaleItem)
-class SaleItemAdmin(admin.ModelAdmin):
+class SaleItemAdmin(LargeTableAdmin):
     list_display = ("id", "sale", "product", "quantity", "price", "line_total")
-    search_fields = ("product__name",)
+    list_select_related = ("sale", "product")
+    search_fields = ("product__name", "=sale__id")
+    autocomplete_fields = ("sale", "product")
+
+    def delete_queryset(self, request, queryset):
+        # QuerySet.delete() skips SaleItem.delete(): the rollups and the
+        # sale's total
+        with transaction.atomic():
+            for item in queryset.select_related("sale", "product"):
+                item.delete()
@@ -0,0 +1,74 @@
+from django.http import Http404
+
+from erp_project.api import JsonApiView, JsonListView, make_etag
+from erp_project.pagination import ESTIMATE
+from .models import Sale, SaleItem
+
+SALE_FIELDS = {
+    "id": "id",
+    "datetime": "datetime",
+    "cashier_id": "cashier_id",
+    "cashier": "cashier__username",
+    "total": "total",
+    "updated_at": "updated_at",
+}
+
+ITEM_FIELDS = {
+    "id": "id",
+    "product_id": "product_id",
+    "product": "product__name",
+    "sku": "product__sku",
+    "quantity": "quantity",
+    "price": "price",
+    "line_total": "line_total",
+}
+
+
+class SaleApiView(JsonListView):
+    queryset = Sale.objects.all()
+    fields = SALE_FIELDS
+    filters = {
+        "cashier": "cashier_id",
+        "since": "datetime__gte",
+        "until": "datetime__lt",
+        "updated_since": "updated_at__gte",
+    }
+    keyset = ("-datetime", "-id")
+    count_mode = ESTIMATE
+    # renaming a cashier does not touch sales; their username may lag
+    # behind in cached copies until the next sale
+    tables = (Sale,)
+
+
+class SaleDetailApiView(JsonApiView):
+    """
+    One sale with its lines.
+
+    Adding, changing or removing a line re-saves the sale's total, so the
+    sale's own ``updated_at`` validates the whole document.
+    """
+
+    model = Sale
+
+    def get_validators(self):
+        self.sale = (
+            Sale.objects.filter(pk=self.kwargs["pk"])
+            .values(*SALE_FIELDS.values())
+            .first()
+        )
+        if self.sale is None:
+            raise Http404("No such sale.")
+        updated_at = self.sale["updated_at"]
+        return make_etag(self.request.path, updated_at), updated_at
+
+    def get_data(self):
+        items = (
+            SaleItem.objects.filter(sale_id=self.kwargs["pk"])
+            .order_by("pk")
+            .values(*ITEM_FIELDS.values())
+        )
+        data = {name: self.sale[path] for name, path in SALE_FIELDS.items()}
+        data["items"] = [
+            {name: item[path] for name, path in ITEM_FIELDS.items()} for item in items
+        ]
+        return data
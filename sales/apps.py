@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class SalesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "sales"
+
+    def ready(self):
+        from erp_project.api import track_deletes
+
+        # the JSON API's validators (erp_project.api.table_state)
+        track_deletes(self.get_model("Sale"))
@@ -17,6 +17,25 @@ class SaleItemForm(forms.ModelForm):
         fields = ["product", "quantity"]
 
 
+class SaleExportForm(forms.Form):
+    kind = forms.ChoiceField(
+        choices=[("sales", "Sales"), ("items", "Sale lines")], required=False
+    )
+    format = forms.ChoiceField(
+        choices=[("csv", "CSV"), ("xlsx", "XLSX")], required=False
+    )
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+
+    def clean(self):
+        data = super().clean()
+        data["kind"] = data.get("kind") or "sales"
+        data["format"] = data.get("format") or "csv"
+        if data.get("start") and data.get("end") and data["start"] > data["end"]:
+            raise forms.ValidationError("start must not be after end.")
+        return data
+
+
 SaleItemFormSet = inlineformset_factory(
     Sale,
     SaleItem,
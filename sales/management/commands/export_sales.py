@@ -0,0 +1,61 @@
+import csv
+import resource
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.exports import CHUNK_SIZE, export_rows, write_xlsx
+
+
+class Command(BaseCommand):
+    help = "Export sales or sale lines as CSV/XLSX with constant memory use"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--kind", choices=["sales", "items"], default="sales")
+        parser.add_argument("--format", choices=["csv", "xlsx"], default="csv")
+        parser.add_argument("--start", type=date.fromisoformat, help="YYYY-MM-DD")
+        parser.add_argument("--end", type=date.fromisoformat, help="YYYY-MM-DD")
+        parser.add_argument(
+            "--output", default="-", help="File to write ('-' = stdout, CSV only)"
+        )
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            "--progress",
+            type=int,
+            default=0,
+            metavar="N",
+            help="Report rows written and peak RSS to stderr every N rows",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["format"] == "xlsx" and opts["output"] == "-":
+            raise CommandError("XLSX exports need --output.")
+        if opts["start"] and opts["end"] and opts["start"] > opts["end"]:
+            raise CommandError("--start must not be after --end.")
+
+        rows = export_rows(
+            opts["kind"], opts["start"], opts["end"], chunk_size=opts["chunk_size"]
+        )
+        if opts["progress"]:
+            rows = self._report(rows, opts["progress"])
+
+        if opts["format"] == "xlsx":
+            with open(opts["output"], "wb") as fh:
+                write_xlsx(rows, fh)
+        elif opts["output"] == "-":
+            csv.writer(self.stdout).writerows(rows)
+        else:
+            with open(opts["output"], "w", newline="", encoding="utf-8") as fh:
+                csv.writer(fh).writerows(rows)
+
+    def _report(self, rows, every):
+        count = 0
+        for count, row in enumerate(rows):  # row 0 is the header
+            if count and count % every == 0:
+                self._rss(count)
+            yield row
+        self._rss(count)
+
+    def _rss(self, count):
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB
+        self.stderr.write(f"{count:,} rows, peak RSS {peak_mb:,.1f} MB")
@@ -1,35 +1,162 @@
-from django.core.management.base import BaseCommand
-from faker import Faker
-import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
 from accounts.models import User
-from inventory.models import Product
+from dashboard import rollups
+from inventory.models import Product, StockMovement
+from inventory.services import reconcile_category_counters, sync_low_stock
 from sales.models import Sale, SaleItem
-from django.utils import timezone
+from sales.seeding import generate_chunk, init_worker
 
 
 class Command(BaseCommand):
-    help = "Generate 5 000 random sales"
-
-    def handle(self, *args, **kwargs):
-        fake = Faker()
-        cashiers = list(User.objects.filter(role__in=["staff", "manager"]))
-        products = list(Product.objects.all())
-
-        count = 0
-        for _ in range(5000):
-            sale = Sale.objects.create(
-                cashier=random.choice(cashiers),
-                datetime=fake.date_time_between(
-                    start_date="-60d",
-                    end_date="now",
-                    tzinfo=timezone.get_current_timezone(),
-                ),
+    help = "Generate random sales, optionally across a pool of worker processes"
+
+    HISTORY_DAYS = 60
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sales", type=int, default=5000)
+        parser.add_argument(
+            "--workers", type=int, default=1, help="Generator processes"
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=2000, help="Sales per chunk/insert"
+        )
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, sales, workers, chunk_size, seed, **kwargs):
+        if workers < 1 or chunk_size < 1:
+            raise CommandError("--workers and --chunk-size must be positive")
+        cashiers = list(
+            User.objects.filter(role__in=["staff", "manager"]).values_list(
+                "pk", flat=True
+            )
+        )
+        products = list(
+            Product.objects.filter(is_active=True).values_list("pk", "sell_price")
+        )
+        if not cashiers or not products:
+            raise CommandError("Seed users and products first (see feed_db).")
+
+        now = timezone.now()
+        start = now - timedelta(days=self.HISTORY_DAYS)
+        span = (now - start).total_seconds()
+        base_seed = seed if seed is not None else time.time_ns()
+        tasks = [
+            (base_seed * 1_000_003 + i, min(chunk_size, sales - offset), start, span)
+            for i, offset in enumerate(range(0, sales, chunk_size))
+        ]
+        floor = Sale.objects.aggregate(last=Max("pk"))["last"] or 0
+
+        started = time.perf_counter()
+        done = rows = 0
+        for chunk in self._chunks(tasks, workers, cashiers, products):
+            rows += self._insert(chunk)
+            done += len(chunk)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"sales: {done:,}/{sales:,} ({rows / elapsed:,.0f} rows/s)"
+            )
+
+        self._settle_stock(floor)
+        self.stdout.write("rebuilding dashboard rollups…")
+        rollups.rebuild()
+        reconcile_category_counters()
+        self.stdout.write(self.style.SUCCESS(f"{done} sales created."))
+
+    def _chunks(self, tasks, workers, cashiers, products):
+        if workers == 1:
+            init_worker(cashiers, products)
+            yield from map(generate_chunk, tasks)
+            return
+        # children must not inherit the parent's open DB sockets
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker,
+            initargs=(cashiers, products),
+        ) as pool:
+            # pool.map would submit every chunk at once and buffer the
+            # results faster than the inserts drain them; keep a window
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.submit(generate_chunk, task))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    @transaction.atomic
+    def _insert(self, chunk):
+        sales = Sale.objects.bulk_create(
+            Sale(cashier_id=cashier_id, datetime=when, total=total)
+            for cashier_id, when, total, _ in chunk
+        )
+        items = SaleItem.objects.bulk_create(
+            SaleItem(
+                sale_id=sale.pk,
+                product_id=product_id,
+                quantity=qty,
+                price=price,
+                line_total=line_total,
             )
-            for _ in range(random.randint(1, 5)):
-                prod = random.choice(products)
-                qty = random.randint(1, 10)
-                SaleItem.objects.create(sale=sale, product=prod, quantity=qty)
-            sale.recalc_total()
-            count += 1
-
-        self.stdout.write(self.style.SUCCESS(f"{count} sales created."))
+            for sale, (_, _, _, lines) in zip(sales, chunk)
+            for product_id, qty, price, line_total in lines
+        )
+        return len(sales) + len(items)
+
+    @transaction.atomic
+    def _settle_stock(self, floor):
+        """
+        Take the generated sales out of stock.
+
+        Workers sell blindly, so stock is settled once at the end: the
+        movements journal what each product can actually give (oversells
+        clamp at zero) and ``Product.quantity`` is recomputed with a single
+        set-based UPDATE.
+        """
+        new_items = SaleItem.objects.filter(sale_id__gt=floor)
+        sold = dict(
+            new_items.values("product")
+            .annotate(units=Sum("quantity"))
+            .values_list("product", "units")
+        )
+        available = dict(
+            Product.objects.select_for_update()
+            .filter(pk__in=sold)
+            .values_list("pk", "quantity")
+        )
+        StockMovement.objects.bulk_create(
+            (
+                StockMovement(
+                    product_id=pk,
+                    delta=-min(units, available[pk]),
+                    reason=StockMovement.SALE,
+                    reference="seed_sales",
+                )
+                for pk, units in sold.items()
+                if min(units, available[pk])
+            ),
+            batch_size=2000,
+        )
+        units_sold = (
+            new_items.filter(product=OuterRef("pk"))
+            .values("product")
+            .annotate(units=Sum("quantity"))
+            .values("units")
+        )
+        Product.objects.filter(pk__in=sold).update(
+            quantity=Greatest(
+                F("quantity") - Coalesce(Subquery(units_sold), Value(0)), Value(0)
+            ),
+            updated_at=timezone.now(),
+        )
+        sync_low_stock(sold)
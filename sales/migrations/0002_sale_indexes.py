@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sales", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="sale",
+            index=models.Index(fields=["-datetime"], name="sale_datetime_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="sale",
+            index=models.Index(
+                fields=["cashier", "-datetime"], name="sale_cashier_datetime_idx"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="sale",
+            name="cashier",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sales", "0002_sale_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="sale",
+            index=models.Index(fields=["updated_at"], name="sale_updated_at_idx"),
+        ),
+    ]
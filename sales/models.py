@@ -1,12 +1,19 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import models, transaction
 from django.conf import settings
 from django.utils import timezone
-from inventory.models import Product
+from inventory.models import Product, StockMovement
+from inventory.services import put_stock, take_stock
+from dashboard import rollups
 from decimal import Decimal
 
 
 class Sale(models.Model):
-    cashier = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT)
+    # indexed by sale_cashier_datetime_idx below
+    cashier = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.PROTECT, db_index=False
+    )
     datetime = models.DateTimeField(default=timezone.now)
     total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -14,13 +21,55 @@ class Sale(models.Model):
 
     class Meta:
         ordering = ["-datetime"]
+        indexes = [
+            # sale list (newest first) and date-range filters
+            models.Index(fields=["-datetime"], name="sale_datetime_idx"),
+            # a cashier's sales, already in list order
+            models.Index(
+                fields=["cashier", "-datetime"], name="sale_cashier_datetime_idx"
+            ),
+            # ETag of the JSON API (MAX(updated_at))
+            models.Index(fields=["updated_at"], name="sale_updated_at_idx"),
+        ]
 
     def __str__(self):
         return f"Sale #{self.id} – {self.datetime:%Y-%m-%d %H:%M}"
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        update_fields = kwargs.get("update_fields")
+        previous = None
+        if not adding and (
+            update_fields is None or {"datetime", "cashier"} & set(update_fields)
+        ):
+            previous = (
+                Sale.objects.filter(pk=self.pk).only("datetime", "cashier").first()
+            )
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                rollups.record_sale(self)
+            elif previous and (
+                previous.cashier_id != self.cashier_id
+                or rollups.sale_day(previous) != rollups.sale_day(self)
+            ):
+                # the sale moved to another day/cashier bucket
+                lines = list(rollups.sale_lines(self))
+                rollups.record_sale(previous, sign=-1)
+                rollups.record_lines(previous, lines, sign=-1)
+                rollups.record_sale(self)
+                rollups.record_lines(self, lines)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            rollups.record_lines(self, list(rollups.sale_lines(self)), sign=-1)
+            rollups.record_sale(self, sign=-1)
+            return super().delete(*args, **kwargs)
+
     def recalc_total(self):
         self.total = sum(item.line_total for item in self.items.all())
-        self.save(update_fields=["total"])
+        self.save(update_fields=["total", "updated_at"])
 
 
 class SaleItem(models.Model):
@@ -32,6 +81,14 @@ class SaleItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def rollup_line(self):
+        return (
+            self.product_id,
+            self.product.category_id,
+            self.quantity,
+            self.line_total,
+        )
+
     def save(self, *args, **kwargs):
         # snapshot price first time
         if not self.pk:
@@ -39,12 +96,46 @@ class SaleItem(models.Model):
         self.line_total = (self.price * Decimal(self.quantity)).quantize(
             Decimal("0.01")
         )
-        super().save(*args, **kwargs)
 
-        # Decrease inventory the first time this item is created
-        if kwargs.get("force_update", False) is False and self.quantity:
-            self.product.quantity = max(0, self.product.quantity - self.quantity)
-            self.product.save(update_fields=["quantity"])
+        with transaction.atomic():
+            adding = self._state.adding
+            previous = None
+            if not adding:
+                previous = (
+                    SaleItem.objects.filter(pk=self.pk)
+                    .values_list(
+                        "product_id", "product__category_id", "quantity", "line_total"
+                    )
+                    .first()
+                )
+            super().save(*args, **kwargs)
+
+            # Take the line's stock when it is created, the difference when
+            # its quantity or product is edited
+            moved = defaultdict(int, {self.product_id: self.quantity})
+            if previous:
+                moved[previous[0]] -= previous[2]
+            reference = f"sale:{self.sale_id}"
+            returned = {pk: -units for pk, units in moved.items() if units < 0}
+            if returned:
+                put_stock(returned, reason=StockMovement.SALE, reference=reference)
+            taken = {pk: units for pk, units in moved.items() if units > 0}
+            if taken:
+                take_stock(taken, reference=reference)
+            if returned or taken:
+                self.product.refresh_from_db(fields=["quantity"])
+
+            # keep the dashboard rollups in step with this line
+            if previous:
+                rollups.record_lines(self.sale, [previous], sign=-1)
+            rollups.record_lines(self.sale, [self.rollup_line()])
+
+            # update parent total
+            self.sale.recalc_total()
 
-        # update parent total
-        self.sale.recalc_total()
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            rollups.record_lines(self.sale, [self.rollup_line()], sign=-1)
+            result = super().delete(*args, **kwargs)
+            self.sale.recalc_total()
+        return result
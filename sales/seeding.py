@@ -0,0 +1,49 @@
+"""
+Pure-Python sale generation for ``seed_sales`` workers.
+
+Nothing in here touches Django or the database, so chunks can be built in
+any process of a pool and shipped back to the parent for insertion.
+"""
+
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+CENT = Decimal("0.01")
+
+_cashiers = ()
+_products = ()
+
+
+def init_worker(cashiers, products):
+    """Pool initializer: ``cashiers`` are pks, ``products`` ``(pk, price)`` pairs."""
+    global _cashiers, _products
+    _cashiers, _products = cashiers, products
+
+
+def generate_chunk(task):
+    """
+    Build one chunk of sales.
+
+    ``task`` is ``(seed, size, start, span_seconds)``.  Returns a list of
+    ``(cashier_id, datetime, total, lines)`` where ``lines`` holds
+    ``(product_id, quantity, price, line_total)`` tuples.
+    """
+    seed, size, start, span = task
+    rng = random.Random(seed)
+    sales = []
+    for _ in range(size):
+        lines = []
+        for _ in range(rng.randint(1, 5)):
+            product_id, price = rng.choice(_products)
+            qty = rng.randint(1, 10)
+            lines.append((product_id, qty, price, (price * qty).quantize(CENT)))
+        sales.append(
+            (
+                rng.choice(_cashiers),
+                start + timedelta(seconds=rng.uniform(0, span)),
+                sum(line[3] for line in lines),
+                lines,
+            )
+        )
+    return sales
@@ -0,0 +1,75 @@
+"""
+Write paths for sales that avoid the per-line ``SaleItem.save`` cascade.
+
+``SaleItem.save`` stays for one-off edits (admin, shell); anything that
+records a whole sale should go through ``checkout``.
+"""
+
+from collections import Counter
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from dashboard import rollups
+from inventory.models import Product
+from inventory.services import take_stock
+from .models import Sale, SaleItem
+
+
+@transaction.atomic
+def checkout(cashier, lines, when=None):
+    """
+    Record one sale of ``lines`` by ``cashier`` and return it.
+
+    ``lines`` is an iterable of ``(product, quantity)`` pairs where
+    ``product`` is a ``Product`` or its pk.  All products are locked with a
+    single ``SELECT ... FOR UPDATE``, the items land in one bulk INSERT and
+    the sale total is written once, so the query count only grows by one
+    stock UPDATE (plus rollup bump) per distinct product.
+
+    Raises ``InsufficientStock`` (and records nothing) if any product would
+    go below zero.
+    """
+    lines = [(getattr(product, "pk", product), qty) for product, qty in lines]
+    wanted = Counter()
+    for product_id, qty in lines:
+        wanted[product_id] += qty
+
+    products = Product.objects.select_for_update().in_bulk(list(wanted))
+    missing = set(wanted) - set(products)
+    if missing:
+        raise Product.DoesNotExist(f"Unknown product id(s): {sorted(missing)}")
+
+    items = []
+    for product_id, qty in lines:
+        product = products[product_id]
+        price = product.sell_price
+        items.append(
+            SaleItem(
+                product=product,
+                quantity=qty,
+                price=price,
+                line_total=(price * Decimal(qty)).quantize(Decimal("0.01")),
+            )
+        )
+
+    sale = Sale(
+        cashier=cashier,
+        datetime=when or timezone.now(),
+        total=sum((item.line_total for item in items), Decimal("0.00")),
+    )
+    sale.save()
+    for item in items:
+        item.sale = sale
+    SaleItem.objects.bulk_create(items)
+
+    take_stock(wanted, reference=f"sale:{sale.pk}")
+    rollups.record_lines(
+        sale,
+        [
+            (item.product_id, item.product.category_id, item.quantity, item.line_total)
+            for item in items
+        ],
+    )
+    return sale
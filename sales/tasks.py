@@ -0,0 +1,41 @@
+import io
+import tempfile
+from datetime import date
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+
+from tasks.queue import PermanentFailure, register
+from .exports import csv_chunks, export_filename, export_rows, write_xlsx
+
+
+@register
+def export_sales(kind="sales", format="csv", start=None, end=None):
+    """Write an export to ``exports/`` in the default storage."""
+    start = date.fromisoformat(start) if start else None
+    end = date.fromisoformat(end) if end else None
+    rows = export_rows(kind, start, end)
+    with tempfile.TemporaryFile() as output:
+        if format == "csv":
+            text = io.TextIOWrapper(output, encoding="utf-8", newline="")
+            text.writelines(csv_chunks(rows))
+            text.flush()
+            text.detach()
+        else:
+            write_xlsx(rows, output)
+        output.seek(0)
+        name = default_storage.save(
+            f"exports/{export_filename(kind, format, start, end)}", File(output)
+        )
+    return {"file": name}
+
+
+@register
+def seed_sales(sales=1000, workers=1, seed=None):
+    out = io.StringIO()
+    try:
+        call_command("seed_sales", sales=sales, workers=workers, seed=seed, stdout=out)
+    except CommandError as exc:
+        raise PermanentFailure(str(exc))
+    return {"output": out.getvalue().strip().splitlines()[-1]}
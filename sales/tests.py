@@ -1,9 +1,29 @@
+import csv
+import tempfile
 from decimal import Decimal
-from django.test import TestCase
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+
+from openpyxl import load_workbook
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.urls import reverse
 from django.utils import timezone
 from inventory.models import Category, Product
+from inventory.services import InsufficientStock, ledger_drift
+from dashboard.models import DailySalesRollup
+from erp_project.testing import QueryPlanMixin
 from sales.models import Sale, SaleItem
+from sales.services import checkout
+from tasks.models import Task
+from tasks.queue import claim, run
 
 User = get_user_model()
 
@@ -83,15 +103,38 @@ class SaleAndSaleItemModelTests(TestCase):
         expected_total = item1.line_total + item2.line_total
         self.assertEqual(sale.total, expected_total)
 
-    def test_saleitem_update_does_not_decrease_quantity(self):
+    def test_saleitem_update_takes_only_the_difference(self):
         sale = Sale.objects.create(cashier=self.user)
         item = SaleItem.objects.create(sale=sale, product=self.product1, quantity=5)
-        qty_after_first = self.product1.quantity
-        # Now update the item, should not reduce product again
         item.quantity = 10
         item.save(force_update=True)
         self.product1.refresh_from_db()
-        self.assertEqual(self.product1.quantity, qty_after_first)
+        self.assertEqual(self.product1.quantity, 40)
+        item.quantity = 2
+        item.save(force_update=True)
+        self.product1.refresh_from_db()
+        self.assertEqual(self.product1.quantity, 48)
+        self.assertFalse(ledger_drift().exists())
+
+    def test_saleitem_product_change_moves_stock(self):
+        sale = Sale.objects.create(cashier=self.user)
+        item = SaleItem.objects.create(sale=sale, product=self.product1, quantity=5)
+        item.product = self.product2
+        item.save(force_update=True)
+        self.product1.refresh_from_db()
+        self.product2.refresh_from_db()
+        self.assertEqual((self.product1.quantity, self.product2.quantity), (50, 95))
+        self.assertFalse(ledger_drift().exists())
+
+    def test_saleitem_update_cannot_oversell(self):
+        sale = Sale.objects.create(cashier=self.user)
+        item = SaleItem.objects.create(sale=sale, product=self.product1, quantity=5)
+        item.quantity = 60
+        with self.assertRaises(InsufficientStock):
+            item.save(force_update=True)
+        self.product1.refresh_from_db()
+        self.assertEqual(self.product1.quantity, 45)
+        self.assertEqual(SaleItem.objects.get().quantity, 5)
 
     def test_saleitem_line_total_always_updated(self):
         sale = Sale.objects.create(cashier=self.user)
@@ -109,9 +152,11 @@ class SaleAndSaleItemModelTests(TestCase):
         sale = Sale.objects.create(cashier=self.user)
         self.product1.quantity = 3
         self.product1.save()
-        item = SaleItem.objects.create(sale=sale, product=self.product1, quantity=10)
+        with self.assertRaises(InsufficientStock):
+            SaleItem.objects.create(sale=sale, product=self.product1, quantity=10)
         self.product1.refresh_from_db()
-        self.assertEqual(self.product1.quantity, 0)
+        self.assertEqual(self.product1.quantity, 3)
+        self.assertFalse(sale.items.exists())
 
     def test_product_quantity_update_field_only(self):
         sale = Sale.objects.create(cashier=self.user)
@@ -126,3 +171,483 @@ class SaleAndSaleItemModelTests(TestCase):
         self.assertIsNotNone(sale.updated_at)
         self.assertIsNotNone(item.created_at)
         self.assertIsNotNone(item.updated_at)
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.cat = Category.objects.create(name="Snacks")
+        self.products = [
+            Product.objects.create(
+                category=self.cat,
+                name=f"Item {i}",
+                sku=f"ITEM{i}",
+                cost_price=Decimal("1.00"),
+                sell_price=Decimal("2.50"),
+                quantity=50,
+            )
+            for i in range(5)
+        ]
+        self.user = User.objects.create_user(username="cashier1", password="pass")
+
+    def test_checkout_writes_items_total_and_stock(self):
+        chips, candy = self.products[:2]
+        sale = checkout(self.user, [(chips, 2), (candy.pk, 3), (chips, 1)])
+        sale.refresh_from_db()
+        self.assertEqual(sale.items.count(), 3)
+        self.assertEqual(sale.total, Decimal("15.00"))
+        chips.refresh_from_db()
+        candy.refresh_from_db()
+        self.assertEqual(chips.quantity, 47)
+        self.assertEqual(candy.quantity, 47)
+        item = sale.items.filter(product=candy).get()
+        self.assertEqual(item.price, Decimal("2.50"))
+        self.assertEqual(item.line_total, Decimal("7.50"))
+
+    def test_checkout_rejects_unknown_product(self):
+        with self.assertRaises(Product.DoesNotExist):
+            checkout(self.user, [(self.products[0], 1), (999999, 1)])
+        self.assertFalse(Sale.objects.exists())
+
+    def test_checkout_query_count_does_not_scale_per_line_cascade(self):
+        # warm up the rollup rows so both runs hit the steady state
+        checkout(self.user, [(p, 1) for p in self.products])
+        with CaptureQueriesContext(connection) as one_line:
+            checkout(self.user, [(self.products[0], 1)])
+        with CaptureQueriesContext(connection) as five_lines:
+            checkout(self.user, [(p, 1) for p in self.products])
+        # one stock UPDATE and one product rollup UPDATE per extra product
+        self.assertEqual(len(five_lines) - len(one_line), 2 * 4)
+
+    def test_checkout_oversell_records_nothing(self):
+        chips, candy = self.products[:2]
+        with self.assertRaises(InsufficientStock) as ctx:
+            checkout(self.user, [(chips, 5), (candy, 51)])
+        self.assertEqual(ctx.exception.available, 50)
+        self.assertFalse(Sale.objects.exists())
+        chips.refresh_from_db()
+        self.assertEqual(chips.quantity, 50)
+
+    def test_sale_create_view_reports_insufficient_stock(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse("sale_create"),
+            {
+                "cashier": self.user.pk,
+                "datetime": "2025-05-01 10:00:00",
+                "items-TOTAL_FORMS": "1",
+                "items-INITIAL_FORMS": "0",
+                "items-MIN_NUM_FORMS": "1",
+                "items-MAX_NUM_FORMS": "1000",
+                "items-0-product": self.products[0].pk,
+                "items-0-quantity": "60",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Not enough stock", response.content.decode())
+        self.assertFalse(Sale.objects.exists())
+
+    def test_sale_admin_reports_insufficient_stock(self):
+        admin_user = User.objects.create_superuser(username="boss", password="pass")
+        self.client.force_login(admin_user)
+        response = self.client.post(
+            reverse("admin:sales_sale_add"),
+            {
+                "cashier": self.user.pk,
+                "datetime_0": "2025-05-01",
+                "datetime_1": "10:00:00",
+                "items-TOTAL_FORMS": "2",
+                "items-INITIAL_FORMS": "0",
+                "items-MIN_NUM_FORMS": "0",
+                "items-MAX_NUM_FORMS": "1000",
+                "items-0-product": self.products[0].pk,
+                "items-0-quantity": "30",
+                "items-0-price": "2.50",
+                "items-1-product": self.products[0].pk,
+                "items-1-quantity": "30",
+                "items-1-price": "2.50",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Not enough stock", response.content.decode())
+        self.assertFalse(Sale.objects.exists())
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].quantity, 50)
+
+    def test_sale_admin_edits_take_the_difference(self):
+        admin_user = User.objects.create_superuser(username="boss", password="pass")
+        self.client.force_login(admin_user)
+        sale = checkout(self.user, [(self.products[0], 30)])
+        item = sale.items.get()
+
+        def edit(quantity):
+            return self.client.post(
+                reverse("admin:sales_sale_change", args=[sale.pk]),
+                {
+                    "cashier": self.user.pk,
+                    "datetime_0": "2025-05-01",
+                    "datetime_1": "10:00:00",
+                    "items-TOTAL_FORMS": "1",
+                    "items-INITIAL_FORMS": "1",
+                    "items-MIN_NUM_FORMS": "0",
+                    "items-MAX_NUM_FORMS": "1000",
+                    "items-0-id": item.pk,
+                    "items-0-sale": sale.pk,
+                    "items-0-product": self.products[0].pk,
+                    "items-0-quantity": str(quantity),
+                    "items-0-price": "2.50",
+                },
+            )
+
+        self.assertIn("Not enough stock", edit(60).content.decode())
+        self.assertEqual(edit(45).status_code, 302)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].quantity, 5)
+        self.assertFalse(ledger_drift().exists())
+
+    def test_sale_create_view_uses_checkout(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse("sale_create"),
+            {
+                "cashier": self.user.pk,
+                "datetime": "2025-05-01 10:00:00",
+                "items-TOTAL_FORMS": "2",
+                "items-INITIAL_FORMS": "0",
+                "items-MIN_NUM_FORMS": "1",
+                "items-MAX_NUM_FORMS": "1000",
+                "items-0-product": self.products[0].pk,
+                "items-0-quantity": "4",
+                "items-1-product": self.products[1].pk,
+                "items-1-quantity": "2",
+            },
+        )
+        self.assertRedirects(response, reverse("sale_list"))
+        sale = Sale.objects.get()
+        self.assertEqual(sale.total, Decimal("15.00"))
+        self.assertEqual(sale.items.count(), 2)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].quantity, 46)
+
+
+class SaleListPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="cashier", password="pass")
+        now = timezone.now()
+        Sale.objects.bulk_create(
+            Sale(cashier=self.user, datetime=now - timezone.timedelta(minutes=i))
+            for i in range(30)
+        )
+        self.client.force_login(self.user)
+
+    def test_cursor_links_walk_the_list(self):
+        response = self.client.get(reverse("sale_list"))
+        first = response.context["sales"]
+        self.assertEqual(len(first), 25)
+        page = response.context["page_obj"]
+        self.assertContains(response, "?cursor=")
+
+        response = self.client.get(reverse("sale_list"), {"cursor": page.next_cursor})
+        rest = response.context["sales"]
+        self.assertEqual(len(rest), 5)
+        self.assertEqual(response.context["page_obj"].start_index(), 26)
+        self.assertEqual(
+            [s.pk for s in first] + [s.pk for s in rest],
+            list(Sale.objects.values_list("pk", flat=True)),
+        )
+
+    def test_bad_cursor_is_404(self):
+        response = self.client.get(reverse("sale_list"), {"cursor": "nope"})
+        self.assertEqual(response.status_code, 404)
+
+
+class SaleIndexTests(QueryPlanMixin, TestCase):
+    def setUp(self):
+        self.cashier = User.objects.create_user(username="cashier", password="pass")
+
+    def test_recent_sales_use_datetime_index(self):
+        since = timezone.now() - timezone.timedelta(days=30)
+        self.assertUsesIndex(
+            Sale.objects.filter(datetime__gte=since), "sale_datetime_idx"
+        )
+
+    def test_sale_list_is_read_in_index_order(self):
+        self.assertUsesIndex(Sale.objects.all()[:25], "sale_datetime_idx")
+
+    def test_cashier_history_uses_composite_index(self):
+        self.assertUsesIndex(
+            Sale.objects.filter(cashier=self.cashier)[:25],
+            "sale_cashier_datetime_idx",
+        )
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    THREADS = 8
+    SALES_PER_THREAD = 10
+
+    def setUp(self):
+        cat = Category.objects.create(name="Hot")
+        self.product = Product.objects.create(
+            category=cat,
+            name="Bestseller",
+            sku="BEST",
+            cost_price=Decimal("1.00"),
+            sell_price=Decimal("2.00"),
+            quantity=60,
+        )
+        self.user = User.objects.create_user(username="rush", password="pass")
+
+    def sell(self, results):
+        try:
+            for _ in range(self.SALES_PER_THREAD):
+                while True:
+                    try:
+                        checkout(self.user, [(self.product.pk, 1)])
+                        results.append("sold")
+                    except InsufficientStock:
+                        results.append("refused")
+                    except OperationalError:
+                        # SQLite "database table is locked": back off, retry
+                        time.sleep(0.005)
+                        continue
+                    break
+        finally:
+            connection.close()
+
+    def test_concurrent_sales_never_lose_updates_or_oversell(self):
+        results = []
+        threads = [
+            threading.Thread(target=self.sell, args=(results,))
+            for _ in range(self.THREADS)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        sold = results.count("sold")
+        self.assertEqual(len(results), self.THREADS * self.SALES_PER_THREAD)
+        self.assertEqual(sold, 60)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 0)
+        self.assertEqual(SaleItem.objects.filter(product=self.product).count(), sold)
+
+
+class SeedSalesCommandTests(TestCase):
+    def setUp(self):
+        cat = Category.objects.create(name="Bulk")
+        self.products = [
+            Product.objects.create(
+                category=cat,
+                name=f"Bulk {i}",
+                sku=f"BULK{i}",
+                cost_price=Decimal("1.00"),
+                sell_price=Decimal("3.00"),
+                quantity=40,
+            )
+            for i in range(3)
+        ]
+        User.objects.create_user(username="seeder", password="pass")
+
+    def test_parallel_seed_is_consistent(self):
+        call_command(
+            "seed_sales",
+            sales=90,
+            workers=2,
+            chunk_size=20,
+            seed=5,
+            stdout=StringIO(),
+        )
+        self.assertEqual(Sale.objects.count(), 90)
+        for sale in Sale.objects.prefetch_related("items")[:10]:
+            self.assertEqual(sale.total, sum(i.line_total for i in sale.items.all()))
+        # 90 sales of 1-10 units x 1-5 lines oversell 120 units of stock
+        self.assertFalse(Product.objects.exclude(quantity=0).exists())
+        self.assertFalse(ledger_drift().exists())
+        self.assertEqual(
+            DailySalesRollup.objects.aggregate(n=Sum("sales_count"))["n"], 90
+        )
+
+    def test_parallel_seed_bounds_the_chunks_in_flight(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        from sales.management.commands import seed_sales
+
+        submitted, ahead = [], []
+
+        class Pool(ThreadPoolExecutor):
+            def submit(self, fn, *args):
+                submitted.append(args)
+                return super().submit(fn, *args)
+
+        insert = seed_sales.Command._insert
+
+        def counting_insert(command, chunk):
+            ahead.append(len(submitted) - len(ahead))
+            return insert(command, chunk)
+
+        with mock.patch.object(
+            seed_sales, "ProcessPoolExecutor", Pool
+        ), mock.patch.object(seed_sales.Command, "_insert", counting_insert):
+            call_command(
+                "seed_sales",
+                sales=90,
+                workers=2,
+                chunk_size=10,
+                seed=5,
+                stdout=StringIO(),
+            )
+        self.assertEqual(len(submitted), 9)
+        self.assertEqual(max(ahead), 4)
+        self.assertEqual(Sale.objects.count(), 90)
+
+
+class SaleExportTests(TestCase):
+    def setUp(self):
+        cat = Category.objects.create(name="Snacks")
+        self.chips = Product.objects.create(
+            category=cat,
+            name="Chips",
+            sku="CHIPS",
+            cost_price=Decimal("1.00"),
+            sell_price=Decimal("2.50"),
+            quantity=100,
+        )
+        self.manager = User.objects.create_user(
+            username="boss", password="pass", role="manager"
+        )
+        today = timezone.localdate()
+        for days_ago in (0, 1, 5):
+            when = timezone.make_aware(
+                timezone.datetime.combine(
+                    today - timezone.timedelta(days=days_ago),
+                    timezone.datetime.min.time(),
+                )
+            ) + timezone.timedelta(hours=12)
+            checkout(self.manager, [(self.chips, 1), (self.chips, 2)], when=when)
+        self.client.force_login(self.manager)
+
+    def get(self, **params):
+        return self.client.get(reverse("sale_export"), params)
+
+    def csv_rows(self, response):
+        body = b"".join(response.streaming_content).decode()
+        return list(csv.reader(StringIO(body)))
+
+    def test_csv_streams_sales_in_range(self):
+        start = timezone.localdate() - timezone.timedelta(days=1)
+        response = self.get(start=start.isoformat())
+        self.assertTrue(response.streaming)
+        self.assertIn("attachment;", response["Content-Disposition"])
+        rows = self.csv_rows(response)
+        self.assertEqual(rows[0], ["sale_id", "datetime", "cashier", "total"])
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({r[3] for r in rows[1:]}, {"7.50"})
+
+    def test_csv_lines(self):
+        rows = self.csv_rows(self.get(kind="items"))
+        self.assertEqual(len(rows), 1 + 6)
+        self.assertEqual(rows[1][3:6], ["CHIPS", "Chips", "Snacks"])
+
+    def test_xlsx(self):
+        response = self.get(format="xlsx", end=timezone.localdate().isoformat())
+        workbook = load_workbook(BytesIO(b"".join(response.streaming_content)))
+        rows = list(workbook.active.values)
+        self.assertEqual(len(rows), 4)
+        self.assertIsNone(rows[1][1].tzinfo)
+
+    def test_xlsx_rolls_over_to_new_sheets(self):
+        with mock.patch(
+            "sales.exports.XLSX_MAX_ROWS", 3
+        ), tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/lines.xlsx"
+            call_command("export_sales", kind="items", format="xlsx", output=path)
+            workbook = load_workbook(path)
+        self.assertEqual(len(workbook.worksheets), 3)
+        self.assertEqual(sum(ws.max_row - 1 for ws in workbook.worksheets), 6)
+
+    def test_bad_filters_and_permissions(self):
+        self.assertEqual(
+            self.get(start="2025-02-01", end="2025-01-01").status_code, 400
+        )
+        self.assertEqual(self.get(kind="users").status_code, 400)
+        clerk = User.objects.create_user(username="clerk", password="p", role="staff")
+        self.client.force_login(clerk)
+        self.assertEqual(self.get().status_code, 403)
+
+    def test_command_writes_csv(self):
+        out, err = StringIO(), StringIO()
+        call_command("export_sales", progress=1, stdout=out, stderr=err)
+        self.assertEqual(len(list(csv.reader(StringIO(out.getvalue())))), 4)
+        self.assertIn("3 rows, peak RSS", err.getvalue())
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_post_queues_a_background_export(self):
+        start = timezone.localdate() - timezone.timedelta(days=1)
+        response = self.client.post(
+            reverse("sale_export"), {"kind": "items", "start": start.isoformat()}
+        )
+        task = Task.objects.get()
+        self.assertRedirects(response, task.get_absolute_url())
+        self.assertEqual(task.kwargs["start"], start.isoformat())
+
+        run(claim("test")[0])
+        task.refresh_from_db()
+        self.assertEqual(task.result["file"], f"exports/items-{start}.csv")
+        download = self.client.get(reverse("task_download", args=[task.pk]))
+        body = b"".join(download.streaming_content).decode()
+        self.assertEqual(len(list(csv.reader(StringIO(body)))), 1 + 4)
+
+
+class SaleApiTests(TestCase):
+    def setUp(self):
+        cat = Category.objects.create(name="Snacks")
+        self.chips = Product.objects.create(
+            category=cat,
+            name="Chips",
+            sku="CHIPS",
+            cost_price=Decimal("1.00"),
+            sell_price=Decimal("2.50"),
+            quantity=100,
+        )
+        self.cashier = User.objects.create_user(
+            username="till1", password="pass", role="staff"
+        )
+        now = timezone.now()
+        self.sales = [
+            checkout(
+                self.cashier, [(self.chips, 1)], when=now - timezone.timedelta(days=d)
+            )
+            for d in (3, 2, 1)
+        ]
+        self.client.force_login(self.cashier)
+
+    def test_lists_newest_first_with_date_filter(self):
+        since = (timezone.now() - timezone.timedelta(days=2, hours=1)).isoformat()
+        data = self.client.get(
+            reverse("api_sales"), {"since": since, "fields": "id,cashier,total"}
+        ).json()
+        self.assertEqual(
+            data["results"],
+            [
+                {"id": sale.pk, "cashier": "till1", "total": "2.50"}
+                for sale in self.sales[:0:-1]
+            ],
+        )
+
+    def test_detail_is_revalidated_by_sale_updated_at(self):
+        sale = self.sales[0]
+        url = reverse("api_sale_detail", args=[sale.pk])
+        first = self.client.get(url)
+        self.assertEqual(first.json()["items"][0]["sku"], "CHIPS")
+
+        with self.assertNumQueries(3):  # session, user, sale
+            again = self.client.get(url, headers={"If-None-Match": first["ETag"]})
+        self.assertEqual(again.status_code, 304)
+
+        SaleItem.objects.create(sale=sale, product=self.chips, quantity=2)
+        fresh = self.client.get(url, headers={"If-None-Match": first["ETag"]})
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(fresh.json()["total"], "7.50")
+        self.assertEqual(
+            self.client.get(reverse("api_sale_detail", args=[0])).status_code, 404
+        )
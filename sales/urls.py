@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import SaleListView, SaleCreateView, SaleDetailView
+from .views import SaleListView, SaleCreateView, SaleDetailView, SaleExportView
 
 urlpatterns = [
     path("", SaleListView.as_view(), name="sale_list"),
     path("new/", SaleCreateView.as_view(), name="sale_create"),
     path("<int:pk>/", SaleDetailView.as_view(), name="sale_detail"),
+    path("export/", SaleExportView.as_view(), name="sale_export"),
 ]
@@ -1,19 +1,40 @@
-from django.contrib.auth.mixins import LoginRequiredMixin
+import tempfile
+
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.http import (
+    FileResponse,
+    HttpResponseBadRequest,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
 from django.urls import reverse_lazy
-from django.views.generic import ListView, CreateView, DetailView
-from .models import Sale
-from .forms import SaleForm, SaleItemFormSet
+from django.db.models import Prefetch
+from django.views.generic import ListView, CreateView, DetailView, View
+from erp_project.pagination import ESTIMATE, KeysetPaginationMixin
+from inventory.services import InsufficientStock
+from tasks.views import hand_off
+from .models import Sale, SaleItem
+from .exports import csv_chunks, export_filename, export_rows, write_xlsx
+from .forms import SaleExportForm, SaleForm, SaleItemFormSet
+from .services import checkout
+from .tasks import export_sales
 
 
-class SaleListView(LoginRequiredMixin, ListView):
+class SaleListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Sale
+    queryset = Sale.objects.select_related("cashier")
     template_name = "sales/sale_list.html"
     context_object_name = "sales"
     paginate_by = 25
+    keyset = ("-datetime", "-id")
+    count_mode = ESTIMATE  # COUNT(*) over every sale is the slow part
 
 
 class SaleDetailView(LoginRequiredMixin, DetailView):
     model = Sale
+    queryset = Sale.objects.select_related("cashier").prefetch_related(
+        Prefetch("items", queryset=SaleItem.objects.select_related("product"))
+    )
     template_name = "sales/sale_detail.html"
 
 
@@ -44,9 +65,72 @@ class SaleCreateView(LoginRequiredMixin, CreateView):
         context = self.get_context_data()
         items = context["items"]
         if items.is_valid():
-            self.object = form.save()
-            items.instance = self.object
-            items.save()
-            return super().form_valid(form)
+            lines = [
+                (item.cleaned_data["product"], item.cleaned_data["quantity"])
+                for item in items.forms
+                if item.cleaned_data
+            ]
+            try:
+                self.object = checkout(
+                    form.cleaned_data["cashier"],
+                    lines,
+                    when=form.cleaned_data["datetime"],
+                )
+            except InsufficientStock as exc:
+                form.add_error(None, str(exc))
+                return self.form_invalid(form)
+            return HttpResponseRedirect(self.get_success_url())
         else:
             return self.form_invalid(form)
+
+
+class SaleExportView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """
+    ``?kind=sales|items&format=csv|xlsx&start=YYYY-MM-DD&end=YYYY-MM-DD``;
+    GET streams the file, POST queues it as a background task.
+    """
+
+    XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+    def test_func(self):
+        user = self.request.user
+        return user.is_superuser or user.role in ("admin", "manager")
+
+    def get(self, request):
+        form = SaleExportForm(request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest(form.errors.as_text())
+        opts = form.cleaned_data
+        rows = export_rows(opts["kind"], opts["start"], opts["end"])
+        filename = export_filename(
+            opts["kind"], opts["format"], opts["start"], opts["end"]
+        )
+
+        if opts["format"] == "csv":
+            response = StreamingHttpResponse(
+                csv_chunks(rows), content_type="text/csv; charset=utf-8"
+            )
+        else:
+            # a zip can't be written front to back; build it in a temp file
+            # (write-only mode keeps memory flat) and stream that
+            workbook = tempfile.TemporaryFile()
+            write_xlsx(rows, workbook)
+            workbook.seek(0)
+            response = FileResponse(workbook, content_type=self.XLSX)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    def post(self, request):
+        """The same export written to a file by a background worker."""
+        form = SaleExportForm(request.POST)
+        if not form.is_valid():
+            return HttpResponseBadRequest(form.errors.as_text())
+        opts = form.cleaned_data
+        return hand_off(
+            request,
+            export_sales,
+            kind=opts["kind"],
+            format=opts["format"],
+            start=opts["start"],
+            end=opts["end"],
+        )
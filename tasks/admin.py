@@ -0,0 +1,34 @@
+from django.contrib import admin
+from django.db.models import F
+from django.utils import timezone
+
+from erp_project.admin_utils import CachedValuesFieldListFilter
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "name",
+        "status",
+        "attempts",
+        "created_at",
+        "finished_at",
+        "locked_by",
+    )
+    list_filter = ("status", ("name", CachedValuesFieldListFilter))
+    search_fields = ("name", "locked_by")
+    raw_id_fields = ("created_by",)
+    date_hierarchy = "created_at"
+    actions = ["retry"]
+
+    @admin.action(description="Queue selected failed tasks again")
+    def retry(self, request, queryset):
+        queued = queryset.filter(status=Task.FAILED).update(
+            status=Task.QUEUED,
+            run_after=timezone.now(),
+            max_attempts=F("attempts") + 1,
+            finished_at=None,
+        )
+        self.message_user(request, f"{queued} task(s) queued again.")
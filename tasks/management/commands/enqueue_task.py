@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.queue import REGISTRY, enqueue
+
+
+class Command(BaseCommand):
+    help = (
+        "Queue a registered background task, e.g. "
+        "enqueue_task sales.seed_sales sales=100000"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", nargs="?", help="Task name; omit to list them.")
+        parser.add_argument(
+            "kwargs",
+            nargs="*",
+            metavar="key=value",
+            help="Task arguments; values are parsed as JSON where possible.",
+        )
+
+    def handle(self, *args, name, kwargs, **options):
+        if not name:
+            for registered in sorted(REGISTRY):
+                self.stdout.write(registered)
+            return
+        parsed = {}
+        for pair in kwargs:
+            key, sep, raw = pair.partition("=")
+            if not sep:
+                raise CommandError(f"Expected key=value, got {pair!r}")
+            try:
+                parsed[key] = json.loads(raw)
+            except ValueError:
+                parsed[key] = raw
+        try:
+            task = enqueue(name, **parsed)
+        except KeyError as exc:
+            raise CommandError(exc.args[0])
+        self.stdout.write(self.style.SUCCESS(f"Queued {task}."))
@@ -0,0 +1,45 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from tasks.worker import Worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks (tasks app) until stopped"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Tasks run in parallel (one thread and connection each).",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait before polling an empty queue again.",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once the queue is empty instead of waiting for work.",
+        )
+
+    def handle(self, *args, concurrency, poll_interval, burst, **kwargs):
+        worker = Worker(concurrency, poll_interval, burst)
+
+        def stop(signum, frame):
+            self.stdout.write("stopping after the running tasks…")
+            worker.stop()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+        if not burst:
+            self.stdout.write(
+                f"worker {worker.name}: {concurrency} thread(s), "
+                f"polling every {poll_interval}s"
+            )
+        processed = worker.run()
+        self.stdout.write(self.style.SUCCESS(f"{processed} task(s) processed."))
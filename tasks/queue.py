@@ -0,0 +1,157 @@
+"""
+A task queue kept in the database, so background work needs no broker.
+
+Apps register functions with ``@register`` in their ``tasks.py``; views and
+commands ``enqueue()`` a call (keyword arguments only, JSON-serializable)
+and return at once, and ``run_worker`` processes execute it.  Workers
+``claim()`` ready rows with ``SELECT ... FOR UPDATE SKIP LOCKED`` and mark
+them with a conditional ``UPDATE``, so any number of workers can poll the
+same table without running a task twice (on SQLite, which has no row
+locks, the conditional ``UPDATE`` alone decides).
+
+A task that raises is retried with exponential backoff until
+``max_attempts``; ``PermanentFailure`` fails it at once.  Workers
+``renew()`` the lease of their running tasks every ``TASK_LEASE / 3``
+seconds; one that dies mid-task keeps its lease for ``TASK_LEASE``
+seconds, after which the task is claimed again.  Tasks should therefore be
+safe to re-run.
+"""
+
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+
+
+class PermanentFailure(Exception):
+    """Raised by a task whose input can never succeed; it is not retried."""
+
+
+def register(func):
+    """Make ``func`` runnable by workers as ``"<app>.<function name>"``."""
+    func.task_name = f"{func.__module__.split('.')[0]}.{func.__name__}"
+    REGISTRY[func.task_name] = func
+    return func
+
+
+def enqueue(func, user=None, max_attempts=3, delay=0, **kwargs):
+    """
+    Queue a call of ``func`` (a registered function or its name) with
+    ``kwargs`` and return the ``Task``.  Inside a transaction the task only
+    becomes visible to workers once it commits.
+    """
+    name = getattr(func, "task_name", func)
+    if name not in REGISTRY:
+        raise KeyError(f"Unknown task: {name!r}")
+    return Task.objects.create(
+        name=name,
+        kwargs=kwargs,
+        created_by=user,
+        max_attempts=max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def claim(worker, limit=1):
+    """Take up to ``limit`` ready tasks for ``worker``; returns them."""
+    now = timezone.now()
+    expired = now - timedelta(seconds=settings.TASK_LEASE)
+    lost = Q(status=Task.RUNNING, locked_at__lt=expired)
+    # a lost task with no attempts left is not handed out again
+    Task.objects.filter(lost, attempts__gte=F("max_attempts")).update(
+        status=Task.FAILED,
+        error="Worker lost the task and no attempts are left.",
+        finished_at=now,
+        updated_at=now,
+    )
+
+    claimed = []
+    with transaction.atomic():
+        candidates = (
+            Task.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=Task.QUEUED, run_after__lte=now) | lost)
+            .order_by("run_after", "id")
+            .values_list("pk", "status", "locked_at")[:limit]
+        )
+        for pk, status, locked_at in candidates:
+            taken = Task.objects.filter(
+                pk=pk, status=status, locked_at=locked_at
+            ).update(
+                status=Task.RUNNING,
+                locked_by=worker,
+                locked_at=now,
+                started_at=now,
+                attempts=F("attempts") + 1,
+                updated_at=now,
+            )
+            if taken:
+                claimed.append(pk)
+    return list(Task.objects.filter(pk__in=claimed).order_by("run_after", "id"))
+
+
+def _owned(task):
+    return Task.objects.filter(
+        pk=task.pk, status=Task.RUNNING, locked_by=task.locked_by
+    )
+
+
+def renew(task):
+    """Extend the lease of a running ``task``; false once it is not ours."""
+    now = timezone.now()
+    return bool(_owned(task).update(locked_at=now, updated_at=now))
+
+
+def _finish(task, **changes):
+    """Write ``changes`` unless another worker has taken the task over."""
+    now = timezone.now()
+    changes.setdefault("finished_at", now)
+    finished = _owned(task).update(locked_at=None, updated_at=now, **changes)
+    if not finished:
+        logger.warning(
+            "Task %s was taken over by another worker; its outcome (%s) is " "dropped",
+            task,
+            changes["status"],
+        )
+    return finished
+
+
+def ack(task, result=None):
+    return _finish(task, status=Task.DONE, result=result, error="")
+
+
+def fail(task, error, retry=True):
+    if retry and task.attempts < task.max_attempts:
+        delay = settings.TASK_RETRY_DELAY * 2 ** (task.attempts - 1)
+        return _finish(
+            task,
+            status=Task.QUEUED,
+            run_after=timezone.now() + timedelta(seconds=delay),
+            error=error,
+            finished_at=None,
+        )
+    return _finish(task, status=Task.FAILED, error=error)
+
+
+def run(task):
+    """Execute a claimed task and record its outcome."""
+    func = REGISTRY.get(task.name)
+    if func is None:
+        return fail(task, f"Unknown task: {task.name!r}", retry=False)
+    try:
+        result = func(**task.kwargs)
+    except PermanentFailure as exc:
+        return fail(task, str(exc), retry=False)
+    except Exception:
+        logger.exception("Task %s failed (attempt %s)", task, task.attempts)
+        return fail(task, traceback.format_exc())
+    return ack(task, result)
@@ -0,0 +1,188 @@
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Task
+from .queue import PermanentFailure, claim, enqueue, register, run
+
+User = get_user_model()
+
+calls = []
+
+
+@register
+def record(value):
+    calls.append(value)
+    return {"value": value}
+
+
+@register
+def explode():
+    raise RuntimeError("boom")
+
+
+@register
+def reject():
+    raise PermanentFailure("bad input")
+
+
+@register
+def outlive_lease():
+    time.sleep(0.6)
+    return {"claimed": [task.pk for task in claim("intruder")]}
+
+
+@override_settings(TASK_RETRY_DELAY=60, TASK_LEASE=600)
+class QueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_claim_run_ack(self):
+        task = enqueue(record, value=7)
+        self.assertEqual(task.name, "tasks.record")
+        [claimed] = claim("w1")
+        self.assertEqual(claim("w2"), [])  # handed out once
+
+        run(claimed)
+        task.refresh_from_db()
+        self.assertEqual(
+            (task.status, task.result, task.attempts), ("done", {"value": 7}, 1)
+        )
+        self.assertEqual(calls, [7])
+        self.assertIsNotNone(task.finished_at)
+
+    def test_unknown_and_delayed_tasks(self):
+        with self.assertRaises(KeyError):
+            enqueue("tasks.missing")
+        enqueue(record, delay=60, value=1)
+        self.assertEqual(claim("w1"), [])
+
+    def test_failures_back_off_then_fail(self):
+        task = enqueue(explode, max_attempts=2)
+        with self.assertLogs("tasks.queue", "ERROR"):
+            run(claim("w1")[0])
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.QUEUED)
+        self.assertIn("RuntimeError: boom", task.error)
+        self.assertGreater(task.run_after, timezone.now() + timedelta(seconds=50))
+
+        Task.objects.filter(pk=task.pk).update(run_after=timezone.now())
+        with self.assertLogs("tasks.queue", "ERROR"):
+            run(claim("w1")[0])
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+
+    def test_permanent_failure_is_not_retried(self):
+        task = enqueue(reject)
+        run(claim("w1")[0])
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.error), (Task.FAILED, "bad input"))
+
+    def test_lost_task_is_claimed_again(self):
+        task = enqueue(record, max_attempts=2, value=1)
+        claim("w1")
+        Task.objects.filter(pk=task.pk).update(
+            locked_at=timezone.now() - timedelta(seconds=601)
+        )
+        [again] = claim("w2")
+        self.assertEqual((again.locked_by, again.attempts), ("w2", 2))
+
+        # the first worker finishing late does not overwrite the new owner
+        stale = Task(pk=task.pk, locked_by="w1", attempts=1)
+        with self.assertLogs("tasks.queue", "WARNING") as logs:
+            run(stale)
+        self.assertIn("taken over by another worker", logs.output[0])
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.locked_by), (Task.RUNNING, "w2"))
+
+        Task.objects.filter(pk=task.pk).update(
+            locked_at=timezone.now() - timedelta(seconds=601)
+        )
+        self.assertEqual(claim("w3"), [])
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+
+
+class WorkerTests(TransactionTestCase):
+    # worker threads use their own connections, so rows must be committed
+
+    def setUp(self):
+        calls.clear()
+
+    def test_burst_worker_drains_the_queue(self):
+        for value in range(5):
+            enqueue(record, value=value)
+        enqueue(reject)
+        out = StringIO()
+        # one thread: the in-memory test database locks whole tables
+        call_command("run_worker", burst=True, stdout=out)
+        self.assertIn("6 task(s) processed", out.getvalue())
+        self.assertEqual(sorted(calls), [0, 1, 2, 3, 4])
+        self.assertEqual(
+            sorted(Task.objects.values_list("status", flat=True)),
+            ["done"] * 5 + ["failed"],
+        )
+
+    @override_settings(TASK_LEASE=0.3)
+    def test_worker_renews_the_lease_of_a_long_task(self):
+        task = enqueue(outlive_lease)
+        call_command("run_worker", burst=True, stdout=StringIO())
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.DONE, 1))
+        self.assertEqual(task.result, {"claimed": []})
+
+    def test_enqueue_command(self):
+        out = StringIO()
+        call_command("enqueue_task", "tasks.record", "value=[1, 2]", stdout=out)
+        self.assertEqual(Task.objects.get().kwargs, {"value": [1, 2]})
+        call_command("enqueue_task", stdout=out)
+        self.assertIn("dashboard.rebuild_rollups", out.getvalue())
+
+
+class TaskViewTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            username="clerk", password="pass", role="staff"
+        )
+        self.manager = User.objects.create_user(
+            username="boss", password="pass", role="manager"
+        )
+        self.own = enqueue(record, user=self.staff, value=1)
+        self.other = enqueue(record, user=self.manager, value=2)
+
+    def test_staff_see_their_own_tasks(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("task_list"))
+        self.assertEqual(list(response.context["tasks"]), [self.own])
+        self.assertContains(response, 'http-equiv="refresh"')
+        other = self.client.get(reverse("task_detail", args=[self.other.pk]))
+        self.assertEqual(other.status_code, 404)
+
+        self.client.force_login(self.manager)
+        response = self.client.get(reverse("task_list"), {"status": "queued"})
+        self.assertEqual(len(response.context["tasks"]), 2)
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_download_serves_the_result_file(self):
+        name = default_storage.save("exports/report.csv", ContentFile(b"a,b\n"))
+        Task.objects.filter(pk=self.own.pk).update(
+            status=Task.DONE, result={"file": name}
+        )
+        self.client.force_login(self.staff)
+        url = reverse("task_download", args=[self.own.pk])
+        response = self.client.get(url)
+        self.assertEqual(b"".join(response.streaming_content), b"a,b\n")
+        self.assertContains(
+            self.client.get(reverse("task_detail", args=[self.own.pk])), url
+        )
+        missing = self.client.get(reverse("task_download", args=[self.other.pk]))
+        self.assertEqual(missing.status_code, 404)
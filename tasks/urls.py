@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import TaskDetailView, TaskDownloadView, TaskListView
+
+urlpatterns = [
+    path("", TaskListView.as_view(), name="task_list"),
+    path("<int:pk>/", TaskDetailView.as_view(), name="task_detail"),
+    path("<int:pk>/download/", TaskDownloadView.as_view(), name="task_download"),
+]
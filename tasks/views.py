@@ -0,0 +1,71 @@
+import os
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404
+from django.shortcuts import redirect
+from django.views.generic import DetailView, ListView, View
+from django.views.generic.detail import SingleObjectMixin
+
+from erp_project.pagination import KeysetPaginationMixin
+from .models import Task
+from .queue import enqueue
+
+
+def hand_off(request, func, **kwargs):
+    """Queue ``func`` for ``request.user`` and redirect to its status page."""
+    return redirect(enqueue(func, user=request.user, **kwargs))
+
+
+class VisibleTasksMixin(LoginRequiredMixin):
+    """Admins and managers see every task, everyone else their own."""
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = Task.objects.select_related("created_by")
+        if user.is_superuser or user.role in ("admin", "manager"):
+            return queryset
+        return queryset.filter(created_by=user)
+
+
+class TaskListView(VisibleTasksMixin, KeysetPaginationMixin, ListView):
+    model = Task
+    template_name = "tasks/task_list.html"
+    context_object_name = "tasks"
+    paginate_by = 25
+    keyset = ("-id",)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        status = self.request.GET.get("status")
+        if status in dict(Task.STATUS_CHOICES):
+            queryset = queryset.filter(status=status)
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["statuses"] = Task.STATUS_CHOICES
+        context["pending"] = any(not task.is_finished for task in context["tasks"])
+        return context
+
+
+class TaskDetailView(VisibleTasksMixin, DetailView):
+    model = Task
+    template_name = "tasks/task_detail.html"
+
+
+class TaskDownloadView(VisibleTasksMixin, SingleObjectMixin, View):
+    """Serve the file a finished task left in ``result["file"]``."""
+
+    model = Task
+
+    def get(self, request, *args, **kwargs):
+        task = self.get_object()
+        name = (task.result or {}).get("file") if task.status == Task.DONE else None
+        if not name or not default_storage.exists(name):
+            raise Http404("This task has no file to download.")
+        return FileResponse(
+            default_storage.open(name, "rb"),
+            as_attachment=True,
+            filename=os.path.basename(name),
+        )
@@ -0,0 +1,108 @@
+"""The polling loop behind ``run_worker``."""
+
+import logging
+import os
+import socket
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from . import queue
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """
+    ``concurrency`` threads, each claiming and running one task at a time
+    on its own database connection.
+
+    Threads suit tasks that mostly wait on the database or on files; for
+    CPU-bound work start more worker processes instead.  With ``burst``
+    each thread exits once it finds no ready task.  One more thread renews
+    the lease of the running tasks, so a long one is not claimed again.
+    """
+
+    def __init__(self, concurrency=1, poll_interval=1.0, burst=False, name=None):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.running = set()
+        self.done = threading.Event()
+
+    def run(self):
+        threads = [
+            threading.Thread(
+                target=self._loop, args=(f"{self.name}:{n}",), name=f"task-worker-{n}"
+            )
+            for n in range(self.concurrency)
+        ]
+        heartbeat = threading.Thread(target=self._heartbeat, name="task-heartbeat")
+        heartbeat.start()
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                # join with a timeout so the main thread still receives signals
+                while thread.is_alive():
+                    thread.join(0.5)
+        finally:
+            self.done.set()
+            heartbeat.join()
+        return self.processed
+
+    def stop(self):
+        """Finish the running tasks, then exit."""
+        self.stopping.set()
+
+    def _loop(self, worker):
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                try:
+                    tasks = queue.claim(worker)
+                except Exception:  # e.g. the database is restarting
+                    logger.exception("Claiming tasks failed")
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                if not tasks:
+                    if self.burst:
+                        return
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                for task in tasks:
+                    with self.lock:
+                        self.running.add(task)
+                    try:
+                        queue.run(task)
+                    except Exception:  # recording the outcome failed
+                        # the task stays claimed until its lease runs out
+                        logger.exception("Finishing task %s failed", task)
+                    with self.lock:
+                        self.running.discard(task)
+                        self.processed += 1
+        finally:
+            connections.close_all()
+
+    def _heartbeat(self):
+        """Renew the leases of the running tasks until the loops are done."""
+        try:
+            while not self.done.wait(settings.TASK_LEASE / 3):
+                close_old_connections()
+                with self.lock:
+                    running = list(self.running)
+                for task in running:
+                    try:
+                        if not queue.renew(task):
+                            logger.warning(
+                                "Task %s was taken over by another worker", task
+                            )
+                    except Exception:
+                        logger.exception("Renewing the lease of %s failed", task)
+        finally:
+            connections.close_all()